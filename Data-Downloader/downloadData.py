@@ -9,6 +9,9 @@ The purpose of this script is to download internal and authoritative external da
 An excel spreadsheet will define the parameters for the location of each download in the directory.
 The two items that the script accepts at the moment are URLs and ArcGIS Online Data Item IDs.
 The script will unzip the downloads and finally preform geoproccessing on select downloads.
+CSV downloads (e.g. NPDES Discharge Points) are converted to a point layer in a GeoPackage named by the last of their
+New File Names, next to the csv in their Local Directory (e.g. NPDES_Discharge_Points.gpkg). They used to be converted
+to a feature class of their New GDB Name geodatabase, which is no longer created for them.
 
 TODO: Additional refactoring
 --------------------------------------------------------------------------------
@@ -29,26 +32,33 @@ TEST CHANGE
 
 # Import statements for utilized libraries / packages
 from ast import If
+import collections
+import datetime
 from datetime import date
+import functools
 import os
+import queue
+import struct
 import sys
+import numpy as np
 import pandas as pd
 import requests
 import shutil
-import wget
-import arcgis
-from arcgis.gis import GIS
+import socket
 import pathlib
 from pathlib import Path, PurePath
 import zipfile
 from zipfile import ZipFile
-import arcpy
-arcpy.CheckOutExtension("Spatial")
-from arcpy import env
-from arcpy.sa import *
 import glob
-
-print("### GETTING STARTED ###".format())
+import hashlib
+import json
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from urllib.parse import urlparse
 
 """
 Set various global variables. Some of these could be parameterized to be used in an 
@@ -57,24 +67,32 @@ ArcGIS Toolbox script and/or command line use.
 # Currently hardcoded values that may be parameterized if bundling into a tool
 __ROOT_DIR = r'C:\Users\goettel\Downloads\Geospatial_Copy' ## Set the directory path to the root directory that will be the destination for downloads. NEED TO UPDATE PREFIX TO YOUR ONEDRIVE ACCOUNT
 __XCEL_LIBRARY = r'C:\Users\goettel\OneDrive - DOI\Geospatial\NCRN_GIS_Data_Sources.xlsx' ## Create a variable to store the full path to the Excel file. NEED TO UPDATE PREFIX TO YOUR ONEDRIVE ACCOUNT
+_DOWNLOAD_WORKERS = 4 ## Number of URL downloads that run at the same time
+_HOST_CONNECTIONS = 2 ## Maximum number of downloads from the same host at the same time
+_BANDWIDTH_LIMIT = None ## Combined download rate in bytes per second (e.g. 50 * 1024 * 1024), or None for no limit
+_MANIFEST = os.path.join(__ROOT_DIR, 'download_manifest.json') ## Manifest of the validators and hashes of previous URL downloads. Delete it to force every source to be downloaded again
+_CACHE_DIR = None ## Folder of the download cache shared across runs (and machines, e.g. on a network share), or None for no cache. Print its hit rates with --cache-stats
+_CACHE_MAX_BYTES = 200 * 1024 ** 3 ## Size of the download cache. The least recently used downloads are evicted beyond it
+_TELEMETRY_LOG = os.path.join(__ROOT_DIR, 'download_telemetry.jsonl') ## JSON-lines log of the bytes, timings, retries, and cache hits of each source in each run, summarized at the end of the run. Print the summary of the last run with --telemetry
+_STREAM_UNZIP = True ## Extract zip files while they download instead of unzipping them after the download, so the zip is never written to disk
+_UNZIP_WORKERS = os.cpu_count() or 1 ## Number of threads extracting the members of a zip file at the same time (while downloading or from a downloaded zip)
+_CHUNK_SIZE = 1024 * 1024 ## Number of bytes read from the server and written to the .part file at a time
+_DOWNLOAD_RETRIES = 5 ## Number of times an interrupted download is resumed before it is reported as an issue
+_DOWNLOAD_BACKOFF = 5 ## Seconds to wait before the first retry. The wait doubles with each retry
+_CSV_CHUNK_ROWS = 50000 ## Number of rows of a csv download converted to points at a time
+_MOSAIC_BLOCK_SIZE = 512 ## Width and height in cells of the blocks of mosaicked rasters, which bounds the memory of each worker
+_MOSAIC_WORKERS = os.cpu_count() or 1 ## Number of threads mosaicking blocks of a raster at the same time
+_AGOL_PORTAL_URL = 'https://www.arcgis.com' ## ArcGIS Online (or Portal) that the AGOL items are exported and downloaded from when signing in with the AGOL_USERNAME and AGOL_PASSWORD environment variables (see connect_agol)
+_AGOL_WORKERS = 4 ## Number of AGOL requests or downloads that run at the same time
+_AGOL_POLL_INTERVAL = 5 ## Seconds between checks of the AGOL export jobs
+_AGOL_EXPORT_TIMEOUT = 3600 ## Seconds an AGOL export job may run before it is reported as an issue (and its export item deleted)
+_MERGE_WORKERS = 4 ## Number of feature classes read at the same time when merging them
+_MERGE_BATCH_SIZE = 65536 ## Number of features read (and written) at a time when merging feature classes
+_POST_PROCESSING_WORKERS = 4 ## Number of post-processing steps (and swaps) that run at the same time. Steps using arcpy still run one at a time
+_WORK_DIR = '.downloader' ## Folder of the root directory that holds the staging directories and previous copies of the sources (in 'staging' and 'previous'), which the GIS-Library-Documenter skips
 
-# Specify the ArcGIS Online credentials to use.
-# DELETE BEFORE COMMITING TO GITHUB
-# To run this code, uncomment line 66 and hardcode the `ncrndata` AGOL user credentials into the "Username" and "Password" parameters.
-print("Connecting to ArcGIS Online...")
-try:
-    #gis = GIS("https://arcgis.com", "Username", "Password")
-    print("Connected.")
-except:
-    print("Not connected")
-
-# Connect to ArcGIS Pro
-print("Connecting to ArcGIS Pro...")
-try:
-    gis = GIS("pro")
-    print("Connected")
-except:
-    print("Not connected")
+# Create an empty list to append content that couldn't be downloaded
+Issue_List = []
 
 # Create some functions to be used in various places
 def download_progress_bar_custom(current, total, width=80):
@@ -105,6 +123,7 @@ def download_url_wget(out_dir, url):
     start_dtm = datetime.datetime.now()
     # Print status to Python console with start time
     print("'{0}' is downloading...Please be patient!\nStart time: {1}\n".format(url.split('/')[-1], str(datetime.datetime.time(start_dtm))))
+    import wget
     # Call the wget.download function with the url and output directory as variables
     try:
         wget.download(url=url, out=out_dir, bar=download_progress_bar_custom)
@@ -166,304 +185,2352 @@ def Write_Date_to_Text_File(filename, dest_dir):
     with open(fullpath_textfilename, 'w') as f:
         f.write(d1)
 
-# Read excel into dataframe using Pandas
-df_NCRN_GIS_Data_Sources = pd.read_excel(__XCEL_LIBRARY, sheet_name='Sources')
+class BandwidthBudget:
+    """
+    Token bucket shared by all downloads so their combined rate stays under `rate` bytes per second
+    A download that overdraws the bucket sleeps until the bucket refills, so bursts are limited to one second of transfer.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, size):
+        """Takes `size` bytes from the bucket, sleeping while it is overdrawn"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+class DownloadProgress:
+    """Aggregate progress of all running downloads, printed at most every `interval` seconds"""
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.printed = 0
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.files_total = 0
+
+    def add_file(self, size):
+        """Records a download that has started, with its size in bytes (0 when the server does not send one)"""
+        with self.lock:
+            self.files_total += 1
+            self.bytes_total += size
+
+    def update(self, size):
+        with self.lock:
+            self.bytes_done += size
+            now = time.monotonic()
+            if now - self.printed < self.interval:
+                return
+            self.printed = now
+        self.report()
+
+    def finish_file(self):
+        with self.lock:
+            self.files_done += 1
 
-# Delete existing copies of activated downloads
-print("Deleting existing copies before downloading...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    if row['Activated'] == 'Yes':
-        # Delete files within geodatabase downloads (gdb wasn't renamed)
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        print("Downloaded {0:.1f} of {1:.1f} MB ({2} of {3} files finished) at {4:.1f} MB/s".format(
+            self.bytes_done / 1024 / 1024, self.bytes_total / 1024 / 1024, self.files_done, self.files_total, self.bytes_done / elapsed / 1024 / 1024))
+
+class DownloadTelemetry:
+    """
+    JSON-lines log of the downloads, unzips, and post-processing steps of each source in a run
+    Each event is appended to `path` as it happens (one JSON object per line, tagged with the run's start time), so the log
+    of a run that crashed is kept. `names` maps source keys (row IDs) to a readable name (their Local Directory).
+    print_summary() rolls the events up by source, host, and phase.
+    """
+
+    def __init__(self, path=None, names=None, run=None):
+        self.path = path
+        self.names = names or {}
+        self.run = run or datetime.datetime.now().isoformat(timespec='seconds')
+        self.lock = threading.Lock()
+        self.events = []
+
+    def record(self, event, source, **values):
+        """Records an event ('download', 'unzip', 'post', or 'swap') of a source, with its seconds, ok, and other values"""
+        entry = {'run': self.run, 'time': datetime.datetime.now().isoformat(timespec='seconds'), 'event': event,
+                 'source': source, 'name': self.names.get(source, source)}
+        entry.update((name, round(value, 3) if isinstance(value, float) else value) for name, value in values.items())
+        with self.lock:
+            self.events.append(entry)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry, default=str) + '\n')
+
+    @staticmethod
+    def read_last_run(path):
+        """Returns the events of the last run in the log at `path`"""
+        events = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    events.append(json.loads(line))
+        last_run = events[-1]['run'] if events else None
+        return [event for event in events if event['run'] == last_run]
+
+    def print_summary(self, issues=None):
+        print_telemetry_summary(self.events, issues)
+
+def print_telemetry_summary(events, issues=None):
+    """
+    Prints the events of a run rolled up by source (slowest first), by host (slowest throughput first), and by phase,
+    followed by the downloads that raised `issues` (e.g. Issue_List) when they are given
+    """
+    sources = collections.OrderedDict()
+    hosts = {}
+    phases = collections.OrderedDict((phase, 0.0) for phase in ('download', 'unzip', 'post', 'swap'))
+    for event in events:
+        source = sources.setdefault(event['source'], {'name': event['name'], 'bytes': 0, 'download': 0.0, 'transfer': 0.0, 'ttfb': None,
+                                                      'retries': 0, 'cache_hits': 0, 'unzip': 0.0, 'post': 0.0, 'failed': []})
+        seconds = event.get('seconds') or 0.0
+        phases[event['event']] = phases.get(event['event'], 0.0) + seconds
+        if event['event'] in ('download', 'unzip', 'post'):
+            source[event['event']] += seconds
+        if not event.get('ok', True):
+            source['failed'].append(event.get('step') or event['event'])
+        if event['event'] != 'download':
+            continue
+        # Throughput leaves out the time AGOL exports took before their download started
+        transfer = seconds - (event.get('export_seconds') or 0.0)
+        source['bytes'] += event.get('bytes') or 0
+        source['transfer'] += transfer
+        source['retries'] += event.get('retries') or 0
+        source['cache_hits'] += 1 if event.get('cache_hit') else 0
+        if event.get('ttfb') is not None:
+            source['ttfb'] = max(source['ttfb'] or 0.0, event['ttfb'])
+            host = hosts.setdefault(event.get('host') or '', {'files': 0, 'bytes': 0, 'seconds': 0.0, 'ttfb': 0.0})
+            host['files'] += 1
+            host['bytes'] += event.get('bytes') or 0
+            host['seconds'] += transfer
+            host['ttfb'] += event['ttfb']
+    print("Sources (slowest first):")
+    print("  {0:<40} {1:>10} {2:>8} {3:>7} {4:>7} {5:>7} {6:>6} {7:>8} {8:>8}  {9}".format(
+        'Source', 'MB', 'Down s', 'MB/s', 'TTFB s', 'Retries', 'Cache', 'Unzip s', 'Post s', 'Result'))
+    for key, source in sorted(sources.items(), key=lambda item: -(item[1]['download'] + item[1]['unzip'] + item[1]['post'])):
+        print("  {0:<40} {1:>10.1f} {2:>8.1f} {3:>7.2f} {4:>7} {5:>7} {6:>6} {7:>8.1f} {8:>8.1f}  {9}".format(
+            str(source['name'])[-40:], source['bytes'] / 1024 / 1024, source['download'],
+            source['bytes'] / 1024 / 1024 / source['transfer'] if source['transfer'] else 0.0,
+            '{0:.2f}'.format(source['ttfb']) if source['ttfb'] is not None else '-', source['retries'], source['cache_hits'],
+            source['unzip'], source['post'], 'failed ({0})'.format(', '.join(source['failed'])) if source['failed'] else 'ok'))
+    if hosts:
+        print("Hosts (slowest throughput first):")
+        for name, host in sorted(hosts.items(), key=lambda item: item[1]['bytes'] / item[1]['seconds'] if item[1]['seconds'] else 0.0):
+            print("  {0:<40} {1} files, {2:.1f} MB at {3:.2f} MB/s, mean time to first byte {4:.2f}s".format(
+                name, host['files'], host['bytes'] / 1024 / 1024, host['bytes'] / 1024 / 1024 / host['seconds'] if host['seconds'] else 0.0,
+                host['ttfb'] / host['files']))
+    print("Time spent in each phase (summed over workers): {0}".format(
+        ', '.join('{0} {1:.1f}s'.format(phase, seconds) for phase, seconds in phases.items())))
+    if issues is not None:
+        print("Downloads that raised issues: {0}".format(', '.join(str(issue) for issue in issues) if issues else 'none'))
+
+def get_file_size_requests(url):
+    """
+    Utility function to get the size of a file at a URL using requests library.
+        NOTE: May not work on all file types and all endpoints.
+
+    Keyword arguments:
+    url -- The full URL of a file on the internet as a string.
+        Example: r'https://www.fws.gov/wetlands/Data/State-Downloads/DC_shapefile_wetlands.zip'
+
+    Return:
+    size -- File size in bytes as integer, or None if the server does not send one
+    """
+    # Create a request for URL head content and store in variable
+    response = requests.head(url, allow_redirects=True, timeout=60)
+    # Parse the header of the request response and get the Content Length (i.e., file size in bytes)
+    if 'Content-Length' not in response.headers:
+        return None
+    size = int(response.headers['Content-Length'])
+    # Return the file size in bytes
+    return size
+
+def hash_file(path, chunk_size=_CHUNK_SIZE):
+    """Returns a hashlib SHA-256 object of the contents of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+class DownloadManifest:
+    """
+    JSON manifest of the URL downloads, recording the ETag, Last-Modified, size, SHA-256, and local file of each URL
+    Re-runs send the recorded validators as a conditional request, so unchanged sources are neither cleared nor downloaded.
+    The manifest is saved (atomically) after every update, so it survives interrupted runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def update(self, url, **values):
+        with self.lock:
+            self.entries.setdefault(url, {}).update(values)
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
+
+    def conditional_headers(self, url):
+        """Returns the If-None-Match / If-Modified-Since headers of the recorded validators of a URL"""
+        record = self.entries.get(url) or {}
+        headers = {}
+        if record.get('etag'):
+            headers['If-None-Match'] = record['etag']
+        if record.get('last_modified'):
+            headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+    def is_changed(self, url):
+        """
+        Returns True if a URL has to be downloaded: it was never downloaded (or its local copy is gone), or the server
+        does not answer its conditional request with 304 Not Modified and reports different validators or size
+        """
+        record = self.entries.get(url)
+        if record is None or not record.get('local_file') or not os.path.exists(record['local_file']):
+            return True
         try:
-            fullpath_fgdbname = os.path.join(__ROOT_DIR, row['Local Directory'], row['Original GDB Name']) ## Full path of the geodatabase
-            Clear_Folder(fullpath_fgdbname)
-        except Exception:
-            pass
-        # Delete files within geodatabase downloads (gdb was renamed)
+            response = requests.head(url, headers=self.conditional_headers(url), allow_redirects=True, timeout=60)
+        except requests.exceptions.RequestException:
+            return True
+        if response.status_code == 304:
+            return False
+        if response.status_code >= 400:
+            return True
+        if response.headers.get('ETag'):
+            return response.headers['ETag'] != record.get('etag')
+        if response.headers.get('Last-Modified'):
+            size = response.headers.get('Content-Length')
+            return response.headers['Last-Modified'] != record.get('last_modified') or (size is not None and int(size) != record.get('size'))
+        return True
+
+    def move_local_files(self, old_dir, new_dir=None):
+        """Points the local files recorded in `old_dir` to the same paths in `new_dir`, or forgets them when `new_dir` is None"""
+        with self.lock:
+            for record in self.entries.values():
+                local_file = record.get('local_file')
+                if local_file and os.path.commonpath([os.path.abspath(local_file), os.path.abspath(old_dir)]) == os.path.abspath(old_dir):
+                    record['local_file'] = os.path.join(new_dir, os.path.relpath(local_file, old_dir)) if new_dir else None
+            self.save()
+
+def get_work_path(local_dir, root_dir, kind):
+    """
+    Returns the path of a `kind` ('staging', 'previous', or 'rollback') copy of `local_dir` in the _WORK_DIR folder of
+    `root_dir`, under the same relative path (e.g. '.downloader/previous/Hydro/NHD' for 'Hydro/NHD'), so the copies stay on
+    the drive of the library (and are swapped in with renames) but out of its folders
+    """
+    return os.path.join(root_dir, _WORK_DIR, kind, os.path.relpath(local_dir, root_dir))
+
+def make_staging_dir(local_dir, root_dir):
+    """
+    Creates an empty staging directory for `local_dir` in the work folder of `root_dir` and returns its path
+    A staging directory left behind by an earlier run that did not finish is deleted first.
+    """
+    staging_dir = get_work_path(local_dir, root_dir, 'staging')
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        print("Deleted stale staging directory: {0}".format(staging_dir))
+    os.makedirs(staging_dir)
+    return staging_dir
+
+def swap_staging_dir(staging_dir, local_dir, root_dir):
+    """
+    Swaps a staging directory in as `local_dir` with renames, keeping the current `local_dir` as its 'previous' copy in the
+    work folder of `root_dir` (replacing the one kept before) so it can be rolled back with rollback_local_dir
+    """
+    previous_dir = get_work_path(local_dir, root_dir, 'previous')
+    if os.path.exists(previous_dir):
+        shutil.rmtree(previous_dir)
+    os.makedirs(os.path.dirname(previous_dir), exist_ok=True)
+    os.makedirs(os.path.dirname(local_dir), exist_ok=True)
+    if os.path.exists(local_dir):
+        os.rename(local_dir, previous_dir)
+    try:
+        os.rename(staging_dir, local_dir)
+    except OSError:
+        # Put the current copy back, so the library is never left without it
+        if os.path.exists(previous_dir) and not os.path.exists(local_dir):
+            os.rename(previous_dir, local_dir)
+        raise
+
+def rollback_local_dir(local_dir, root_dir):
+    """
+    Swaps `local_dir` with the copy it replaced (its 'previous' copy in the work folder of `root_dir`), so rolling back
+    twice restores it. When `local_dir` is missing (e.g. it was deleted by hand), the previous copy is moved back in its place.
+    """
+    previous_dir = get_work_path(local_dir, root_dir, 'previous')
+    if not os.path.exists(previous_dir):
+        print("No previous copy to roll back to: {0}".format(local_dir))
+        return False
+    os.makedirs(os.path.dirname(local_dir), exist_ok=True)
+    if not os.path.exists(local_dir):
+        os.rename(previous_dir, local_dir)
+        print("Restored the previous copy: {0}".format(local_dir))
+        return True
+    rollback_dir = get_work_path(local_dir, root_dir, 'rollback')
+    os.makedirs(os.path.dirname(rollback_dir), exist_ok=True)
+    os.rename(local_dir, rollback_dir)
+    os.rename(previous_dir, local_dir)
+    os.rename(rollback_dir, previous_dir)
+    print("Rolled back: {0}".format(local_dir))
+    return True
+
+def link_or_copy(source, destination):
+    """Hardlinks `source` to `destination` (replacing it), copying it instead where links are not possible (e.g. across drives)"""
+    temp_path = destination + '.linking'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copy2(source, temp_path)
+    os.replace(temp_path, destination)
+
+class DownloadCache:
+    """
+    Content-addressed cache of downloads, shared across runs and (on a network share) across machines
+    Files are stored once as objects/<sha256[:2]>/<sha256>. Each download key (a URL with its ETag and Last-Modified,
+    or an AGOL item with its modified time) has a small JSON record in keys/ that names its object and file name.
+    Hits are hardlinked (or copied) into the library. Each use of an object touches its own marker in used/ (never the
+    object, whose links are library files with their own modified times), so eviction removes the least recently used
+    objects once the objects total more than `max_bytes`. The objects are scanned for their total size once per run (at the first
+    store) and the total is kept up to date as objects are added, so eviction only scans them again when it goes over.
+    Hits and misses are counted in memory, and save_stats() adds them to this machine's own stats/ file at the end of the run.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        for folder in ('objects', 'keys', 'stats', 'used'):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+        self.stats_path = os.path.join(root, 'stats', socket.gethostname() + '.json')
+        self.stats = {}
+        self.size = None
+
+    @staticmethod
+    def make_key(url, etag=None, last_modified=None):
+        """Returns the cache key of a URL download, or None if the server sends no validator to tell versions apart"""
+        if not etag and not last_modified:
+            return None
+        return '\n'.join([url, etag or '', last_modified or ''])
+
+    def url_key(self, url):
+        """Returns the cache key of the current version of a URL, from its HEAD response (None if it cannot be keyed)"""
         try:
-            fullpath_fgdbrename = os.path.join(__ROOT_DIR, row['Local Directory'], row['New GDB Name']) ## Full path of the renamed geodatabase
-            Clear_Folder(fullpath_fgdbrename)
-        except Exception:
+            response = requests.head(url, allow_redirects=True, timeout=60)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            return None
+        return self.make_key(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def key_path(self, key):
+        return os.path.join(self.root, 'keys', hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def used_path(self, sha256):
+        return os.path.join(self.root, 'used', sha256)
+
+    def touch(self, sha256):
+        """Records the use of an object by touching its marker, leaving the object (and the library files linked to it) as it is"""
+        used_path = self.used_path(sha256)
+        with open(used_path, 'a'):
             pass
-        # Delete files within downloads containing subfolders (e.g. SSURGO & STATSGO2)
+        os.utime(used_path)
+
+    def get(self, key):
+        """Returns the record of a key whose object is still cached, or None"""
         try:
-            items_str = row['File Names']
-            items_list = Convert(items_str)
-            folder_path = os.path.join(__ROOT_DIR, row['Local Directory']) ## Path to where the folder is located
-            fullpath_subfoldername = os.path.join(folder_path, items_list[0]) ## Path and name of the parent subfolder
-            # Delete files within the first subfolder
-            fullpath_subfoldername1 = os.path.join(fullpath_subfoldername, items_list[1]) ## Path to the first subfolder (e.g. spatial) in the parent subfolder (e.g. DC001)
-            Clear_Folder(fullpath_subfoldername1)
-            # Delete files within the second subfolder
-            try:
-                fullpath_subfoldername2 = os.path.join(fullpath_subfoldername, items_list[2]) ## Path to a second subfolder (e.g. tabular) in the parent subfolder
-                Clear_Folder(fullpath_subfoldername2)
-            except:
-                pass
-            # Delete files within the parent subfolder
-            Clear_Folder(fullpath_subfoldername)
-            # Delete the parent subfolder
-            os.rmdir(fullpath_subfoldername)
-        except Exception:
-                pass
-        # Delete files within multi-item downloads (e.g. 3DEP Contours)
+            with open(self.key_path(key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return record if os.path.exists(self.object_path(record['sha256'])) else None
+
+    def fetch(self, key, dest_dir, filename=None):
+        """Links the cached file of a key into `dest_dir` (as `filename`, or its recorded name) and returns (path, record), or (None, None) on a miss"""
+        record = self.get(key) if key is not None else None
+        if record is None:
+            self.count('misses')
+            return None, None
+        object_path = self.object_path(record['sha256'])
+        path = os.path.join(dest_dir, filename or record['filename'])
+        os.makedirs(dest_dir, exist_ok=True)
+        link_or_copy(object_path, path)
+        self.touch(record['sha256'])
+        self.count('hits')
+        self.count('bytes_served', record['size'])
+        return path, record
+
+    def store(self, key, path, sha256=None, **values):
+        """Adds a downloaded file to the cache under `key` (with any extra values in its record) and evicts old objects"""
+        if key is None:
+            return None
+        sha256 = sha256 or hash_file(path).hexdigest()
+        object_path = self.object_path(sha256)
+        added = 0
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            link_or_copy(path, object_path)
+            added = os.path.getsize(path)
+            self.count('bytes_stored', added)
+        self.touch(sha256)
+        record = dict(values, key=key, sha256=sha256, size=os.path.getsize(path), filename=os.path.basename(path),
+                      stored=datetime.datetime.now().isoformat(timespec='seconds'))
+        key_path = self.key_path(key)
+        with open(key_path + '.tmp', 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(key_path + '.tmp', key_path)
+        with self.lock:
+            if self.size is None:
+                # The object just added is part of the first scan
+                self.size = sum(size for mtime, size, path in self.list_objects())
+            else:
+                self.size += added
+            full = self.size > self.max_bytes
+        if full:
+            self.evict()
+        return record
+
+    def list_objects(self):
+        """Returns the (last used time, size, path) of each cached object, from its marker or (without one) its modified time"""
+        used = {entry.name: entry.stat().st_mtime for entry in os.scandir(os.path.join(self.root, 'used'))}
+        objects = []
+        for folder in os.scandir(os.path.join(self.root, 'objects')):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    stat = entry.stat()
+                    objects.append((used.get(entry.name, stat.st_mtime), stat.st_size, entry.path))
+        return objects
+
+    def evict(self):
+        """Removes the least recently used objects until the cache is no larger than max_bytes"""
+        with self.lock:
+            objects = self.list_objects()
+            total = sum(size for mtime, size, path in objects)
+            for mtime, size, path in sorted(objects):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    continue
+                try:
+                    os.remove(self.used_path(os.path.basename(path)))
+                except OSError:
+                    pass
+            self.size = total
+
+    def count(self, name, value=1):
+        """Adds to a counter of this run, see save_stats()"""
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def save_stats(self):
+        """Adds the counters of this run to this machine's stats file"""
+        with self.lock:
+            if not self.stats:
+                return
+            stats = self.read_stats(self.stats_path)
+            for name, value in self.stats.items():
+                stats[name] = stats.get(name, 0) + value
+            with open(self.stats_path + '.tmp', 'w') as f:
+                json.dump(stats, f, indent=2)
+            os.replace(self.stats_path + '.tmp', self.stats_path)
+            self.stats = {}
+
+    @staticmethod
+    def read_stats(path):
         try:
-            items_str = row['Items']
-            items_list = Convert(items_str)
-            folder_path = os.path.join(__ROOT_DIR, row['Local Directory']) ## Path to where the folder is located 
-            for item in items_list:
-                fullpath_foldername = os.path.join(folder_path, item) ## Path and name of the folder
-                Clear_Folder(fullpath_foldername)
-                os.rmdir(fullpath_foldername)
-        except Exception:
-            pass
-        # Delete files within download folders
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def print_stats(self):
+        """Prints the hit rate of each machine and the size of the cache"""
+        print("Download cache: {0}".format(self.root))
+        totals = {}
+        for entry in sorted(os.scandir(os.path.join(self.root, 'stats')), key=lambda entry: entry.name):
+            if not entry.name.endswith('.json'):
+                continue
+            stats = self.read_stats(entry.path)
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+            self.print_stats_line(os.path.splitext(entry.name)[0], stats)
+        self.print_stats_line('All machines', totals)
+        sizes = [size for mtime, size, path in self.list_objects()]
+        print("{0} objects, {1:.1f} of {2:.1f} GB".format(len(sizes), sum(sizes) / 1024 ** 3, self.max_bytes / 1024 ** 3))
+
+    @staticmethod
+    def print_stats_line(name, stats):
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        print("  {0}: {1} hits, {2} misses ({3:.0%} hit rate), {4:.1f} MB served, {5:.1f} MB stored".format(
+            name, stats.get('hits', 0), stats.get('misses', 0), stats.get('hits', 0) / lookups if lookups else 0,
+            stats.get('bytes_served', 0) / 1024 / 1024, stats.get('bytes_stored', 0) / 1024 / 1024))
+
+def get_validator_headers(validator, headers):
+    """
+    Returns the ETag and Last-Modified of `headers`, or (when it has neither) those of `validator`, the ETag or
+    Last-Modified a .part file was downloaded with
+    """
+    if headers.get('ETag') or headers.get('Last-Modified'):
+        return {name: headers[name] for name in ('ETag', 'Last-Modified') if headers.get(name)}
+    if not validator:
+        return {}
+    # ETags are quoted (weak ones start with W/), HTTP dates are not
+    return {'ETag' if validator.startswith(('"', 'W/"')) else 'Last-Modified': validator}
+
+def download_url(out_dir, url, budget=None, progress=None, chunk_size=_CHUNK_SIZE, retries=_DOWNLOAD_RETRIES, backoff=_DOWNLOAD_BACKOFF, manifest=None, on_chunk=None, cache=None, stats=None):
+    """
+    Utility function to stream a file via URL to `out_dir` using requests library, in chunks of `chunk_size` bytes.
+        The file is written to a .part file that is renamed once its size matches the Content-Length of the server.
+        Interrupted downloads are retried up to `retries` times, waiting `backoff` seconds and doubling the wait each time,
+        and resume from the end of the .part file with an HTTP Range request (when the server supports them).
+        The validator (ETag or Last-Modified) of the download is kept next to the .part file, so a download interrupted in
+        an earlier run resumes only if the file on the server has not changed since.
+        With a manifest, the validators, size, and SHA-256 of the download are recorded in it.
+        With `on_chunk`, each chunk is passed to on_chunk(chunk) instead of being written to a file (e.g. to extract a zip
+        while it downloads). Interrupted downloads then resume from the bytes received in this run, and None is returned.
+        With a DownloadCache (and no `on_chunk`), the current version of the URL is linked from the cache when it is there,
+        and added to the cache once downloaded.
+        With a `stats` dict, the host, bytes received, time to first byte, retries, and cache hit of the download are
+        recorded in it as it goes (so it also describes downloads that failed), e.g. for DownloadTelemetry.
+
+    Keyword arguments:
+    out_dir -- The full filepath to destination directory to download things to in string format.
+    url -- A single URL
+    budget -- Optional BandwidthBudget shared with the other downloads
+    progress -- Optional DownloadProgress shared with the other downloads
+    manifest -- Optional DownloadManifest to record the download in
+    on_chunk -- Optional function that is passed each chunk instead of writing it to a file
+    cache -- Optional DownloadCache to check before downloading and to add the download to
+    stats -- Optional dict to record the telemetry of the download in
+    Return:
+    fullpath_filename -- Full path of the downloaded file
+    """
+    filename = url.split('/')[-1]
+    fullpath_filename = os.path.join(out_dir, filename)
+    part_filename = fullpath_filename + '.part'
+    validator_filename = part_filename + '.validator'
+    os.makedirs(out_dir, exist_ok=True)
+    start_dtm = datetime.datetime.now()
+    stats = stats if stats is not None else {}
+    stats.update(url=url, host=urlparse(url).netloc, bytes=0, ttfb=None, retries=0, cache_hit=False)
+    if cache is not None and on_chunk is None:
+        cached_filename, record = cache.fetch(cache.url_key(url), out_dir, filename)
+        if cached_filename is not None:
+            stats['cache_hit'] = True
+            print("'{0}' is unchanged in the download cache, linked it to: {1}".format(filename, cached_filename))
+            if manifest is not None:
+                manifest.update(url, etag=record.get('etag'), last_modified=record.get('last_modified'), size=record['size'], sha256=record['sha256'],
+                                downloaded=datetime.datetime.now().isoformat(timespec='seconds'), local_file=None)
+            return cached_filename
+    print("'{0}' is downloading...\nStart time: {1}\n".format(filename, str(datetime.datetime.time(start_dtm))))
+    validator = None
+    if on_chunk is None and os.path.exists(part_filename) and os.path.exists(validator_filename):
+        with open(validator_filename) as f:
+            validator = f.read().strip() or None
+    counted = False
+    digest = hashlib.sha256()
+    hashed = 0
+    response_headers = {}
+    for attempt in range(retries + 1):
+        if on_chunk is not None:
+            offset = hashed
+        else:
+            offset = os.path.getsize(part_filename) if os.path.exists(part_filename) and validator else 0
+        headers = {'Range': 'bytes={0}-'.format(offset), 'If-Range': validator} if offset else {}
+        request_start = time.perf_counter()
         try:
-            folder_path = os.path.join(__ROOT_DIR, row['Local Directory'])
-            Clear_Folder(folder_path)
-        except Exception:
+            with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+                if stats['ttfb'] is None:
+                    stats['ttfb'] = time.perf_counter() - request_start
+                if response.status_code == 416:
+                    # The server sends the size of the file in the Content-Range of a 416 ('bytes */size'), otherwise ask for it
+                    content_range = response.headers.get('Content-Range', '')
+                    if content_range.startswith('bytes */'):
+                        size_headers, total_size = response.headers, int(content_range[len('bytes */'):])
+                    else:
+                        size_headers = requests.head(url, allow_redirects=True, timeout=60).headers
+                        total_size = int(size_headers['Content-Length']) if 'Content-Length' in size_headers else None
+                    if offset == total_size:
+                        # Every byte arrived before the last attempt stopped, so record the validators the .part file was downloaded with
+                        response_headers = get_validator_headers(validator, size_headers)
+                        break
+                response.raise_for_status()
+                response_headers = response.headers
+                if response.status_code == 206:
+                    total_size = int(response.headers['Content-Range'].split('/')[-1])
+                else:
+                    # The server ignored the Range (or the file changed), so start over
+                    if offset and on_chunk is not None:
+                        raise ValueError("{0} cannot be resumed, and the bytes already received were passed on".format(filename))
+                    offset = 0
+                    total_size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else get_file_size_requests(url)
+                    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                    if on_chunk is None:
+                        with open(validator_filename, 'w') as f:
+                            f.write(validator or '')
+                if progress is not None and not counted:
+                    progress.add_file(total_size or 0)
+                    progress.update(offset)
+                    counted = True
+                # Hash the bytes already in the .part file when they were received in an earlier run
+                if not offset:
+                    digest, hashed = hashlib.sha256(), 0
+                elif offset != hashed:
+                    digest, hashed = hash_file(part_filename), offset
+                f = open(part_filename, 'ab' if offset else 'wb') if on_chunk is None else None
+                try:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        stats['bytes'] += len(chunk)
+                        if budget is not None:
+                            budget.consume(len(chunk))
+                        if f is not None:
+                            f.write(chunk)
+                        else:
+                            on_chunk(chunk)
+                        digest.update(chunk)
+                        hashed += len(chunk)
+                        if progress is not None:
+                            progress.update(len(chunk))
+                finally:
+                    if f is not None:
+                        f.close()
+            size = hashed if on_chunk is not None else os.path.getsize(part_filename)
+            if total_size is not None and size != total_size:
+                raise IOError("Received {0} of {1} bytes of {2}".format(size, total_size, filename))
+            break
+        except requests.exceptions.HTTPError as e:
+            # Client errors (e.g. 404) will not succeed on a retry
+            if e.response is not None and e.response.status_code < 500 or attempt == retries:
+                raise
+            error = e
+        except (requests.exceptions.RequestException, IOError) as e:
+            if attempt == retries:
+                raise
+            error = e
+        wait = backoff * 2 ** attempt
+        stats['retries'] = attempt + 1
+        print("Download of {0} was interrupted ({1}). Retrying in {2:.1f}s...".format(filename, error, wait))
+        time.sleep(wait)
+    if on_chunk is not None:
+        fullpath_filename = None
+    else:
+        if hashed != os.path.getsize(part_filename):
+            digest, hashed = hash_file(part_filename), os.path.getsize(part_filename)
+        os.replace(part_filename, fullpath_filename)
+        if os.path.exists(validator_filename):
+            os.remove(validator_filename)
+        if cache is not None:
+            cache.store(cache.make_key(url, response_headers.get('ETag'), response_headers.get('Last-Modified')), fullpath_filename, digest.hexdigest(),
+                        url=url, etag=response_headers.get('ETag'), last_modified=response_headers.get('Last-Modified'))
+    if manifest is not None:
+        manifest.update(url, etag=response_headers.get('ETag'), last_modified=response_headers.get('Last-Modified'),
+                        size=hashed, sha256=digest.hexdigest(), downloaded=datetime.datetime.now().isoformat(timespec='seconds'),
+                        local_file=None)
+    if progress is not None:
+        progress.finish_file()
+    print("The file downloaded to: {0}.\nDownload time: {1}".format(fullpath_filename or out_dir, str(datetime.datetime.now() - start_dtm)))
+    return fullpath_filename
+
+def get_member_path(dest_dir, name):
+    """Returns the path a zip member is extracted to, dropping drive letters and '..' parts (as zipfile does)"""
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.', '..') and not part.endswith(':')]
+    return os.path.join(dest_dir, *parts)
+
+def get_dos_timestamp(dos_date, dos_time):
+    """Returns the POSIX timestamp of the (local) DOS date and time of a zip member, or None if it is not valid"""
+    try:
+        return time.mktime((((dos_date >> 9) & 0x7f) + 1980, (dos_date >> 5) & 0xf, dos_date & 0x1f,
+                            dos_time >> 11, (dos_time >> 5) & 0x3f, (dos_time & 0x1f) * 2, 0, 0, -1))
+    except (OverflowError, ValueError):
+        return None
+
+class StreamingUnsupported(Exception):
+    """Raised by StreamingZipExtractor for a zip member it cannot extract from a stream, so the archive is downloaded first"""
+
+class StreamingZipExtractor:
+    """
+    Extracts a zip archive from a stream of chunks (e.g. a download) by reading its local file headers, so members are
+    extracted while the rest of the archive is still arriving and the archive itself is never written to disk
+    The compressed bytes of each member are spooled (in memory up to `spool_memory` bytes) and the member is inflated,
+    CRC-checked, and moved into place by a pool of `workers` threads, so members extract in parallel. Members whose sizes
+    are only given after their data (data descriptors) are inflated as they arrive. Each member is written to a
+    .extracting file that replaces the member's path once it is complete.
+    Encrypted members, compression methods other than stored and deflate, and stored members with data descriptors
+    raise StreamingUnsupported, so the caller can fall back to downloading the archive first.
+    """
+
+    _LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+    _LOCAL_SIGNATURE = 0x04034b50
+    _DESCRIPTOR_SIGNATURE = 0x08074b50
+    # Central directory, zip64 end of central directory, and end of central directory records follow the last member
+    _END_SIGNATURES = (0x02014b50, 0x06064b50, 0x06054b50)
+
+    def __init__(self, dest_dir, workers=None, spool_memory=8 * 1024 * 1024):
+        self.dest_dir = dest_dir
+        self.spool_memory = spool_memory
+        workers = workers or _UNZIP_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Limit the members waiting to be extracted, so the spooled bytes stay bounded when extraction falls behind
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.member = None
+        self.done = False
+        self.futures = []
+        self.extracted = []
+        self.temp_paths = set()
+        self.spooled = 0
+        self.peak_spooled = 0
+
+    def feed(self, chunk):
+        """Extracts what it can from the next chunk of the archive"""
+        if self.done:
+            return
+        self.buffer += chunk
+        while not self.done and (self.read_header() if self.member is None else self.read_data()):
             pass
-        # Delete empty download folders
+        if self.done:
+            self.buffer.clear()
+
+    def read_header(self):
+        """Reads the local header of the next member, returning False if more bytes are needed"""
+        buffer = self.buffer
+        if len(buffer) < 4:
+            return False
+        signature = struct.unpack_from('<I', buffer)[0]
+        if signature in self._END_SIGNATURES:
+            self.done = True
+            return False
+        if signature != self._LOCAL_SIGNATURE:
+            raise zipfile.BadZipFile("Bad local header signature {0:#010x}".format(signature))
+        if len(buffer) < self._LOCAL_HEADER.size:
+            return False
+        (signature, version, flags, method, dos_time, dos_date, crc, compressed_size, size,
+         name_length, extra_length) = self._LOCAL_HEADER.unpack_from(buffer)
+        header_length = self._LOCAL_HEADER.size + name_length + extra_length
+        if len(buffer) < header_length:
+            return False
+        name = bytes(buffer[self._LOCAL_HEADER.size:self._LOCAL_HEADER.size + name_length]).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = bytes(buffer[self._LOCAL_HEADER.size + name_length:header_length])
+        if flags & 0x1:
+            raise StreamingUnsupported("{0} is encrypted".format(name))
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise StreamingUnsupported("{0} uses compression method {1}".format(name, method))
+        has_descriptor = bool(flags & 0x8)
+        if has_descriptor and method == zipfile.ZIP_STORED:
+            raise StreamingUnsupported("{0} is stored with a data descriptor".format(name))
+        # Read the 64-bit sizes of the zip64 extra field
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, data_length = struct.unpack_from('<HH', extra, position)
+            if header_id == 0x0001 and data_length >= 16:
+                zip64 = True
+                if size == 0xFFFFFFFF or compressed_size == 0xFFFFFFFF:
+                    size, compressed_size = struct.unpack_from('<QQ', extra, position + 4)
+            position += 4 + data_length
+        del buffer[:header_length]
+        member = {'name': name, 'path': get_member_path(self.dest_dir, name), 'method': method, 'crc': crc, 'size': size,
+                  'remaining': compressed_size, 'descriptor': has_descriptor, 'zip64': zip64,
+                  'timestamp': get_dos_timestamp(dos_date, dos_time)}
+        if name.endswith('/'):
+            os.makedirs(member['path'], exist_ok=True)
+            member['path'] = None
+            if not has_descriptor and not compressed_size:
+                return True
+        if has_descriptor:
+            member['inflater'] = zlib.decompressobj(-15)
+            member['file'] = self.open_temp(member) if member['path'] else None
+            member['computed_crc'] = 0
+            member['computed_size'] = 0
+        else:
+            member['spool'] = tempfile.SpooledTemporaryFile(max_size=self.spool_memory, dir=self.dest_dir)
+            if not compressed_size:
+                self.submit(member)
+                return True
+        self.member = member
+        return True
+
+    def read_data(self):
+        """Reads the data of the current member, returning False if more bytes are needed"""
+        member = self.member
+        buffer = self.buffer
+        if not member['descriptor']:
+            if not buffer:
+                return False
+            take = min(len(buffer), member['remaining'])
+            member['spool'].write(buffer[:take])
+            del buffer[:take]
+            member['remaining'] -= take
+            with self.lock:
+                self.spooled += take
+                self.peak_spooled = max(self.peak_spooled, self.spooled)
+            if not member['remaining']:
+                self.member = None
+                self.submit(member)
+            return True
+        inflater = member['inflater']
+        if not inflater.eof:
+            if not buffer:
+                return False
+            data = inflater.decompress(bytes(buffer))
+            self.buffer = bytearray(inflater.unused_data) if inflater.eof else bytearray()
+            member['computed_crc'] = zlib.crc32(data, member['computed_crc'])
+            member['computed_size'] += len(data)
+            if member['file'] is not None:
+                member['file'].write(data)
+            return True
+        # The data descriptor follows the data, with an optional signature
+        if len(buffer) < 4:
+            return False
+        start = 4 if struct.unpack_from('<I', buffer)[0] == self._DESCRIPTOR_SIGNATURE else 0
+        descriptor = struct.Struct('<IQQ' if member['zip64'] else '<III')
+        if len(buffer) < start + descriptor.size:
+            return False
+        member['crc'], compressed_size, member['size'] = descriptor.unpack_from(buffer, start)
+        del buffer[:start + descriptor.size]
+        self.member = None
+        if member['file'] is not None:
+            member['file'].close()
+            self.finish_member(member, member['computed_crc'], member['computed_size'])
+        return True
+
+    def open_temp(self, member):
+        os.makedirs(os.path.dirname(member['path']), exist_ok=True)
+        temp_path = member['path'] + '.extracting'
+        with self.lock:
+            self.temp_paths.add(temp_path)
+        return open(temp_path, 'wb')
+
+    def submit(self, member):
+        self.slots.acquire()
+        future = self.executor.submit(self.extract_member, member)
+        future.add_done_callback(lambda future: self.slots.release())
+        self.futures.append(future)
+
+    def extract_member(self, member):
+        """Inflates the spooled bytes of a member to its .extracting file (in a worker thread)"""
+        spool = member['spool']
+        spooled = spool.tell()
+        spool.seek(0)
+        inflater = zlib.decompressobj(-15) if member['method'] == zipfile.ZIP_DEFLATED else None
+        crc = 0
+        size = 0
         try:
-            folder_path = os.path.join(__ROOT_DIR, row['Local Directory'])
-            for foldername in os.listdir(folder_path):
-                fullpath_foldername = os.path.join(folder_path, foldername)
-                if os.path.isdir(fullpath_foldername):
-                    os.rmdir(fullpath_foldername)
-                    print("Deleted download: {0}".format(fullpath_foldername))
-        except Exception:
-            pass
+            with self.open_temp(member) as f:
+                for block in iter(lambda: spool.read(_CHUNK_SIZE), b''):
+                    data = inflater.decompress(block) if inflater is not None else block
+                    crc = zlib.crc32(data, crc)
+                    size += len(data)
+                    f.write(data)
+                if inflater is not None:
+                    data = inflater.flush()
+                    crc = zlib.crc32(data, crc)
+                    size += len(data)
+                    f.write(data)
+        finally:
+            spool.close()
+            with self.lock:
+                self.spooled -= spooled
+        self.finish_member(member, crc, size)
 
-# Create an empty list to append content that couldn't be downloaded        
-Issue_List = []
+    def finish_member(self, member, crc, size):
+        """Checks the CRC and size of an extracted member, then moves it into place with its timestamp"""
+        temp_path = member['path'] + '.extracting'
+        if crc != member['crc'] or size != member['size']:
+            raise zipfile.BadZipFile("Bad CRC-32 or size for {0}".format(member['name']))
+        os.replace(temp_path, member['path'])
+        if member['timestamp'] is not None:
+            os.utime(member['path'], (member['timestamp'], member['timestamp']))
+        with self.lock:
+            self.temp_paths.discard(temp_path)
+            self.extracted.append(member['path'])
+
+    def close(self):
+        """Waits for the members being extracted and returns their paths, raising the first error (after cleaning up)"""
+        try:
+            for future in self.futures:
+                future.result()
+            if not self.done:
+                raise zipfile.BadZipFile("The archive ended before its central directory")
+        except BaseException:
+            self.abort()
+            raise
+        self.executor.shutdown()
+        return self.extracted
+
+    def abort(self):
+        """Stops extracting and removes the members extracted so far, along with the partly extracted ones"""
+        self.executor.shutdown(cancel_futures=True)
+        if self.member is not None and self.member.get('file') is not None:
+            self.member['file'].close()
+        for path in list(self.temp_paths) + self.extracted:
+            if os.path.exists(path):
+                os.remove(path)
+        self.extracted = []
+
+def extract_zip_parallel(filename, extract_dir, workers=None):
+    """
+    Extracts a zip file to `extract_dir` with a pool of `workers` threads (a drop-in replacement for shutil.unpack_archive)
+    Each thread reads the archive through its own ZipFile handle, and zlib releases the GIL while inflating, so members
+    are decompressed in parallel (largest first). Member CRCs are checked by zipfile as each member is read. Members are
+    written to a .extracting file that replaces the member's path once complete, and keep their timestamps.
+    Return:
+    paths -- Full paths of the extracted files
+    """
+    workers = workers or _UNZIP_WORKERS
+    with ZipFile(filename) as archive:
+        infos = archive.infolist()
+    directories = [info for info in infos if info.is_dir()]
+    for info in directories:
+        os.makedirs(get_member_path(extract_dir, info.filename), exist_ok=True)
+    files = sorted((info for info in infos if not info.is_dir()), key=lambda info: info.compress_size, reverse=True)
+    local = threading.local()
+    handles = []
+    lock = threading.Lock()
+    def extract(info):
+        archive = getattr(local, 'archive', None)
+        if archive is None:
+            archive = local.archive = ZipFile(filename)
+            with lock:
+                handles.append(archive)
+        path = get_member_path(extract_dir, info.filename)
+        temp_path = path + '.extracting'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with archive.open(info) as source, open(temp_path, 'wb') as target:
+                shutil.copyfileobj(source, target, _CHUNK_SIZE)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, path)
+        set_member_timestamp(path, info)
+        return path
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = list(executor.map(extract, files))
+    finally:
+        for archive in handles:
+            archive.close()
+    # Directories are timestamped last, since extracting their files changes their modified time
+    for info in directories:
+        set_member_timestamp(get_member_path(extract_dir, info.filename), info)
+    return paths
+
+def set_member_timestamp(path, info):
+    """Sets the modified time of an extracted file or folder to the (local) date_time of its zip member"""
+    try:
+        timestamp = time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return
+    os.utime(path, (timestamp, timestamp))
+
+def stream_unzip_url(dest_dir, url, budget=None, progress=None, manifest=None, extractor=None, stats=None):
+    """
+    Downloads a zip file via URL and extracts it to `dest_dir` while it downloads, returning the extracted paths
+    With a `stats` dict, the telemetry of the download is recorded in it (see download_url), along with 'unzip_seconds',
+    the time spent finishing the extraction once the download is done.
+    """
+    extractor = extractor or StreamingZipExtractor(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+    try:
+        download_url(dest_dir, url, budget, progress, manifest=manifest, on_chunk=extractor.feed, stats=stats)
+    except BaseException:
+        extractor.abort()
+        raise
+    close_start = time.perf_counter()
+    paths = extractor.close()
+    if stats is not None:
+        stats['unzip_seconds'] = time.perf_counter() - close_start
+    return paths
+
+def download_and_unzip(dest_dir, url, budget=None, progress=None, manifest=None, cache=None, telemetry=None, source=None):
+    """
+    Downloads a URL to `dest_dir`, then unzips it there (deleting the zip and writing its date stamp) if it is a zip file
+    Zip files are extracted while they download when _STREAM_UNZIP is set and there is no download cache (which keeps
+    the zip itself), falling back to downloading them first when they cannot be streamed. Failures are printed and added
+    to Issue_List. With a manifest, the local file (the download, or the date stamp of an unzipped download) is only
+    recorded once everything succeeded. With a DownloadTelemetry, the download and unzip of the URL are recorded in it
+    as events of `source`.
+    Return:
+    True if the URL was downloaded (and unzipped), False if it raised an issue
+    """
+    def record(event, started, error=None, **values):
+        if telemetry is not None:
+            telemetry.record(event, source, seconds=time.perf_counter() - started, ok=error is None,
+                             error=str(error) if error is not None else None, **values)
+
+    filename = url.split('/')[-1]
+    if filename.endswith('.zip') and _STREAM_UNZIP and cache is None:
+        stats = {}
+        started = time.perf_counter()
+        try:
+            stream_unzip_url(dest_dir, url, budget, progress, manifest, stats=stats)
+            unzip_seconds = stats.pop('unzip_seconds')
+            record('download', started, **stats)
+            if telemetry is not None:
+                telemetry.record('unzip', source, url=url, seconds=unzip_seconds, ok=True, streamed=True)
+            print("Unzipped while downloading: {0}.\n".format(url))
+            Write_Date_to_Text_File(filename, dest_dir)
+            if manifest is not None:
+                manifest.update(url, local_file=os.path.join(dest_dir, filename + '.txt'))
+            return True
+        except StreamingUnsupported as e:
+            print("Could not unzip {0} while downloading it ({1}). Downloading it first...".format(filename, e))
+        except Exception as e:
+            print("Could not download and unzip {}".format(filename))
+            print(e)
+            stats.pop('unzip_seconds', None)
+            record('download', started, e, **stats)
+            Issue_List.append(url)
+            return False
+    stats = {}
+    started = time.perf_counter()
+    try:
+        fullpath_filename = download_url(dest_dir, url, budget, progress, manifest=manifest, cache=cache, stats=stats)
+    except Exception as e:
+        print("Could not download {}".format(filename))
+        print(e)
+        record('download', started, e, **stats)
+        Issue_List.append(url)
+        return False
+    record('download', started, **stats)
+    if filename.endswith('.zip'):
+        started = time.perf_counter()
+        try:
+            extract_zip_parallel(fullpath_filename, dest_dir)
+            print("Unzipped: {0}.\n".format(fullpath_filename))
+            ## delete zip file after extract
+            os.remove(fullpath_filename)
+            Write_Date_to_Text_File(filename, dest_dir)
+        except Exception as e:
+            print("Could not unzip {}".format(fullpath_filename))
+            print(e)
+            record('unzip', started, e, url=url)
+            Issue_List.append(fullpath_filename)
+            return False
+        record('unzip', started, url=url)
+        fullpath_filename = os.path.join(dest_dir, filename + '.txt')
+    if manifest is not None:
+        manifest.update(url, local_file=fullpath_filename)
+    return True
+
+class DownloadScheduler:
+    """
+    Runs downloads in a pool of `workers` threads, with at most `host_connections` downloads from any one host
+    Downloads are started in the order they were submitted, skipping over those whose host is at its cap.
+    All downloads share one bandwidth budget (`bandwidth` bytes per second, or unlimited when None) and one progress report.
+    """
+
+    def __init__(self, workers, host_connections, bandwidth=None, progress_interval=10):
+        self.workers = workers
+        self.host_connections = host_connections
+        self.budget = BandwidthBudget(bandwidth) if bandwidth else None
+        self.progress = DownloadProgress(progress_interval)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.running = 0
+        self.host_running = {}
+        self.futures = []
+
+    def submit(self, job, dest_dir, url):
+        """Schedules job(dest_dir, url, budget, progress) (e.g. download_and_unzip) and returns its Future"""
+        future = Future()
+        with self.lock:
+            self.pending.append((job, dest_dir, url, future))
+            self.futures.append(future)
+            self.dispatch()
+        return future
+
+    def dispatch(self):
+        """Starts pending jobs while there are free workers, skipping jobs whose host is at its cap (called with the lock held)"""
+        for item in list(self.pending):
+            if self.running >= self.workers:
+                break
+            host = urlparse(item[2]).netloc
+            if self.host_running.get(host, 0) >= self.host_connections:
+                continue
+            self.pending.remove(item)
+            self.running += 1
+            self.host_running[host] = self.host_running.get(host, 0) + 1
+            self.executor.submit(self.run, item, host)
+
+    def run(self, item, host):
+        job, dest_dir, url, future = item
+        try:
+            future.set_result(job(dest_dir, url, self.budget, self.progress))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.host_running[host] -= 1
+                self.dispatch()
+
+    def wait(self):
+        """Waits for every submitted job to finish, prints the final progress, and shuts the pool down"""
+        wait_futures(self.futures)
+        self.executor.shutdown()
+        self.progress.report()
+
+class TaskGraph:
+    """
+    Runs named tasks in a pool of `workers` threads as soon as the tasks they depend on have succeeded
+    Tasks added without a function are finished from outside the graph with finish() (e.g. when the downloads of a source
+    are done). A task whose dependency failed or was skipped is skipped. The result of each task is True if it succeeded,
+    False if it failed, and None if it was skipped.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.tasks = {}
+        self.results = {}
+        self.errors = {}
+        self.running = set()
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.executor = None
+
+    def add(self, name, func=None, deps=()):
+        """Adds a task that runs func() (or is finished with finish() when func is None) after the tasks named in `deps`"""
+        self.tasks[name] = (func, list(deps))
+
+    def order(self):
+        """Returns the task names in an order that runs every task after its dependencies, raising ValueError on cycles"""
+        for name, (func, deps) in self.tasks.items():
+            for dep in deps:
+                if dep not in self.tasks:
+                    raise ValueError("Task {0} depends on unknown task {1}".format(name, dep))
+        ordered = []
+        remaining = {name: set(deps) for name, (func, deps) in self.tasks.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError("Tasks depend on each other in a cycle: {0}".format(', '.join(remaining)))
+            for name in ready:
+                ordered.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return ordered
+
+    def print_plan(self):
+        """Prints the tasks in the order they can run, with what each one waits for"""
+        for name in self.order():
+            func, deps = self.tasks[name]
+            print("  {0}{1}{2}".format(name, '' if func is not None else ' (external)', ' after ' + ', '.join(deps) if deps else ''))
+
+    def start(self):
+        self.order()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        with self.lock:
+            self.dispatch()
+
+    def dispatch(self):
+        """Starts the tasks whose dependencies are all done, skipping those with a failed dependency (called with the lock held)"""
+        changed = True
+        while changed:
+            changed = False
+            for name, (func, deps) in self.tasks.items():
+                if name in self.results or name in self.running or any(dep not in self.results for dep in deps):
+                    continue
+                if not all(self.results[dep] for dep in deps):
+                    self.results[name] = None
+                    print("Skipped {0}: a step it depends on did not succeed".format(name))
+                    changed = True
+                elif func is not None:
+                    self.running.add(name)
+                    self.executor.submit(self.run, name, func)
+        if len(self.results) == len(self.tasks):
+            self.finished.notify_all()
+
+    def run(self, name, func):
+        try:
+            func()
+            result = True
+        except Exception as e:
+            print("Step {0} failed".format(name))
+            print(e)
+            self.errors[name] = e
+            result = False
+        self.finish(name, result)
+
+    def finish(self, name, result):
+        """Records the result of a task and starts the tasks that were waiting for it"""
+        with self.lock:
+            self.running.discard(name)
+            self.results[name] = bool(result)
+            self.dispatch()
+
+    def finish_with(self, name, futures):
+        """Finishes a task once all `futures` are done, succeeding if each of them returned True"""
+        if not futures:
+            self.finish(name, True)
+            return
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self.finish(name, all(future.exception() is None and future.result() for future in futures))
+        for future in futures:
+            future.add_done_callback(done)
+
+    def wait(self):
+        """Waits for every task to finish or be skipped, shuts the pool down, and returns the results"""
+        with self.finished:
+            while len(self.results) < len(self.tasks):
+                self.finished.wait()
+        self.executor.shutdown()
+        return self.results
+
+# arcpy is not thread safe (and arcpy.env.workspace is shared), so post-processing steps hold this lock while they use it
+arcpy_lock = threading.Lock()
 
-# Download URLs
-print("Downloading activated URLs...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    # Download activated URLs
-    if ((row['Avaliability'] == 'URL') & (row['Activated'] == 'Yes')):
-        dest_dir = os.path.join(__ROOT_DIR, row['Local Directory']) ## Destination in the directory where the download will be sent
-        if row['Source Type'] == 'Dataset':
-            url = row['Web File for Download']
-            filename = url.split('/')[-1] ## Name of the download
-            fullpath_filename = os.path.join(dest_dir, filename) ## Folder path and name of the download
-            download_url_wget(dest_dir, url)
-            if filename.endswith('.zip'):
+# Sources that write to the same geodatabase (e.g. the Open Street Map merges) can run at the same time, so steps hold
+# the lock of the geodatabase while they create or write to it, with pyogrio or arcpy (before taking arcpy_lock)
+_gdb_locks = {}
+_gdb_locks_lock = threading.Lock()
+
+def get_gdb_lock(path):
+    """Returns the lock of a geodatabase, keyed on its normalized full path"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _gdb_locks_lock:
+        return _gdb_locks.setdefault(key, threading.Lock())
+
+def rename_gdb(source, folder_path):
+    """Renames the downloaded geodatabase of a source from its Original GDB Name to its New GDB Name"""
+    fullpath_fgdbname = os.path.join(folder_path, source.original_gdb_name)
+    if os.path.exists(fullpath_fgdbname):
+        import arcpy
+        with arcpy_lock:
+            arcpy.env.workspace = folder_path
+            arcpy.management.Rename(source.original_gdb_name, source.new_gdb_name, 'FileGeodatabase')
+        print("geodatabase renamed as: {0}".format(source.new_gdb_name))
+
+def create_gdb(source, folder_path):
+    """Creates the New GDB Name geodatabase of a source in `folder_path`, unless it exists"""
+    fullpath_fgdbrename = os.path.join(folder_path, source.new_gdb_name)
+    with get_gdb_lock(fullpath_fgdbrename):
+        if os.path.exists(fullpath_fgdbrename):
+            return
+        import arcpy
+        with arcpy_lock:
+            arcpy.CreateFileGDB_management(folder_path, source.new_gdb_name)
+    print("Created geodatabase: {0}".format(source.new_gdb_name))
+
+def split_layer_path(path):
+    """
+    Returns (dataset, layer) for the path of a feature class, e.g. ('x.gdb', 'roads') for 'x.gdb/roads' (or for
+    'x.gdb/dataset/roads') and ('roads.shp', None) for a shapefile, or None if the path is neither
+    """
+    dataset, layer = path, None
+    while dataset and not os.path.isdir(dataset) and not os.path.isfile(dataset):
+        dataset, name = os.path.split(dataset)
+        layer = layer or name
+    if os.path.isfile(dataset) and layer is None:
+        return dataset, None
+    if os.path.isdir(dataset) and dataset.lower().endswith(('.gdb', '.gpkg')) and layer is not None:
+        return dataset, layer
+    if os.path.isfile(dataset) and dataset.lower().endswith('.gpkg') and layer is not None:
+        return dataset, layer
+    return None
+
+class MergeUnsupported(Exception):
+    """Raised by merge_layers for inputs it cannot merge the way Merge does, so they are merged with arcpy instead"""
+
+# Fields that Merge recreates (or drops) in its output, so they are not copied from the inputs
+_MERGE_SKIPPED_FIELDS = ('objectid', 'fid', 'shape_length', 'shape_area', 'shape_leng')
+
+def get_merge_schema(schemas, geometry_names):
+    """
+    Returns the output schema of Merge's default field mapping for inputs with the given Arrow schemas: the fields of
+    every input in input order, matched by name regardless of case, with the type of their first occurrence, followed by
+    the geometry column of the first input
+    """
+    import pyarrow as pa
+    fields = {}
+    for schema, geometry_name in zip(schemas, geometry_names):
+        for field in schema:
+            if field.name == geometry_name or field.name.lower() in _MERGE_SKIPPED_FIELDS or field.name.lower() in fields:
+                continue
+            field_type = field.type
+            # Shapefile integers are read as 64-bit, but written to a geodatabase as Long when their width fits
+            if pa.types.is_int64(field_type) and int((field.metadata or {}).get(b'GDAL:OGR:width', b'0') or 0) in range(1, 10):
+                field_type = pa.int32()
+            fields[field.name.lower()] = pa.field(field.name, field_type)
+    geometry_field = schemas[0].field(geometry_names[0])
+    return pa.schema(list(fields.values()) + [geometry_field.with_name('wkb_geometry')])
+
+def cast_values(column, field_type):
+    """Casts an Arrow array to `field_type` value by value, leaving empty the values that do not fit it"""
+    import pyarrow as pa
+    values = []
+    for value in column:
+        try:
+            values.append(value.cast(field_type, safe=True).as_py())
+        except (pa.ArrowInvalid, OverflowError):
+            values.append(None)
+    return pa.array(values, type=field_type)
+
+def conform_batch(batch, schema, geometry_name, multi_prefix=None):
+    """
+    Returns a record batch of an input with the columns of the merge schema: matched by name, cast, or filled with nulls
+    Values that do not fit the type of the first input's field (e.g. text that is not a number, or numbers out of range)
+    are left empty, as Merge does, while the other values of the column are kept. With a `multi_prefix` (see
+    get_multi_prefix), the geometries are made multi-part geometries of one part.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    columns_by_name = {name.lower(): column for name, column in zip(batch.schema.names, batch.columns)}
+    columns = []
+    for field in schema:
+        if field.name == 'wkb_geometry':
+            column = batch.column(geometry_name)
+            if multi_prefix is not None:
+                column = pc.binary_join_element_wise(pa.scalar(multi_prefix, column.type), column, pa.scalar(b'', column.type))
+        else:
+            column = columns_by_name.get(field.name.lower())
+        if column is None:
+            column = pa.nulls(batch.num_rows, field.type)
+        elif column.type != field.type:
+            try:
+                column = column.cast(field.type, safe=True)
+            except pa.ArrowInvalid:
+                column = cast_values(column, field.type)
+            except pa.ArrowNotImplementedError:
+                column = pa.nulls(batch.num_rows, field.type)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def get_merge_geometry_type(geometry_types):
+    """
+    Returns the geometry type of merged inputs, promoting single and multi-part types to the multi-part type, and 2D
+    types to the 3D type when any input has Z values
+    Inputs with M values raise MergeUnsupported, so that Merge keeps their measures.
+    """
+    measured_types = [geometry_type for geometry_type in geometry_types if 'Measured' in geometry_type or geometry_type.endswith('M')]
+    if measured_types:
+        raise MergeUnsupported("Inputs have M values: {0}".format(', '.join(sorted(set(measured_types)))))
+    z = ' Z' if any(geometry_type.endswith(' Z') for geometry_type in geometry_types) else ''
+    base_types = set(geometry_type.replace(' Z', '') for geometry_type in geometry_types)
+    if len(base_types) == 1:
+        return base_types.pop() + z
+    multi_types = set(geometry_type.replace('Multi', '') for geometry_type in base_types)
+    if len(multi_types) == 1:
+        return 'Multi' + multi_types.pop() + z
+    raise ValueError("Inputs have different geometry types: {0}".format(', '.join(sorted(base_types))))
+
+# WKB type codes of the single-part geometry types, whose multi-part types are 3 more (and 1000 more with Z values)
+_WKB_SINGLE_PART_TYPES = {'Point': 1, 'LineString': 2, 'Polygon': 3}
+
+def get_multi_prefix(geometry_type, merge_geometry_type):
+    """
+    Returns the WKB header of a multi-part geometry of one part, to put before each geometry of an input of
+    `geometry_type` merged into `merge_geometry_type`, or None if its geometries are not promoted
+    """
+    base_type = geometry_type.replace(' Z', '')
+    if base_type not in _WKB_SINGLE_PART_TYPES or not merge_geometry_type.startswith('Multi'):
+        return None
+    code = _WKB_SINGLE_PART_TYPES[base_type] + 3 + (1000 if geometry_type.endswith(' Z') else 0)
+    return struct.pack('<BII', 1, code, 1)
+
+def crs_equal(crs, other):
+    """Returns whether two coordinate systems (as read by pyogrio, or None) are the same, with pyproj"""
+    if crs is None or other is None:
+        return crs is other
+    from pyproj import CRS
+    return CRS.from_user_input(crs).equals(CRS.from_user_input(other))
+
+def merge_layers(in_paths, out_dataset, out_layer, workers=_MERGE_WORKERS, batch_size=_MERGE_BATCH_SIZE):
+    """
+    Merges feature classes with the same coordinate system into `out_layer` of `out_dataset` (a file geodatabase or
+    GeoPackage) with pyogrio, replacing the layer if it exists
+    Inputs in different coordinate systems (compared with pyproj) or with M values raise MergeUnsupported before anything
+    is written, as Merge projects them to the first input's and keeps the measures.
+    The inputs are read as Arrow batches of WKB geometries and attributes by `workers` threads, each keeping at most two
+    batches ahead of the writer, and conformed to Merge's field mapping (see get_merge_schema). The output is written in
+    input order as one stream, so memory stays bounded by the batches in flight.
+    Return:
+    count -- Number of features written
+    """
+    import pyarrow as pa
+    from pyogrio.raw import open_arrow, write_arrow
+    layers = [split_layer_path(path) for path in in_paths]
+    for path, layer in zip(in_paths, layers):
+        if layer is None:
+            raise ValueError("Not a feature class that can be read without arcpy: {0}".format(path))
+
+    def read_meta(layer):
+        with open_arrow(layer[0], layer=layer[1], use_pyarrow=True, batch_size=1) as (meta, reader):
+            return meta, reader.schema
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        metas = list(executor.map(read_meta, layers))
+    crs = metas[0][0]['crs']
+    for path, (meta, schema) in zip(in_paths, metas):
+        if not crs_equal(meta['crs'], crs):
+            raise MergeUnsupported("{0} has another coordinate system ({1}) than {2} ({3})".format(path, meta['crs'], in_paths[0], crs))
+    geometry_names = [meta['geometry_name'] or 'wkb_geometry' for meta, schema in metas]
+    schema = get_merge_schema([schema for meta, schema in metas], geometry_names)
+    geometry_type = get_merge_geometry_type([meta['geometry_type'] for meta, schema in metas])
+    multi_prefixes = [get_multi_prefix(meta['geometry_type'], geometry_type) for meta, schema in metas]
+    batch_queues = [queue.Queue(maxsize=2) for layer in layers]
+    stopped = threading.Event()
+    count = [0]
+
+    def read_batches(layer, batch_queue):
+        def put(item):
+            while not stopped.is_set():
                 try:
-                        shutil.unpack_archive(fullpath_filename, dest_dir)
-                        print("Unzipped: {0}.\n".format(fullpath_filename))
-                        ## delete zip file after extract
-                        os.remove(fullpath_filename)
-                        Write_Date_to_Text_File(filename, dest_dir)
-                except Exception as e:
-                    print("Could not unzip {}".format(fullpath_filename))
-                    print(e)
-                    Issue_List.append(fullpath_filename)
-        # Download multi-item URLs (e.g. 3DEP Contours)
-        elif row['Source Type'] == 'Datasets':
-            # Convert string of items to parsable list
-            items_str = row['Items']
-            items_list = Convert(items_str)
-            for item in items_list:
-                url = os.path.join(row['Web File for Download'], item)
-                filename = url.split('/')[-1]
-                fullpath_filename = os.path.join(dest_dir, filename)
-                download_url_wget(dest_dir, url)
-                if filename.endswith('.zip'):
-                    try:
-                        shutil.unpack_archive(fullpath_filename, dest_dir)
-                        print("Unzipped: {0}.\n".format(fullpath_filename))
-                        ## delete zip file after extract
-                        os.remove(fullpath_filename)
-                        Write_Date_to_Text_File(filename, dest_dir)
-                    except Exception as e:
-                        print("Could not unzip {}".format(fullpath_filename))
-                        print(e)
-                        Issue_List.append(fullpath_filename)
-
-# Download AGOL content
-print("Downloading feature service items from ArcGIS Online...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    if ((row['Avaliability'] == 'AGOL') & (row['Activated'] == 'Yes')):
-        dest_dir = os.path.join(__ROOT_DIR, row['Local Directory'])
-        data_item_id = row['Data Item ID']
-        # Feature service items with geodatabase as the only format option
-        if row['File Type'] == 'FileGeodatabase':
+                    batch_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        try:
+            with open_arrow(layer[0], layer=layer[1], use_pyarrow=True, batch_size=batch_size) as (meta, reader):
+                for batch in reader:
+                    if not put(batch):
+                        return
+        except Exception as e:
+            put(e)
+            return
+        put(None)
+
+    def merged_batches():
+        for batch_queue, geometry_name, multi_prefix in zip(batch_queues, geometry_names, multi_prefixes):
+            while True:
+                batch = batch_queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                count[0] += batch.num_rows
+                yield conform_batch(batch, schema, geometry_name, multi_prefix)
+
+    driver = 'GPKG' if out_dataset.lower().endswith('.gpkg') else 'OpenFileGDB'
+    layer_options = {'CREATE_SHAPE_AREA_AND_LENGTH_FIELDS': 'YES'} if driver == 'OpenFileGDB' else {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for layer, batch_queue in zip(layers, batch_queues):
+            executor.submit(read_batches, layer, batch_queue)
+        try:
+            write_arrow(pa.RecordBatchReader.from_batches(schema, merged_batches()), out_dataset, layer=out_layer, driver=driver,
+                        geometry_name='wkb_geometry', geometry_type=geometry_type, crs=crs, layer_options=layer_options)
+        finally:
+            stopped.set()
+    return count[0]
+
+def merge_feature_classes(source, folder_path):
+    """
+    Merges the File Names feature classes in `folder_path` into New File Names, in the New GDB Name geodatabase there
+    Uses merge_layers when pyogrio, pyarrow, and pyproj are installed and the inputs can be read without arcpy, and Merge
+    otherwise (or when merge_layers raises MergeUnsupported). Either way the merge holds the lock of the geodatabase, so
+    sources merging into the same geodatabase write to it one at a time.
+    """
+    in_data_list = [os.path.join(folder_path, in_data) for in_data in source.file_names]
+    fullpath_fgdbrename = os.path.join(folder_path, source.new_gdb_name)
+    out_data = os.path.join(fullpath_fgdbrename, source.new_file_name)
+    try:
+        import pyarrow
+        import pyogrio
+        import pyproj
+    except ImportError:
+        pyogrio = None
+    with get_gdb_lock(fullpath_fgdbrename):
+        if pyogrio is not None and all(split_layer_path(in_data) for in_data in in_data_list):
+            try:
+                count = merge_layers(in_data_list, fullpath_fgdbrename, source.new_file_name)
+                print("Merged feature class: {0} ({1} features)".format(source.new_file_name, count))
+                return
+            except MergeUnsupported as e:
+                print("Could not merge {0} with pyogrio ({1}). Merging with arcpy...".format(source.new_file_name, e))
+        import arcpy
+        with arcpy_lock:
+            arcpy.env.workspace = folder_path
+            if arcpy.Exists(out_data):
+                arcpy.env.workspace = fullpath_fgdbrename
+                ## Delete existing feature classes
+                arcpy.management.Delete(out_data)
+            arcpy.management.Merge(in_data_list, out_data)
+    print("Merged feature class: {0}".format(source.new_file_name))
+
+def mosaic_windowed(in_paths, out_path, method='LAST', crs='EPSG:4269', block_size=_MOSAIC_BLOCK_SIZE, workers=_MOSAIC_WORKERS):
+    """
+    Mosaics single-band rasters into a 32-bit float Cloud Optimized GeoTIFF with rasterio, one output block at a time
+    The output grid covers all the inputs in `crs` at the cell size of the first input. Each block is read from the
+    inputs that overlap it only (through a WarpedVRT of each input onto the output grid, so inputs in other coordinate
+    systems are reprojected), by `workers` threads with their own dataset handles. Where inputs overlap, the 'LAST'
+    method keeps the value of the last input with data and 'FIRST' the value of the first, as MosaicToNewRaster does.
+    At most two blocks per worker are held in memory. The blocks are written to a tiled GeoTIFF, which is then copied to
+    `out_path` as a COG (with overviews).
+    """
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.shutil import copy as copy_raster
+    from rasterio.transform import from_origin
+    from rasterio.vrt import WarpedVRT
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import Window, bounds as get_window_bounds
+    if method not in ('FIRST', 'LAST'):
+        raise ValueError("Unsupported mosaic method: {0}".format(method))
+    source_bounds = []
+    nodata = None
+    resolution = None
+    for path in in_paths:
+        with rasterio.open(path) as src:
+            source_bounds.append(transform_bounds(src.crs, crs, *src.bounds))
+            if resolution is None:
+                with WarpedVRT(src, crs=crs) as vrt:
+                    resolution = vrt.res
+                nodata = src.nodata
+    nodata = -3.4028234663852886e+38 if nodata is None else nodata
+    left, bottom = min(bounds[0] for bounds in source_bounds), min(bounds[1] for bounds in source_bounds)
+    right, top = max(bounds[2] for bounds in source_bounds), max(bounds[3] for bounds in source_bounds)
+    width = max(1, int(round((right - left) / resolution[0])))
+    height = max(1, int(round((top - bottom) / resolution[1])))
+    transform = from_origin(left, top, resolution[0], resolution[1])
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def get_sources():
+        if not hasattr(local, 'sources'):
+            local.sources = []
+            for path in in_paths:
+                src = rasterio.open(path)
+                vrt = WarpedVRT(src, crs=crs, transform=transform, width=width, height=height, nodata=nodata, resampling=Resampling.nearest)
+                local.sources.append(vrt)
+                with handles_lock:
+                    handles.extend([vrt, src])
+        return local.sources
+
+    def read_block(window):
+        block_left, block_bottom, block_right, block_top = get_window_bounds(window, transform)
+        block = np.full((window.height, window.width), nodata, dtype='float32')
+        filled = np.zeros(block.shape, dtype=bool)
+        for vrt, bounds in zip(get_sources(), source_bounds):
+            if bounds[0] >= block_right or bounds[2] <= block_left or bounds[1] >= block_top or bounds[3] <= block_bottom:
+                continue
+            data = vrt.read(1, window=window, masked=True)
+            take = ~np.ma.getmaskarray(data)
+            if method == 'FIRST':
+                take &= ~filled
+            block[take] = data.data[take]
+            filled |= take
+        return window, block
+
+    temp_path = out_path + '.blocks.tif'
+    profile = dict(driver='GTiff', width=width, height=height, count=1, dtype='float32', crs=crs, transform=transform, nodata=nodata,
+                   tiled=True, blockxsize=block_size, blockysize=block_size, compress='DEFLATE', predictor=3, BIGTIFF='IF_SAFER')
+    windows = [Window(col, row, min(block_size, width - col), min(block_size, height - row))
+               for row in range(0, height, block_size) for col in range(0, width, block_size)]
+    try:
+        with rasterio.open(temp_path, 'w', **profile) as dst, ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for window in windows:
+                pending.add(executor.submit(read_block, window))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        dst.write(future.result()[1], 1, window=future.result()[0])
+            for future in pending:
+                dst.write(future.result()[1], 1, window=future.result()[0])
+    finally:
+        for handle in handles:
+            handle.close()
+    copy_raster(temp_path, out_path, driver='COG', compress='DEFLATE', predictor='YES', blocksize=block_size, bigtiff='IF_SAFER')
+    os.remove(temp_path)
+    return width, height
+
+def mosaic_rasters(source, folder_path):
+    """
+    Mosaics the File Names raster datasets in `folder_path` into the New File Names GeoTIFF there (e.g. 3DEP DEM)
+    Uses mosaic_windowed when rasterio is installed, and MosaicToNewRaster otherwise.
+    """
+    in_data = source.file_names
+    out_data = source.new_file_name
+    try:
+        import rasterio
+    except ImportError:
+        rasterio = None
+    if rasterio is not None:
+        width, height = mosaic_windowed([os.path.join(folder_path, name) for name in in_data], os.path.join(folder_path, out_data))
+        print("Merged raster: {0} ({1} x {2} cells)".format(out_data, width, height))
+        return
+    import arcpy
+    with arcpy_lock:
+        arcpy.env.workspace = folder_path
+        arcpy.management.MosaicToNewRaster(in_data, folder_path, out_data,
+                                            'GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]',
+                                            "32_BIT_FLOAT", None, 1, "LAST", "FIRST")
+    print("Merged raster: {0}".format(out_data))
+
+# Little-endian WKB point, as written to the geometry column of csv points
+WKB_POINT = np.dtype([('byte_order', 'u1'), ('wkb_type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+def get_wkb_points(x, y):
+    """Returns an Arrow binary array of WKB points from the `x` and `y` arrays, built in one numpy buffer"""
+    import pyarrow as pa
+    points = np.zeros(len(x), dtype=WKB_POINT)
+    points['byte_order'] = 1
+    points['wkb_type'] = 1 ## Point
+    points['x'] = x
+    points['y'] = y
+    offsets = np.arange(len(x) + 1, dtype='int32') * WKB_POINT.itemsize
+    return pa.Array.from_buffers(pa.binary(), len(x), [None, pa.py_buffer(offsets), pa.py_buffer(points.tobytes())])
+
+def get_valid_coordinates(x, y):
+    """Returns a mask of the rows of the `x` and `y` Series that are numbers within the range of longitudes and latitudes (and not 0, 0)"""
+    return x.between(-180, 180) & y.between(-90, 90) & ~((x == 0) & (y == 0))
+
+def csv_to_geopackage(in_csv, out_gpkg, table, x_field='LONGITUDE83', y_field='LATITUDE83', chunk_rows=_CSV_CHUNK_ROWS, srs_id=4269):
+    """
+    Converts the rows of a csv file to points in a GeoPackage layer with pyogrio, reading `chunk_rows` rows at a time
+    The layer is created with a declared schema before the first chunk and each chunk is appended to it: attributes are
+    written as text, as they are in the csv (so a chunk cannot change them, e.g. by dropping leading zeros), and the
+    coordinate columns as numbers. Rows whose coordinates are missing, not numbers, or out of range are dropped.
+    The GeoPackage is written to `<path>.writing.gpkg` and renamed to `path` once every chunk is written, replacing any
+    earlier copy, so an interrupted conversion never leaves a partial GeoPackage behind.
+    Return:
+    (written, dropped) -- Numbers of rows written as points and dropped
+    """
+    import pyarrow as pa
+    from pyogrio.raw import write_arrow
+    columns = list(pd.read_csv(in_csv, nrows=0).columns)
+    for field in (x_field, y_field):
+        if field not in columns:
+            raise ValueError("{0} has no {1} column".format(in_csv, field))
+    # Keep attribute names clear of the fid and geometry columns
+    schema = pa.schema([(column if column.lower() not in ('fid', 'geom') else column + '_', pa.float64() if column in (x_field, y_field) else pa.string())
+                        for column in columns] + [('geom', pa.binary())])
+    temp_path = os.path.splitext(out_gpkg)[0] + '.writing.gpkg'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    write_layer = functools.partial(write_arrow, path=temp_path, layer=table, driver='GPKG', geometry_name='geom', geometry_type='Point',
+                                    crs='EPSG:{0}'.format(srs_id))
+    written = 0
+    dropped = 0
+    try:
+        write_layer(schema.empty_table())
+        for chunk in pd.read_csv(in_csv, dtype=object, keep_default_na=False, na_values=[''], chunksize=chunk_rows):
+            x = pd.to_numeric(chunk[x_field], errors='coerce')
+            y = pd.to_numeric(chunk[y_field], errors='coerce')
+            valid = get_valid_coordinates(x, y)
+            dropped += len(chunk) - int(valid.sum())
+            if not valid.any():
+                continue
+            x = x[valid].to_numpy(dtype='float64')
+            y = y[valid].to_numpy(dtype='float64')
+            arrays = [pa.array(x) if column == x_field else pa.array(y) if column == y_field else pa.array(chunk[column][valid], type=pa.string(), from_pandas=True)
+                      for column in columns]
+            write_layer(pa.Table.from_arrays(arrays + [get_wkb_points(x, y)], schema=schema), append=True)
+            written += len(x)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, out_gpkg)
+    return written, dropped
+
+def csv_to_points(source, folder_path):
+    """
+    Converts a csv download to a point layer (named by the last of its New File Names) in a GeoPackage of the same name
+    next to it (e.g. NPDES Discharge Points), instead of a feature class of its New GDB Name geodatabase
+    """
+    print("Converting csv to points...")
+    out_data = source.new_file_name
+    in_csv = os.path.join(folder_path, source.file_names[0])
+    out_gpkg = os.path.join(folder_path, out_data + '.gpkg')
+    written, dropped = csv_to_geopackage(in_csv, out_gpkg, out_data)
+    print("Wrote {0} points to {1} ({2} rows without valid coordinates dropped)".format(written, out_gpkg, dropped))
+
+# Post-processing steps that can be listed in the 'Post Processing' column of the Sources sheet, with where they run:
+# 'local' steps run on the staged Local Directory of the source before it is swapped in, 'parent' steps run on its
+# New GDB Directory (e.g. Open Street Map) after the sources in that folder are swapped in
+POST_PROCESSING_STEPS = {'rename_gdb': (rename_gdb, 'local'),
+                         'create_gdb': (create_gdb, 'local'),
+                         'merge': (merge_feature_classes, 'local'),
+                         'mosaic': (mosaic_rasters, 'local'),
+                         'csv_to_points': (csv_to_points, 'local'),
+                         'create_parent_gdb': (create_gdb, 'parent'),
+                         'merge_to_parent': (merge_feature_classes, 'parent')}
+
+# Steps of the sources that were post-processed by row ID before the 'Post Processing' and 'Depends On' columns,
+# used for rows where those columns are missing or empty
+_LEGACY_POST_PROCESSING = {3: ['rename_gdb'], 68: ['rename_gdb'],
+                           23: ['create_parent_gdb', 'merge_to_parent'],
+                           26: ['merge_to_parent'], 29: ['merge_to_parent'], 32: ['merge_to_parent'],
+                           35: ['mosaic'],
+                           40: ['create_gdb', 'merge'], 47: ['create_gdb'], 63: ['create_gdb', 'merge'], 67: ['create_gdb', 'merge']}
+_LEGACY_DEPENDS_ON = {26: [23], 29: [23], 32: [23]} ## Merges into the Open Street Map geodatabase that row 23 creates
+
+_AGOL_FILE_TYPES = ('FileGeodatabase', 'Multiple (FileGeodatabase)') ## AGOL File Types that are downloaded (the second is exported first)
+
+def get_cell_text(row, column):
+    """Returns the stripped text of a cell of the Sources sheet, or None when it is empty or the column is missing"""
+    value = row.get(column)
+    if value is None or pd.isna(value) or not str(value).strip():
+        return None
+    return str(value).strip()
+
+class Source(collections.namedtuple('Source', ['id', 'activated', 'availability', 'source_type', 'local_directory', 'urls',
+                                               'data_item_id', 'file_type', 'file_names', 'new_file_names', 'original_gdb_name',
+                                               'new_gdb_name', 'new_gdb_directory', 'post_processing', 'depends_on'])):
+    """
+    A row of the Sources sheet, parsed once: empty cells are None, comma-separated columns are tuples, `urls` are the
+    URLs downloaded for it ('Dataset' or multi-item 'Datasets'), and `post_processing` and `depends_on` fall back to the
+    legacy steps of its ID when the 'Post Processing' and 'Depends On' columns are missing or empty
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row):
+        """Parses a row of the Sources sheet, raising ValueError when its ID (or Depends On) is not a number"""
+        source_id = get_cell_text(row, 'ID')
+        if source_id is None:
+            raise ValueError("no ID")
+        try:
+            source_id = int(float(source_id))
+        except ValueError:
+            raise ValueError("ID '{0}' is not a number".format(source_id))
+        names = lambda column: tuple(Convert(get_cell_text(row, column))) if get_cell_text(row, column) else ()
+        source_type = get_cell_text(row, 'Source Type')
+        web_file = get_cell_text(row, 'Web File for Download')
+        if source_type == 'Dataset' and web_file:
+            urls = (web_file,)
+        elif source_type == 'Datasets' and web_file:
+            urls = tuple(web_file.rstrip('/') + '/' + item for item in names('Items'))
+        else:
+            urls = ()
+        file_type = get_cell_text(row, 'File Type')
+        if get_cell_text(row, 'Post Processing'):
+            post_processing = names('Post Processing')
+        elif file_type == 'CSV':
+            post_processing = ('csv_to_points',)
+        else:
+            post_processing = tuple(_LEGACY_POST_PROCESSING.get(source_id, ()))
+        if get_cell_text(row, 'Depends On'):
+            try:
+                depends_on = tuple(int(float(row_id)) for row_id in names('Depends On'))
+            except ValueError:
+                raise ValueError("Depends On '{0}' is not a list of IDs".format(get_cell_text(row, 'Depends On')))
+        else:
+            depends_on = tuple(_LEGACY_DEPENDS_ON.get(source_id, ()))
+        return cls(source_id, get_cell_text(row, 'Activated') == 'Yes', get_cell_text(row, 'Avaliability'), source_type,
+                   get_cell_text(row, 'Local Directory'), urls, get_cell_text(row, 'Data Item ID'), file_type, names('File Names'),
+                   names('New File Names'), get_cell_text(row, 'Original GDB Name'), get_cell_text(row, 'New GDB Name'),
+                   get_cell_text(row, 'New GDB Directory'), post_processing, depends_on)
+
+    @property
+    def new_file_name(self):
+        """The last of the New File Names (the output of merge, mosaic, and csv_to_points)"""
+        return self.new_file_names[-1] if self.new_file_names else None
+
+    @property
+    def local_steps(self):
+        return tuple(step for step in self.post_processing if POST_PROCESSING_STEPS[step][1] == 'local')
+
+    @property
+    def parent_steps(self):
+        return tuple(step for step in self.post_processing if POST_PROCESSING_STEPS[step][1] == 'parent')
+
+    def get_problems(self, source_ids, local_dirs=None):
+        """
+        Returns what keeps the source from being downloaded and post-processed, given the IDs of every source and the
+        Local Directories of the other downloaded sources by ID (which it must not share or be nested with, since each
+        source is staged and swapped into its Local Directory on its own)
+        """
+        problems = []
+        if not self.local_directory:
+            problems.append("no Local Directory")
+        elif self.availability in ('URL', 'AGOL'):
+            for row_id, local_dir in (local_dirs or {}).items():
+                if row_id == self.id:
+                    continue
+                if is_in_directory(self.local_directory, local_dir) and is_in_directory(local_dir, self.local_directory):
+                    problems.append("Local Directory is also used by row {0}".format(row_id))
+                elif is_in_directory(self.local_directory, local_dir):
+                    problems.append("Local Directory is inside the Local Directory of row {0}".format(row_id))
+                elif is_in_directory(local_dir, self.local_directory):
+                    problems.append("Local Directory contains the Local Directory of row {0}".format(row_id))
+        if self.availability == 'URL':
+            if self.source_type not in ('Dataset', 'Datasets'):
+                problems.append("unknown Source Type '{0}'".format(self.source_type))
+            elif not self.urls:
+                problems.append("no Web File for Download" + (" or Items" if self.source_type == 'Datasets' else ""))
+        elif self.availability == 'AGOL':
+            if not self.data_item_id:
+                problems.append("no Data Item ID")
+            if self.file_type not in _AGOL_FILE_TYPES:
+                problems.append("unsupported AGOL File Type '{0}'".format(self.file_type))
+        for step in self.post_processing:
+            if step not in POST_PROCESSING_STEPS:
+                problems.append("unknown post-processing step '{0}'".format(step))
+            elif step in ('merge', 'merge_to_parent', 'mosaic', 'csv_to_points') and not (self.file_names and self.new_file_names):
+                problems.append("{0} needs File Names and New File Names".format(step))
+            elif step in ('rename_gdb', 'create_gdb', 'create_parent_gdb', 'merge', 'merge_to_parent') and not self.new_gdb_name:
+                problems.append("{0} needs a New GDB Name".format(step))
+            if step == 'rename_gdb' and not self.original_gdb_name:
+                problems.append("rename_gdb needs an Original GDB Name")
+            if step in POST_PROCESSING_STEPS and POST_PROCESSING_STEPS[step][1] == 'parent' and not self.new_gdb_directory:
+                problems.append("{0} needs a New GDB Directory".format(step))
+        for row_id in self.depends_on:
+            if row_id not in source_ids:
+                problems.append("depends on unknown row {0}".format(row_id))
+        return problems
+
+class SourceRegistry:
+    """
+    The sources of the Sources sheet, parsed and checked once before anything is downloaded
+    `by_id` holds every source. The activated sources without problems are indexed (in sheet order) by Avaliability,
+    File Type, and post-processing step, so each phase visits only the sources it needs. `invalid` maps the IDs of
+    activated sources with problems to them; those sources are left out of the indexes.
+    """
+
+    def __init__(self, sources):
+        self.sources = tuple(sources)
+        self.by_id = {}
+        for source in self.sources:
+            if source.id in self.by_id:
+                raise ValueError("The Sources sheet has more than one row with ID {0}".format(source.id))
+            self.by_id[source.id] = source
+        self.invalid = {}
+        local_dirs = {source.id: source.local_directory for source in self.sources
+                      if source.activated and source.availability in ('URL', 'AGOL') and source.local_directory}
+        by_availability, by_file_type, by_step = {}, {}, {}
+        for source in self.sources:
+            if not source.activated:
+                continue
+            problems = source.get_problems(self.by_id, local_dirs)
+            if problems:
+                self.invalid[source.id] = problems
+                continue
+            by_availability.setdefault(source.availability, []).append(source)
+            by_file_type.setdefault(source.file_type, []).append(source)
+            for step in source.post_processing:
+                by_step.setdefault(step, []).append(source)
+        self.by_availability = {name: tuple(sources) for name, sources in by_availability.items()}
+        self.by_file_type = {name: tuple(sources) for name, sources in by_file_type.items()}
+        self.by_step = {name: tuple(sources) for name, sources in by_step.items()}
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Parses the rows of the Sources sheet, raising ValueError for every row whose ID (or Depends On) is not a number"""
+        sources = []
+        errors = []
+        for index, row in df.iterrows():
+            try:
+                sources.append(Source.from_row(row))
+            except ValueError as e:
+                # Rows are numbered as in Excel, below the header row
+                errors.append("row {0}: {1}".format(index + 2, e))
+        if errors:
+            raise ValueError("Could not read the Sources sheet: {0}".format('; '.join(errors)))
+        return cls(sources)
+
+    def get(self, availability):
+        """Returns the activated sources without problems of an Avaliability (e.g. 'URL'), in sheet order"""
+        return self.by_availability.get(availability, ())
+
+    def get_with_steps(self, scope):
+        """Returns the activated sources without problems that have steps running in `scope` ('local' or 'parent'), in sheet order"""
+        ids = set(source.id for step, (func, step_scope) in POST_PROCESSING_STEPS.items() if step_scope == scope
+                  for source in self.by_step.get(step, ()))
+        return tuple(source for source in self.sources if source.id in ids)
+
+def is_in_directory(path, directory):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+def post_process_source(source, folder_path, step_names, telemetry=None):
+    """
+    Runs the post-processing steps of a source on `folder_path` in order, adding the step that fails to Issue_List
+    With a DownloadTelemetry, the time of each step is recorded in it.
+    """
+    for step in step_names:
+        started = time.perf_counter()
+        try:
+            POST_PROCESSING_STEPS[step][0](source, folder_path)
+        except Exception as e:
+            Issue_List.append("{0} ({1})".format(source.local_directory, step))
+            if telemetry is not None:
+                telemetry.record('post', source.id, step=step, seconds=time.perf_counter() - started, ok=False, error=str(e))
+            raise
+        if telemetry is not None:
+            telemetry.record('post', source.id, step=step, seconds=time.perf_counter() - started, ok=True)
+
+def swap_source(source, staging_dir, local_dir, root_dir, manifest, telemetry=None):
+    """Swaps the staging directory of a source into its Local Directory and moves its manifest entries with it"""
+    started = time.perf_counter()
+    try:
+        swap_staging_dir(staging_dir, local_dir, root_dir)
+    except OSError as e:
+        if telemetry is not None:
+            telemetry.record('swap', source.id, seconds=time.perf_counter() - started, ok=False, error=str(e))
+        print("Could not swap in {0}, its staged copy is kept at: {1}".format(local_dir, staging_dir))
+        Issue_List.append(local_dir)
+        # Download the source again next run, the staged copy is deleted then
+        manifest.move_local_files(staging_dir)
+        raise
+    manifest.move_local_files(staging_dir, local_dir)
+    if telemetry is not None:
+        telemetry.record('swap', source.id, seconds=time.perf_counter() - started, ok=True)
+    print("Swapped in: {0}".format(local_dir))
+
+def build_post_processing_graph(registry, staging_dirs, root_dir, manifest, workers, telemetry=None):
+    """
+    Returns a TaskGraph of the downloads, post-processing, and swaps of the staged sources of a SourceRegistry
+    Each staged source gets a '<ID>:download' task (finished by the downloads), a '<ID>:post' task running its local steps
+    on the staging directory, and a '<ID>:swap' task. A source with parent steps gets a '<ID>:parent' task when it or a
+    source in its New GDB Directory is staged, which waits for those sources to be swapped in and for the parent tasks
+    of the rows it depends on. The steps and swaps are recorded in the DownloadTelemetry, when there is one.
+    """
+    graph = TaskGraph(workers)
+    local_dirs = {}
+    for source_id, staging_dir in staging_dirs.items():
+        source = registry.by_id[source_id]
+        local_dirs[source.id] = os.path.join(root_dir, source.local_directory)
+        graph.add('{0}:download'.format(source.id))
+        graph.add('{0}:post'.format(source.id), functools.partial(post_process_source, source, staging_dir, source.local_steps, telemetry),
+                  ['{0}:download'.format(source.id)])
+        graph.add('{0}:swap'.format(source.id), functools.partial(swap_source, source, staging_dir, local_dirs[source.id], root_dir, manifest, telemetry),
+                  ['{0}:post'.format(source.id)])
+    parent_sources = []
+    for source in registry.get_with_steps('parent'):
+        parent_dir = os.path.join(root_dir, source.new_gdb_directory)
+        inputs = [source_id for source_id, local_dir in local_dirs.items() if is_in_directory(local_dir, parent_dir)]
+        if source.id in staging_dirs and source.id not in inputs:
+            inputs.append(source.id)
+        if inputs:
+            parent_sources.append((source, parent_dir, inputs))
+    parent_ids = [source.id for source, parent_dir, inputs in parent_sources]
+    for source, parent_dir, inputs in parent_sources:
+        deps = ['{0}:swap'.format(source_id) for source_id in inputs]
+        deps += ['{0}:parent'.format(source_id) for source_id in source.depends_on if source_id in parent_ids]
+        graph.add('{0}:parent'.format(source.id), functools.partial(post_process_source, source, parent_dir, source.parent_steps, telemetry), deps)
+    return graph
+
+# An ArcGIS Online item to download: `key` identifies it to the caller (e.g. the row ID), `export` is True for items
+# that have to be exported to a File Geodatabase first, and the download is saved to `dest_dir`
+AgolJob = collections.namedtuple('AgolJob', ['key', 'item_id', 'export', 'dest_dir'])
+
+class AgolClient:
+    """
+    Exports and downloads ArcGIS Online (or Portal) items through the ArcGIS REST API with requests
+    download_items() submits the exports of all items up front and polls their jobs together, downloading each item as
+    soon as it is ready, with at most `workers` requests or downloads at a time. The client signs in with a username and
+    password, or uses a token (e.g. of the ArcGIS Pro sign-in) along with the referer it was issued for.
+    """
+
+    def __init__(self, portal_url, username=None, password=None, token=None, referer=None, workers=_AGOL_WORKERS, poll_interval=_AGOL_POLL_INTERVAL,
+                 export_timeout=_AGOL_EXPORT_TIMEOUT):
+        self.portal_url = portal_url.rstrip('/')
+        self.rest_url = self.portal_url + '/sharing/rest/'
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.export_timeout = export_timeout
+        self.session = requests.Session()
+        self.token = token
+        if referer:
+            self.session.headers['Referer'] = referer
+        if username and password:
+            self.token = self.request('generateToken', 'POST', username=username, password=password, referer=self.portal_url,
+                                      client='referer', expiration=240)['token']
+            self.session.headers['Referer'] = self.portal_url
+        self.username = self.request('community/self')['username']
+
+    def request(self, path, method='GET', **params):
+        """Sends a REST request and returns its JSON response, raising RuntimeError for errors reported by the portal"""
+        params['f'] = 'json'
+        if self.token:
+            params['token'] = self.token
+        if method == 'POST':
+            response = self.session.post(self.rest_url + path, data=params, timeout=60)
+        else:
+            response = self.session.get(self.rest_url + path, params=params, timeout=60)
+        response.raise_for_status()
+        result = response.json()
+        if 'error' in result:
+            raise RuntimeError("ArcGIS REST request {0} failed: {1}".format(path, result['error'].get('message')))
+        return result
+
+    def get_item(self, item_id):
+        return self.request('content/items/{0}'.format(item_id))
+
+    def start_export(self, item_id, title):
+        """Submits the export of an item to a File Geodatabase and returns (export item ID, job ID) without waiting for it"""
+        result = self.request('content/users/{0}/export'.format(self.username), 'POST', itemId=item_id, title=title,
+                              exportFormat='File Geodatabase')
+        return result['exportItemId'], result['jobId']
+
+    def get_export_status(self, export_item_id, job_id):
+        """Returns the status of an export job ('processing', 'completed', or 'failed')"""
+        return self.request('content/users/{0}/items/{1}/status'.format(self.username, export_item_id), jobId=job_id, jobType='export')['status']
+
+    def delete_item(self, item_id):
+        self.request('content/users/{0}/items/{1}/delete'.format(self.username, item_id), 'POST')
+
+    def delete_export(self, export_item_id):
+        """Deletes an export item from the portal, printing (instead of raising) the error when it cannot be deleted"""
+        try:
+            self.delete_item(export_item_id)
+        except Exception as e:
+            print("Could not delete the export item {0} from the portal".format(export_item_id))
+            print(e)
+
+    def download_item(self, item_id, dest_dir, filename, stats=None):
+        """
+        Streams the data of an item to `dest_dir`/`filename` (through a .part file) and returns its full path
+        With a `stats` dict, the host, bytes received, and time to first byte are recorded in it (see download_url).
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        fullpath_filename = os.path.join(dest_dir, filename)
+        params = {'token': self.token} if self.token else {}
+        stats = stats if stats is not None else {}
+        stats.update(host=urlparse(self.portal_url).netloc, bytes=0, ttfb=None)
+        request_start = time.perf_counter()
+        with self.session.get(self.rest_url + 'content/items/{0}/data'.format(item_id), params=params, stream=True, timeout=60) as response:
+            stats['ttfb'] = time.perf_counter() - request_start
+            response.raise_for_status()
+            with open(fullpath_filename + '.part', 'wb') as f:
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    stats['bytes'] += len(chunk)
+                    f.write(chunk)
+        os.replace(fullpath_filename + '.part', fullpath_filename)
+        return fullpath_filename
+
+    def download_items(self, jobs, on_done, cache=None, telemetry=None):
+        """
+        Downloads the items of `jobs`, exporting those with `export` set, and calls on_done(job, path, error) from a worker
+        thread as each one finishes (with path None and the exception when it failed)
+        Items that are in the DownloadCache with the same modified time are linked from it instead. Export items are
+        deleted from the portal once they are downloaded, or once their export or download failed or took longer than
+        `export_timeout` seconds (or the downloads were interrupted). With a DownloadTelemetry, the download of each item is recorded in it as
+        an event of its job's key, including the time its export took.
+        """
+        lock = threading.Lock()
+        exports = {}
+        futures = []
+        start_times = {}
+        stats = {}
+
+        def finish(job, path=None, error=None):
+            if telemetry is not None:
+                telemetry.record('download', job.key, item_id=job.item_id, seconds=time.perf_counter() - start_times[job],
+                                 ok=error is None, error=str(error) if error is not None else None, **stats[job])
             try:
-                data_item = gis.content.get(data_item_id)
-                data_item.get_data()
-                filename = data_item.download(dest_dir)
-                ext_dir_name = os.path.join(dest_dir, os.path.splitext(filename)[0])
-                fullpath_filename = os.path.join(dest_dir, filename)
-                if filename.endswith('.zip'):
-                    shutil.unpack_archive(fullpath_filename, os.path.join(dest_dir, ext_dir_name))
-                    print("unzipped: {0}.\n".format(fullpath_filename))
-                    ## delete zip file after extract
-                    os.remove(fullpath_filename)
-                    Write_Date_to_Text_File(filename, dest_dir)
+                on_done(job, path, error)
             except Exception as e:
-                print("Could not get gis content for {}".format(data_item_id))
+                print("Could not handle the download of {0}".format(job.item_id))
                 print(e)
-                Issue_List.append(data_item_id)
-        # Feature service items with multiple download format options
-        elif row['File Type'] == 'Multiple (FileGeodatabase)':
+
+        def start(job):
+            start_times[job] = time.perf_counter()
+            stats[job] = {'retries': 0, 'cache_hit': False}
             try:
-                data_item = data_item.export(title = data_item_id, export_format = 'FGDB', wait = True)
-                data_item.get_data()
-                filename = data_item.download(dest_dir)
-                fullpath_filename = os.path.join(dest_dir, filename)
-                if filename.endswith('.zip'):
-                    shutil.unpack_archive(fullpath_filename, dest_dir)
-                    print("unzipped: {0}.\n".format(fullpath_filename))  
-                    ## delete zip file after extract
-                    os.remove(fullpath_filename) 
-                    Write_Date_to_Text_File(filename, dest_dir)
+                item = self.get_item(job.item_id)
+                cache_key = '{0}:{1}:{2}'.format('agol-export' if job.export else 'agol', job.item_id, item.get('modified'))
+                path = cache.fetch(cache_key, job.dest_dir)[0] if cache is not None else None
+                if path is not None:
+                    stats[job]['cache_hit'] = True
+                    print("'{0}' is unchanged in the download cache, linked it to: {1}".format(job.item_id, path))
+                elif job.export:
+                    with lock:
+                        exports[job] = self.start_export(job.item_id, job.item_id) + (cache_key,)
+                    return
+                else:
+                    path = self.download_item(job.item_id, job.dest_dir, item.get('name') or job.item_id + '.zip', stats[job])
+                    if cache is not None:
+                        cache.store(cache_key, path)
             except Exception as e:
-                print("Could not get gis content for {}".format(data_item_id))
-                print(e)
-                Issue_List.append(data_item_id)
-
-print("Downloads that raised issues: {0}", format(Issue_List))
-
-# Rename the specififed geodatabases
-print("Checking for geodatabases to rename...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    #if ((row['ID'] == 3) or (row['ID'] == 68) or (row['ID'] == 69)): ## Select geodatabases to rename using row ID
-    if ((row['ID'] == 3) or (row['ID'] == 68)): ## Select geodatabases to rename using row ID
-        fullpath_fgdbname = os.path.join(__ROOT_DIR, row['Local Directory'], row['Original GDB Name'])
-        arcpy.env.workspace = os.path.join(__ROOT_DIR, row['Local Directory'])
-        in_data = row['Original GDB Name']
-        out_data = row['New GDB Name']
-        data_type = 'FileGeodatabase'
-        if os.path.exists(fullpath_fgdbname):
-            arcpy.management.Rename(in_data, out_data, data_type)
-            print("geodatabase renamed as: {0}".format(row['New GDB Name']))
-
-# Create the specified geodatabases
-print("Checking for new geodatabases to create...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    # Create geodatabase in parent folder (e.g. Open Street Map) 
-    if row['ID'] == 23: ## Select geodatabases to rename using row ID
-        folder_path = os.path.join(__ROOT_DIR, row['New GDB Directory']) ## Folder path where the new geodatabase will be located 
-        fullpath_fgdbrename = os.path.join(folder_path, row['New GDB Name'])
-        if os.path.exists(fullpath_fgdbrename):
-            pass
-        else: 
-            arcpy.CreateFileGDB_management(folder_path, row['New GDB Name'])
-            print("Created geodatabase: {0}".format(row['New GDB Name']))
-    # Create geodatabase in same folder (e.g. NWI) 
-    elif ((row['ID'] == 40) or (row['ID'] == 47) or (row['ID'] == 63) or (row['ID'] == 67)): ## Select geodatabases to create using row ID
-        folder_path = os.path.join(__ROOT_DIR, row['Local Directory']) ## Same folder path as the download
-        fullpath_fgdbrename = os.path.join(folder_path, row['New GDB Name'])
-        if os.path.exists(fullpath_fgdbrename):
-            pass
-        else: 
-            arcpy.CreateFileGDB_management(folder_path, row['New GDB Name'])
-            print("Created geodatabase: {0}".format(row['New GDB Name']))
-
-# Merge the specified feature classes
-print("Checking for feature classes to merge...")
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    # 4 feature classes to geodatabase in parent folder (e.g. Open Street Map)
-    if ((row['ID'] == 23) or (row['ID'] == 26) or (row['ID'] == 29) or (row['ID'] == 32)): ## Select using row ID
-        in_data_str = row['File Names']
-        in_data_list = Convert(in_data_str)
-        fullpath_fgdbrename = os.path.join(__ROOT_DIR, row['New GDB Directory'], row['New GDB Name'])
-        arcpy.env.workspace = os.path.join(__ROOT_DIR,  row['New GDB Directory'])
-        in_data1 = os.path.join(arcpy.env.workspace, in_data_list[0])
-        in_data2 = os.path.join(arcpy.env.workspace, in_data_list[1])
-        in_data3 = os.path.join(arcpy.env.workspace, in_data_list[2])
-        in_data4 = os.path.join(arcpy.env.workspace, in_data_list[3])
-        out_data = os.path.join(fullpath_fgdbrename, row['New File Names'])
-        if arcpy.Exists(out_data):
-            arcpy.env.workspace = fullpath_fgdbrename
-            ## Delete existing feature classes
-            arcpy.management.Delete(out_data)
-        arcpy.management.Merge([in_data1, in_data2, in_data3, in_data4], out_data)
-        print("Merged feature class: {0}".format(row['New File Names']))
-    # 4 feature classes to geodatabase in same folder (e.g. NWI)
-    if ((row['ID'] == 40) or (row['ID'] == 63)): ## Select using row ID
-        in_data_str = row['File Names']
-        in_data_list = Convert(in_data_str)
-        fullpath_fgdbrename = os.path.join(__ROOT_DIR, row['Local Directory'], row['New GDB Name'])
-        arcpy.env.workspace = os.path.join(__ROOT_DIR, row['Local Directory'])
-        in_data1 = os.path.join(arcpy.env.workspace, in_data_list[0])
-        in_data2 = os.path.join(arcpy.env.workspace, in_data_list[1])
-        in_data3 = os.path.join(arcpy.env.workspace, in_data_list[2])
-        in_data4 = os.path.join(arcpy.env.workspace, in_data_list[3])
-        out_data = os.path.join(fullpath_fgdbrename, row['New File Names'])
-        if arcpy.Exists(out_data):
-            arcpy.env.workspace = fullpath_fgdbrename
-            ## Delete existing feature classes
-            arcpy.management.Delete(out_data)
-        arcpy.management.Merge([in_data1, in_data2, in_data3, in_data4], out_data)
-        print("Merged feature class: {0}".format(row['New File Names']))
-    # 6 feature classes to geodatabase in same folder (e.g. contours)
-    if row['ID'] == 67: ## Select using row ID
-        in_data_str = row['File Names']
-        in_data_list = Convert(in_data_str)
-        fullpath_fgdbrename = os.path.join(__ROOT_DIR, row['Local Directory'], row['New GDB Name'])
-        arcpy.env.workspace = os.path.join(__ROOT_DIR, row['Local Directory'])
-        in_data1 = os.path.join(arcpy.env.workspace, in_data_list[0])
-        in_data2 = os.path.join(arcpy.env.workspace, in_data_list[1])
-        in_data3 = os.path.join(arcpy.env.workspace, in_data_list[2])
-        in_data4 = os.path.join(arcpy.env.workspace, in_data_list[3])
-        in_data5 = os.path.join(arcpy.env.workspace, in_data_list[4])
-        in_data6 = os.path.join(arcpy.env.workspace, in_data_list[5])
-        out_data = os.path.join(fullpath_fgdbrename, row['New File Names'])
-        if arcpy.Exists(out_data):
-            arcpy.env.workspace = fullpath_fgdbrename
-            ## Delete existing feature classes
-            arcpy.management.Delete(out_data)
-        arcpy.management.Merge([in_data1, in_data2, in_data3, in_data4, in_data5, in_data6], out_data)
-        print("Merged feature class: {0}".format(row['New File Names']))
-    # 5 raster datasets to GeoTIFF in same folder (e.g. 3DEP DEM)
-    if row['ID'] == 35: ## Select using row ID
-        in_data_str = row['File Names']
-        in_data_list = Convert(in_data_str)
-        in_data = (in_data_list[0], in_data_list[1], in_data_list[2], in_data_list[3], in_data_list[4])
-        dest_dir = os.path.join(__ROOT_DIR, row['Local Directory'])
-        out_data = row['New File Names']
-        env.workspace = os.path.join(__ROOT_DIR, row['Local Directory'])
-        arcpy.management.MosaicToNewRaster(in_data, dest_dir, out_data,
-                                            'GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]',
-                                            "32_BIT_FLOAT", None, 1, "LAST", "FIRST")
-        print("Merged raster: {0}".format(out_data))
-
-# Convert csv downloads to point feature class (e.g. NPDES Discharge Points)
-for index, row in df_NCRN_GIS_Data_Sources.iterrows():
-    if row['File Type'] == 'CSV':
-        print("Running xy table to point...")
-        out_data_str = row['New File Names']
-        out_data_list = Convert(out_data_str)
-        folder_path = os.path.join(__ROOT_DIR, row['Local Directory'])
-        fullpath_fgdbrename = os.path.join(__ROOT_DIR, row['Local Directory'], row['New GDB Name'])
-        # Read csv into dataframe
-        in_csv = os.path.join(folder_path, row['File Names'])
-        df = pd.read_csv(in_csv, low_memory=False)
-        df["latitude"] = df["LATITUDE83"].astype(float)
-        df["longitude"] = df["LONGITUDE83"].astype(float)
-        out_csv = os.path.join(folder_path, out_data_list[0])
-        # Remove existing copy of the csv
-        if os.path.exists(out_csv):
-            os.remove(out_csv)
-        # Export dataframe to csv
-        df.to_csv(out_csv)
-        in_table = out_csv
-        out_data = out_data_list[1]
-        fullpath_filename = os.path.join(fullpath_fgdbrename, out_data)
-        x_coords = "longitude"
-        y_coords = "latitude"
-        # Delete existing copy of feature class
-        if arcpy.Exists(fullpath_filename):
-            arcpy.env.workspace = fullpath_fgdbrename
-            arcpy.management.Delete(out_data)
-        # Run XY Table to Point tool
-        arcpy.env.workspace = fullpath_fgdbrename
-        arcpy.management.XYTableToPoint(in_table, 
-                                        out_data, 
-                                        x_coords, y_coords, None, 
-                                        'GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]];-400 -400 1920000002.98022;-100000 10000;-100000 10000;8.98315284119521E-09;0.001;0.001;IsHighPrecision')        
-        print("xy table to point was successful")
-
-print("### !!! ALL DONE !!! ###".format())
+                finish(job, error=e)
+                return
+            finish(job, path)
+
+        def download_export(job, export_item_id, cache_key):
+            stats[job]['export_seconds'] = time.perf_counter() - start_times[job]
+            try:
+                try:
+                    item = self.get_item(export_item_id)
+                    path = self.download_item(export_item_id, job.dest_dir, item.get('name') or job.item_id + '.zip', stats[job])
+                    if cache is not None:
+                        cache.store(cache_key, path)
+                finally:
+                    self.delete_export(export_item_id)
+            except Exception as e:
+                finish(job, error=e)
+                return
+            finish(job, path)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                started = [executor.submit(start, job) for job in jobs]
+                # Poll the export jobs together until every export was submitted and has finished
+                while True:
+                    submitting = not all(future.done() for future in started)
+                    with lock:
+                        pending = list(exports.items())
+                    if not pending and not submitting:
+                        break
+                    time.sleep(self.poll_interval)
+                    for job, (export_item_id, job_id, cache_key) in pending:
+                        try:
+                            status = self.get_export_status(export_item_id, job_id)
+                        except Exception as e:
+                            status, error = 'failed', e
+                        else:
+                            error = RuntimeError("The export of {0} failed".format(job.item_id))
+                        if status not in ('completed', 'failed') and time.perf_counter() - start_times[job] > self.export_timeout:
+                            status, error = 'failed', TimeoutError("The export of {0} took longer than {1} seconds".format(job.item_id, self.export_timeout))
+                        if status == 'completed':
+                            futures.append(executor.submit(download_export, job, export_item_id, cache_key))
+                        elif status == 'failed':
+                            try:
+                                finish(job, error=error)
+                            finally:
+                                self.delete_export(export_item_id)
+                        else:
+                            continue
+                        with lock:
+                            del exports[job]
+                wait_futures(futures)
+        finally:
+            # Delete the exports that were still running when the downloads were interrupted
+            with lock:
+                pending = list(exports.values())
+                exports.clear()
+            for export_item_id, job_id, cache_key in pending:
+                self.delete_export(export_item_id)
+
+def connect_agol(portal_url=_AGOL_PORTAL_URL):
+    """
+    Signs in to ArcGIS Online and returns an AgolClient
+    The user of the AGOL_USERNAME and AGOL_PASSWORD environment variables signs in to `portal_url` when they are set, so
+    credentials never have to be written in this script. Otherwise the token of the ArcGIS Pro sign-in is used, for the
+    active portal of ArcGIS Pro (through arcpy.GetSigninToken).
+    """
+    username = os.environ.get('AGOL_USERNAME')
+    password = os.environ.get('AGOL_PASSWORD')
+    if username and password:
+        return AgolClient(portal_url, username, password)
+    import arcpy
+    signin = arcpy.GetSigninToken()
+    if not signin:
+        raise RuntimeError("Set the AGOL_USERNAME and AGOL_PASSWORD environment variables, or sign in to ArcGIS Pro")
+    return AgolClient(arcpy.GetActivePortalURL(), token=signin['token'], referer=signin.get('referer'))
+
+def unzip_agol_download(job, fullpath_filename, error, graph, telemetry=None):
+    """
+    Unzips an ArcGIS Online download (a File Geodatabase item into a folder named after the zip, an export into its
+    dest_dir) and finishes the download task of its source in the post-processing graph
+    With a DownloadTelemetry, the unzip is recorded in it.
+    """
+    if error is not None:
+        print("Could not get gis content for {}".format(job.item_id))
+        print(error)
+        Issue_List.append(job.item_id)
+        graph.finish('{0}:download'.format(job.key), False)
+        return
+    filename = os.path.basename(fullpath_filename)
+    started = time.perf_counter()
+    try:
+        if filename.endswith('.zip'):
+            extract_dir = job.dest_dir if job.export else os.path.join(job.dest_dir, os.path.splitext(filename)[0])
+            extract_zip_parallel(fullpath_filename, extract_dir)
+            print("unzipped: {0}.\n".format(fullpath_filename))
+            ## delete zip file after extract
+            os.remove(fullpath_filename)
+            Write_Date_to_Text_File(filename, job.dest_dir)
+    except Exception as e:
+        print("Could not unzip {}".format(fullpath_filename))
+        print(e)
+        if telemetry is not None:
+            telemetry.record('unzip', job.key, item_id=job.item_id, seconds=time.perf_counter() - started, ok=False, error=str(e))
+        Issue_List.append(job.item_id)
+        graph.finish('{0}:download'.format(job.key), False)
+        return
+    if telemetry is not None and filename.endswith('.zip'):
+        telemetry.record('unzip', job.key, item_id=job.item_id, seconds=time.perf_counter() - started, ok=True)
+    graph.finish('{0}:download'.format(job.key), True)
+
+# Guard the run so the helpers above can be imported (e.g. by the tests) without ArcGIS or downloading anything
+if __name__ == '__main__':
+    print("### GETTING STARTED ###".format())
+
+    # Print the hit rates of the download cache instead of downloading (python downloadData.py --cache-stats)
+    if '--cache-stats' in sys.argv:
+        if _CACHE_DIR:
+            DownloadCache(_CACHE_DIR, _CACHE_MAX_BYTES).print_stats()
+        else:
+            print("No download cache is set (_CACHE_DIR)")
+        sys.exit()
+
+    # Print the summary of the last run in the telemetry log instead of downloading (python downloadData.py --telemetry)
+    if '--telemetry' in sys.argv:
+        if os.path.exists(_TELEMETRY_LOG):
+            events = DownloadTelemetry.read_last_run(_TELEMETRY_LOG)
+            print("Run started {0}:".format(events[0]['run'] if events else 'never'))
+            print_telemetry_summary(events)
+        else:
+            print("No telemetry log at: {0}".format(_TELEMETRY_LOG))
+        sys.exit()
+
+    # Roll the named Local Directories back to their previous copies instead of downloading
+    # (python downloadData.py --rollback "<Local Directory>" ...)
+    if '--rollback' in sys.argv:
+        manifest = DownloadManifest(_MANIFEST)
+        for local_dir in sys.argv[sys.argv.index('--rollback') + 1:]:
+            if rollback_local_dir(os.path.join(__ROOT_DIR, local_dir), __ROOT_DIR):
+                # The recorded validators belong to the copy that was rolled back, so download the source again next run
+                manifest.move_local_files(os.path.join(__ROOT_DIR, local_dir))
+        sys.exit()
+
+    # Read excel into dataframe using Pandas
+    df_NCRN_GIS_Data_Sources = pd.read_excel(__XCEL_LIBRARY, sheet_name='Sources')
+
+    # Parse the rows once into the source registry, and check the activated sources before anything is downloaded
+    registry = SourceRegistry.from_dataframe(df_NCRN_GIS_Data_Sources)
+
+    # Skip the activated sources that cannot be downloaded or post-processed
+    for source_id, problems in registry.invalid.items():
+        print("Skipping {0} ({1}): {2}".format(source_id, registry.by_id[source_id].local_directory, ', '.join(problems)))
+        Issue_List.append(registry.by_id[source_id].local_directory or source_id)
+
+    # Print the post-processing plan of every activated source instead of downloading (python downloadData.py --plan)
+    if '--plan' in sys.argv:
+        print("Post-processing plan if every activated source is downloaded:")
+        plan_dirs = {source.id: get_work_path(os.path.join(__ROOT_DIR, source.local_directory), __ROOT_DIR, 'staging') for source in registry.get('URL') + registry.get('AGOL')}
+        graph = build_post_processing_graph(registry, plan_dirs, __ROOT_DIR, None, _POST_PROCESSING_WORKERS)
+        for source in registry.sources:
+            if source.id in plan_dirs or '{0}:parent'.format(source.id) in graph.tasks:
+                print("{0} ({1}): {2}".format(source.id, source.local_directory, ', '.join(source.post_processing) or 'no steps'))
+        print("Tasks in the order they can run:")
+        graph.print_plan()
+        sys.exit()
+
+    # Import arcpy and check out the Spatial Analyst extension, which only the download run needs (not --plan)
+    import arcpy
+    arcpy.CheckOutExtension("Spatial")
+
+    # Check the activated URLs against the manifest of the previous downloads
+    # Only sources with a new or changed URL (and all AGOL sources) are cleared and downloaded again
+    print("Checking activated URLs for changes...")
+    manifest = DownloadManifest(_MANIFEST)
+    changed_ids = []
+    with ThreadPoolExecutor(max_workers=_DOWNLOAD_WORKERS) as executor:
+        for source in registry.get('URL'):
+            if any(executor.map(manifest.is_changed, source.urls)):
+                changed_ids.append(source.id)
+            else:
+                print("Unchanged since the last download, skipping: {0}".format(source.local_directory))
+    changed_ids += [source.id for source in registry.get('AGOL')]
+
+    # Create a staging directory for each activated source that is downloaded again
+    # Sources are downloaded and post-processed in their staging directory, then swapped into their Local Directory once they
+    # succeed, so the library keeps its current copy until then (and keeps the replaced copy in the _WORK_DIR folder)
+    print("Creating staging directories...")
+    staging_dirs = {}
+    for source_id in changed_ids:
+        staging_dirs[source_id] = make_staging_dir(os.path.join(__ROOT_DIR, registry.by_id[source_id].local_directory), __ROOT_DIR)
+
+    # Log the bytes and timings of each source's downloads, unzips, and post-processing steps, keyed by row ID
+    telemetry = DownloadTelemetry(_TELEMETRY_LOG, {source.id: source.local_directory for source in registry.sources})
+
+    # Post-process each source as soon as its downloads are done, while the other sources download
+    # Each source runs its steps in its staging directory and is swapped in, and steps on parent folders start once the
+    # sources in them are swapped in (see build_post_processing_graph)
+    graph = build_post_processing_graph(registry, staging_dirs, __ROOT_DIR, manifest, _POST_PROCESSING_WORKERS, telemetry)
+    graph.start()
+
+    # Link unchanged downloads from the shared download cache, when one is set
+    cache = DownloadCache(_CACHE_DIR, _CACHE_MAX_BYTES) if _CACHE_DIR else None
+
+    # Download URLs
+    # Downloads run in a pool of workers (with per-host caps and a shared bandwidth budget) and are unzipped as they finish
+    print("Downloading activated URLs...")
+    scheduler = DownloadScheduler(_DOWNLOAD_WORKERS, _HOST_CONNECTIONS, _BANDWIDTH_LIMIT)
+    for source in registry.get('URL'):
+        # Download activated URLs that changed
+        if source.id in staging_dirs:
+            dest_dir = staging_dirs[source.id] ## Destination in the staging directory of the source
+            # Download the single URL of a 'Dataset' or each item of a multi-item 'Datasets' URL (e.g. 3DEP Contours)
+            job = functools.partial(download_and_unzip, manifest=manifest, cache=cache, telemetry=telemetry, source=source.id)
+            futures = [scheduler.submit(job, dest_dir, url) for url in source.urls]
+            graph.finish_with('{0}:download'.format(source.id), futures)
+
+    # Download AGOL content (while the URL downloads continue)
+    # All exports are submitted up front and their jobs polled together, and each item is unzipped as soon as it downloads
+    print("Downloading feature service items from ArcGIS Online...")
+    agol_jobs = []
+    for source in registry.get('AGOL'):
+        # Feature service items with geodatabase as the only format option are downloaded, and those with multiple
+        # download format options are exported to a geodatabase first (other File Types are caught by the registry)
+        agol_jobs.append(AgolJob(source.id, source.data_item_id, source.file_type == 'Multiple (FileGeodatabase)', staging_dirs[source.id]))
+    if agol_jobs:
+        try:
+            # Sign in with the AGOL_USERNAME and AGOL_PASSWORD environment variables, or the ArcGIS Pro sign-in
+            print("Connecting to ArcGIS Online...")
+            agol = connect_agol()
+        except Exception as e:
+            print("Could not connect to ArcGIS Online")
+            print(e)
+            for job in agol_jobs:
+                Issue_List.append(job.item_id)
+                graph.finish('{0}:download'.format(job.key), False)
+        else:
+            agol.download_items(agol_jobs, functools.partial(unzip_agol_download, graph=graph, telemetry=telemetry), cache, telemetry)
+
+    scheduler.wait()
+    results = graph.wait()
+
+    # Add this run's hits and misses to the download cache's stats
+    if cache is not None:
+        cache.save_stats()
+
+    # Summarize the run by source, host, and phase (the same events are in the telemetry log)
+    print("Run summary (logged to {0}):".format(_TELEMETRY_LOG))
+    telemetry.print_summary(Issue_List)
+
+    # Delete the staging directories of the sources that were not swapped in, keeping their current copy in the library
+    # (a staging directory that failed to swap in is kept, see swap_source)
+    for row_id, staging_dir in staging_dirs.items():
+        if results['{0}:swap'.format(row_id)] is None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            print("Kept the current copy, deleted staging directory: {0}".format(staging_dir))
+
+    print("### !!! ALL DONE !!! ###".format())
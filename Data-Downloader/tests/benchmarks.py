@@ -0,0 +1,251 @@
+"""
+Benchmarks of the download, unzip, points, and AGOL code of downloadData.py against local stand-in hosts
+Run one with `python tests/benchmarks.py <name>` from the Data-Downloader folder, e.g. `python tests/benchmarks.py unzip`.
+"""
+
+import filecmp
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from zipfile import ZipFile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloadData import (_CSV_CHUNK_ROWS, _DOWNLOAD_WORKERS, _HOST_CONNECTIONS, _UNZIP_WORKERS, WKB_POINT, AgolClient, AgolJob,
+                          DownloadScheduler, StreamingZipExtractor, csv_to_geopackage, download_url, extract_zip_parallel, stream_unzip_url)
+from helpers import (DiskUsageSampler, MemorySampler, make_synthetic_archive, make_synthetic_files, start_file_server, start_mock_portal,
+                     trees_match)
+
+def benchmark_downloads(file_count=8, file_size=32 * 1024 * 1024, server_rate=16 * 1024 * 1024, host_count=2):
+    """
+    Times serial downloads against the download scheduler on local HTTP servers that serve synthetic files
+    Each server (a separate host:port) throttles every connection to `server_rate` bytes per second, like an upstream host.
+    The scheduler is also run with a bandwidth budget, and every downloaded file is checked against its source.
+    """
+    base_dir = tempfile.mkdtemp(prefix='download_benchmark_')
+    servers = []
+    try:
+        source_dir = os.path.join(base_dir, 'source')
+        os.makedirs(source_dir)
+        names = make_synthetic_files(source_dir, file_count, file_size)
+        servers = [start_file_server(source_dir, server_rate) for i in range(host_count)]
+        urls = [servers[i % host_count][1] + '/' + name for i, name in enumerate(names)]
+        def check(out_dir):
+            return all(filecmp.cmp(os.path.join(source_dir, name), os.path.join(out_dir, name), shallow=False) for name in names)
+
+        out_dir = os.path.join(base_dir, 'serial')
+        start = time.perf_counter()
+        for url in urls:
+            download_url(out_dir, url)
+        serial_time = time.perf_counter() - start
+        print("Serial:    {0:.2f}s, files match: {1}".format(serial_time, check(out_dir)))
+
+        budget = file_count * file_size / serial_time
+        for label, bandwidth in (('Scheduler', None), ('Budgeted', budget)):
+            out_dir = os.path.join(base_dir, label.lower())
+            scheduler = DownloadScheduler(_DOWNLOAD_WORKERS, _HOST_CONNECTIONS, bandwidth)
+            start = time.perf_counter()
+            for url in urls:
+                scheduler.submit(lambda dest_dir, url, budget, progress: download_url(dest_dir, url, budget, progress), out_dir, url)
+            scheduler.wait()
+            elapsed = time.perf_counter() - start
+            limit = " (budget {0:.1f} MB/s)".format(bandwidth / 1024 / 1024) if bandwidth else ""
+            print("{0}: {1:.2f}s{2}, {3:.1f}x, files match: {4}".format(label, elapsed, limit, serial_time / elapsed, check(out_dir)))
+    finally:
+        for server, url in servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_unzip(member_count=8, member_size=16 * 1024 * 1024, server_rate=32 * 1024 * 1024):
+    """
+    Times downloading a synthetic zip file and then unzipping it against extracting it while it downloads, from a local
+    HTTP server throttled to `server_rate` bytes per second, and reports the peak disk use of each
+    The streamed extraction is also run on an archive with data descriptors, and every extraction is checked.
+    """
+    base_dir = tempfile.mkdtemp(prefix='download_unzip_')
+    server = None
+    try:
+        source_dir = os.path.join(base_dir, 'source')
+        os.makedirs(source_dir)
+        make_synthetic_archive(os.path.join(source_dir, 'synthetic.zip'), member_count, member_size)
+        make_synthetic_archive(os.path.join(source_dir, 'descriptors.zip'), member_count, member_size, descriptors=True)
+        server, base_url = start_file_server(source_dir, server_rate)
+        print("Archive: {0:.1f} MB, {1} members of {2:.1f} MB".format(os.path.getsize(os.path.join(source_dir, 'synthetic.zip')) / 1024 / 1024,
+                                                                       member_count, member_size / 1024 / 1024))
+
+        out_dir = os.path.join(base_dir, 'before')
+        os.makedirs(out_dir)
+        sampler = DiskUsageSampler(out_dir)
+        start = time.perf_counter()
+        fullpath_filename = download_url(out_dir, base_url + '/synthetic.zip')
+        shutil.unpack_archive(fullpath_filename, out_dir)
+        os.remove(fullpath_filename)
+        before_time = time.perf_counter() - start
+        before_peak = sampler.stop()
+        print("Download, then unzip: {0:.2f}s, peak disk {1:.1f} MB".format(before_time, before_peak / 1024 / 1024))
+
+        for name in ('synthetic.zip', 'descriptors.zip'):
+            stream_dir = os.path.join(base_dir, name)
+            os.makedirs(stream_dir)
+            sampler = DiskUsageSampler(stream_dir)
+            extractor = StreamingZipExtractor(stream_dir)
+            start = time.perf_counter()
+            stream_unzip_url(stream_dir, base_url + '/' + name, extractor=extractor)
+            stream_time = time.perf_counter() - start
+            stream_peak = sampler.stop()
+            if name == 'descriptors.zip':
+                os.remove(os.path.join(out_dir, 'synthetic', 'stored.bin'))
+            print("Unzip while downloading {0}: {1:.2f}s ({2:.1f}x), peak disk {3:.1f} MB (plus at most {4:.1f} MB spooled), files match: {5}".format(
+                name, stream_time, before_time / stream_time, stream_peak / 1024 / 1024, extractor.peak_spooled / 1024 / 1024, trees_match(out_dir, stream_dir)))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_extract(member_count=2000, member_size=128 * 1024, large_count=4, large_size=32 * 1024 * 1024):
+    """
+    Times shutil.unpack_archive against extract_zip_parallel on a synthetic archive of many small members (like the
+    .gdbtable files of an FGDB) and a few large ones, and checks that the contents and timestamps match
+    """
+    base_dir = tempfile.mkdtemp(prefix='extract_benchmark_')
+    try:
+        archive_path = os.path.join(base_dir, 'synthetic.zip')
+        with ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for i in range(member_count):
+                info = zipfile.ZipInfo('synthetic.gdb/a{0:08x}.gdbtable'.format(i + 1), date_time=(2020, 1, 2, 3, 4, 6))
+                archive.writestr(info, random.Random(i).randbytes(member_size // 2).hex(), compress_type=zipfile.ZIP_DEFLATED)
+            for i in range(large_count):
+                archive.writestr('tiles/tile_{0:02d}.tif'.format(i), random.Random(-i - 1).randbytes(large_size // 2).hex())
+        print("Archive: {0:.1f} MB, {1} members".format(os.path.getsize(archive_path) / 1024 / 1024, member_count + large_count))
+        serial_dir = os.path.join(base_dir, 'serial')
+        start = time.perf_counter()
+        shutil.unpack_archive(archive_path, serial_dir)
+        serial_time = time.perf_counter() - start
+        print("shutil.unpack_archive: {0:.2f}s".format(serial_time))
+        parallel_dir = os.path.join(base_dir, 'parallel')
+        start = time.perf_counter()
+        extract_zip_parallel(archive_path, parallel_dir)
+        parallel_time = time.perf_counter() - start
+        member = os.path.join(parallel_dir, 'synthetic.gdb', 'a00000001.gdbtable')
+        print("extract_zip_parallel with {0} threads: {1:.2f}s ({2:.1f}x), files match: {3}, timestamps kept: {4}".format(
+            _UNZIP_WORKERS, parallel_time, serial_time / parallel_time, trees_match(serial_dir, parallel_dir),
+            time.localtime(os.path.getmtime(member))[:6] == (2020, 1, 2, 3, 4, 6)))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_points(row_count=500000, column_count=30):
+    """
+    Times (and measures the peak memory of, when psutil is installed) the previous csv preparation for XYTableToPoint
+    (reading the whole csv, adding coordinate columns, and writing a second csv) against csv_to_geopackage on a synthetic
+    NPDES-like csv with some bad coordinates, then checks the points in the GeoPackage
+    """
+    try:
+        import psutil
+        sample_memory = True
+    except ImportError:
+        print("psutil is not installed, so peak memory is not measured")
+        sample_memory = False
+    base_dir = tempfile.mkdtemp(prefix='points_benchmark_')
+    try:
+        in_csv = os.path.join(base_dir, 'synthetic.csv')
+        generator = np.random.default_rng(0)
+        df = pd.DataFrame({'FIELD_{0:02d}'.format(i): generator.integers(0, 10 ** 6, row_count).astype(str) for i in range(column_count)})
+        df['LATITUDE83'] = generator.uniform(38, 40, row_count).round(6).astype(str)
+        df['LONGITUDE83'] = generator.uniform(-78, -76, row_count).round(6).astype(str)
+        bad = generator.choice(row_count, row_count // 100, replace=False)
+        df.loc[bad[0::3], 'LATITUDE83'] = ''
+        df.loc[bad[1::3], 'LONGITUDE83'] = 'N/A'
+        df.loc[bad[2::3], 'LATITUDE83'] = '391.5'
+        df.to_csv(in_csv, index=False)
+        del df
+        print("Csv: {0:.1f} MB, {1} rows, {2} with bad coordinates".format(os.path.getsize(in_csv) / 1024 / 1024, row_count, len(bad)))
+        sampler = MemorySampler() if sample_memory else None
+        start = time.perf_counter()
+        df = pd.read_csv(in_csv, low_memory=False)
+        df["latitude"] = pd.to_numeric(df["LATITUDE83"], errors='coerce')
+        df["longitude"] = pd.to_numeric(df["LONGITUDE83"], errors='coerce')
+        df.to_csv(os.path.join(base_dir, 'second.csv'))
+        del df
+        csv_time = time.perf_counter() - start
+        csv_peak = sampler.stop() if sampler else 0
+        print("Previous second csv (before XYTableToPoint): {0:.2f}s, peak memory {1:.0f} MB".format(csv_time, csv_peak / 1024 / 1024))
+        out_gpkg = os.path.join(base_dir, 'points.gpkg')
+        sampler = MemorySampler() if sample_memory else None
+        start = time.perf_counter()
+        written, dropped = csv_to_geopackage(in_csv, out_gpkg, 'points')
+        gpkg_time = time.perf_counter() - start
+        gpkg_peak = sampler.stop() if sampler else 0
+        print("csv_to_geopackage ({0} rows per chunk): {1:.2f}s, peak memory {2:.0f} MB, {3} points, {4} dropped".format(
+            _CSV_CHUNK_ROWS, gpkg_time, gpkg_peak / 1024 / 1024, written, dropped))
+        from pyogrio import read_info
+        from pyogrio.raw import read_arrow
+        meta, table = read_arrow(out_gpkg, layer='points', max_features=1)
+        point = np.frombuffer(table.column(meta['geometry_name'])[0].as_py(), dtype=WKB_POINT)[0]
+        bounds = read_info(out_gpkg, layer='points')['total_bounds']
+        print("Points match their coordinates: {0}, extent: {1}".format(
+            (point['x'], point['y']) == (table.column('LONGITUDE83')[0].as_py(), table.column('LATITUDE83')[0].as_py()),
+            tuple(round(value, 3) for value in bounds)))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_agol(item_count=8, export_delay=2.0, poll_interval=0.25):
+    """
+    Times AGOL downloads item by item (each export waited for before the next, like export(wait=True)) against
+    AgolClient.download_items with all exports submitted up front, on a local mock portal where half the items have to
+    be exported, then checks the downloads and that the export items were deleted
+    """
+    base_dir = tempfile.mkdtemp(prefix='agol_benchmark_')
+    server = None
+    try:
+        items = {}
+        for i in range(item_count):
+            data = io.BytesIO()
+            with ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('item{0}.gdb/a00000001.gdbtable'.format(i), random.Random(i).randbytes(256 * 1024))
+            items['item{0:02d}'.format(i)] = {'name': 'item{0}.zip'.format(i), 'modified': 1600000000000 + i, 'data': data.getvalue()}
+        server, portal_url = start_mock_portal(items, export_delay)
+        client = AgolClient(portal_url, 'mock_user', 'mock_password', poll_interval=poll_interval)
+        for mode in ('serial', 'batched'):
+            out_dir = os.path.join(base_dir, mode)
+            jobs = [AgolJob(i, item_id, i % 2 == 1, out_dir) for i, item_id in enumerate(sorted(items))]
+            results = {}
+            on_done = lambda job, path, error: results.update({job.key: (path, error)})
+            start = time.perf_counter()
+            if mode == 'serial':
+                for job in jobs:
+                    client.download_items([job], on_done)
+            else:
+                client.download_items(jobs, on_done)
+            elapsed = time.perf_counter() - start
+            valid = sum(1 for path, error in results.values() if error is None and zipfile.is_zipfile(path))
+            print("{0}: {1:.2f}s, {2} of {3} items downloaded ({4} exports of {5:.1f}s each)".format(
+                mode.capitalize(), elapsed, valid, len(jobs), sum(job.export for job in jobs), export_delay))
+        print("Export items deleted from the portal: {0} of {1}".format(len(server.deleted), len(server.exports)))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+# Create a lookup of the benchmarks that can be run from the command line
+_BENCHMARKS = {'downloads': benchmark_downloads, 'unzip': benchmark_unzip, 'extract': benchmark_extract, 'points': benchmark_points,
+               'agol': benchmark_agol}
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in _BENCHMARKS:
+        sys.exit("Usage: python tests/benchmarks.py {{{0}}}".format('|'.join(_BENCHMARKS)))
+    _BENCHMARKS[sys.argv[1]]()
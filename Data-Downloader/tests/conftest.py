@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# Make the downloader script importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloadData
+from helpers import start_file_server, start_mock_portal
+
+
+@pytest.fixture(autouse=True)
+def issue_list():
+    """Empties the downloader's Issue_List around each test and returns it"""
+    downloadData.Issue_List.clear()
+    yield downloadData.Issue_List
+    downloadData.Issue_List.clear()
+
+
+@pytest.fixture
+def file_server():
+    """Returns a function that starts a local HTTP server for a directory and returns (server, base URL)"""
+    servers = []
+
+    def start(directory, rate=None, drop_after=None):
+        server, base_url = start_file_server(directory, rate, drop_after)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def mock_portal():
+    """Returns a function that starts a mock ArcGIS portal with items and returns (server, portal URL)"""
+    servers = []
+
+    def start(items, export_delay=1.0):
+        server, portal_url = start_mock_portal(items, export_delay)
+        servers.append(server)
+        return server, portal_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,249 @@
+"""
+Local stand-ins for the hosts that downloadData.py talks to, and synthetic data to serve from them
+Used by the tests (through the fixtures in conftest.py) and by benchmarks.py.
+"""
+
+import filecmp
+import functools
+import http.server
+import json
+import os
+import random
+import re
+import threading
+import time
+import zipfile
+from urllib.parse import parse_qsl, urlparse
+from zipfile import ZipFile
+
+
+class ThrottledFileHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves the files of the server's directory, sending each response at most `server.rate` bytes per second
+    Supports single 'bytes=start-' Range requests (with If-Range), and drops the connection after `server.drop_after`
+    bytes of each response when it is set, to simulate an unreliable host. The method and path of every request are
+    appended to `server.requests`.
+    """
+
+    def send_head(self):
+        self.server.requests.append((self.command, self.path))
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        last_modified = self.date_time_string(int(os.path.getmtime(path)))
+        if self.headers.get('If-Range') not in (None, last_modified):
+            return super().send_head()
+        start = int(match.group(1))
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{0}'.format(size))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, size - 1, size))
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        rate = getattr(self.server, 'rate', None)
+        drop_after = getattr(self.server, 'drop_after', None)
+        sent = 0
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            if drop_after is not None and sent + len(chunk) > drop_after:
+                outputfile.write(chunk[:drop_after - sent])
+                self.close_connection = True
+                break
+            outputfile.write(chunk)
+            sent += len(chunk)
+            if rate:
+                time.sleep(len(chunk) / rate)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockPortalHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers the ArcGIS REST requests made by AgolClient from the items in `server.items`, with export jobs that complete
+    `server.export_delay` seconds after they are submitted, to stand in for ArcGIS Online
+    The export of an item with an 'export_status' (e.g. 'failed' or 'processing') stays at that status, and the data of an
+    item whose 'data' is None (or of its export) cannot be downloaded.
+    """
+
+    def do_GET(self):
+        self.route(dict(parse_qsl(urlparse(self.path).query)))
+
+    def do_POST(self):
+        self.route(dict(parse_qsl(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))))
+
+    def route(self, params):
+        server = self.server
+        path = urlparse(self.path).path.replace('/sharing/rest/', '', 1).strip('/').split('/')
+        if path == ['generateToken']:
+            return self.send_json({'token': 'mock-token', 'expires': int(time.time() + 3600) * 1000})
+        if params.get('token') != 'mock-token':
+            return self.send_json({'error': {'code': 498, 'message': 'Invalid token.'}})
+        with server.lock:
+            server.request_count += 1
+            if path == ['community', 'self']:
+                return self.send_json({'username': 'mock_user'})
+            if path[:2] == ['content', 'items'] and path[2] in server.items:
+                item = server.items[path[2]]
+                if len(path) == 4 and path[3] == 'data':
+                    if item['data'] is None:
+                        return self.send_error(500)
+                    return self.send_data(item['name'], item['data'])
+                return self.send_json({'id': path[2], 'name': item['name'], 'modified': item['modified']})
+            if path[:2] == ['content', 'users'] and path[3:] == ['export']:
+                export_item_id = 'export{0:04d}'.format(len(server.exports))
+                source = server.items[params['itemId']]
+                server.items[export_item_id] = {'name': params['title'] + '.zip', 'modified': int(time.time() * 1000), 'data': source['data']}
+                server.exports[export_item_id] = (time.time() + server.export_delay, source.get('export_status'))
+                return self.send_json({'type': 'file', 'exportItemId': export_item_id, 'jobId': 'job' + export_item_id})
+            if path[:2] == ['content', 'users'] and len(path) == 6 and path[5] == 'status' and path[4] in server.exports:
+                ready, status = server.exports[path[4]]
+                return self.send_json({'status': status or ('completed' if time.time() >= ready else 'processing')})
+            if path[:2] == ['content', 'users'] and len(path) == 6 and path[5] == 'delete' and path[4] in server.items:
+                del server.items[path[4]]
+                server.deleted.append(path[4])
+                return self.send_json({'success': True, 'itemId': path[4]})
+        self.send_json({'error': {'code': 400, 'message': 'Unknown request: {0}'.format(self.path)}})
+
+    def send_json(self, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_data(self, name, data):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', 'attachment; filename="{0}"'.format(name))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_portal(items, export_delay=1.0):
+    """Starts a MockPortalHandler server with `items` ({item ID: {'name', 'modified', 'data'}}) and returns (server, portal URL)"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockPortalHandler)
+    server.items = dict(items)
+    server.exports = {}
+    server.deleted = []
+    server.export_delay = export_delay
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+def start_file_server(directory, rate=None, drop_after=None):
+    """Starts a local HTTP server for `directory` in a background thread and returns (server, base URL)"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(ThrottledFileHandler, directory=directory))
+    server.rate = rate
+    server.drop_after = drop_after
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+def make_synthetic_files(directory, file_count, file_size):
+    """Writes `file_count` files of `file_size` random bytes and returns their names"""
+    names = []
+    block = os.urandom(1024 * 1024)
+    for i in range(file_count):
+        name = 'synthetic_{0:03d}.bin'.format(i)
+        with open(os.path.join(directory, name), 'wb') as f:
+            for start in range(0, file_size, len(block)):
+                f.write(block[:min(len(block), file_size - start)])
+        names.append(name)
+    return names
+
+class UnseekableFile:
+    """Write-only wrapper of a file, so zipfile writes data descriptors as it would to a network stream"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data):
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+def make_synthetic_archive(path, member_count, member_size, descriptors=False):
+    """Writes a zip file of `member_count` compressible text members (and one stored member, without descriptors) in a subfolder"""
+    with open(path, 'wb') as f:
+        with ZipFile(UnseekableFile(f) if descriptors else f, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for i in range(member_count):
+                archive.writestr('synthetic/member_{0:03d}.txt'.format(i), random.Random(i).randbytes(member_size // 2).hex())
+            # Stored members cannot be streamed when their sizes only follow their data
+            if not descriptors:
+                archive.writestr('synthetic/stored.bin', os.urandom(1024), compress_type=zipfile.ZIP_STORED)
+
+class DiskUsageSampler:
+    """Samples the total size of the files under a directory in a background thread and keeps the peak"""
+
+    def __init__(self, directory, interval=0.01):
+        self.directory = directory
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            total = 0
+            for root, dirs, files in os.walk(self.directory):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            self.peak = max(self.peak, total)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.peak
+
+class MemorySampler:
+    """Samples the resident memory of this process (with psutil) in a background thread and keeps the peak above the start"""
+
+    def __init__(self, interval=0.01):
+        import psutil
+        self.process = psutil.Process()
+        self.start = self.process.memory_info().rss
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss - self.start)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.peak
+
+def trees_match(dir_a, dir_b):
+    """Returns True if two directories contain the same files with the same contents"""
+    files_a = sorted(os.path.relpath(os.path.join(root, name), dir_a) for root, dirs, files in os.walk(dir_a) for name in files)
+    files_b = sorted(os.path.relpath(os.path.join(root, name), dir_b) for root, dirs, files in os.walk(dir_b) for name in files)
+    return files_a == files_b and all(filecmp.cmp(os.path.join(dir_a, name), os.path.join(dir_b, name), shallow=False) for name in files_a)
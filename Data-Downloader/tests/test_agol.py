@@ -0,0 +1,95 @@
+import io
+import os
+import random
+import zipfile
+from zipfile import ZipFile
+
+import pytest
+
+import downloadData
+
+
+def make_items(item_count):
+    items = {}
+    for i in range(item_count):
+        data = io.BytesIO()
+        with ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('item{0}.gdb/a00000001.gdbtable'.format(i), random.Random(i).randbytes(16 * 1024))
+        items['item{0:02d}'.format(i)] = {'name': 'item{0}.zip'.format(i), 'modified': 1600000000000 + i, 'data': data.getvalue()}
+    return items
+
+
+def test_download_items_exports_and_downloads_every_item(tmp_path, mock_portal):
+    items = make_items(6)
+    server, portal_url = mock_portal(items, export_delay=0.5)
+    client = downloadData.AgolClient(portal_url, 'mock_user', 'mock_password', poll_interval=0.1)
+    jobs = [downloadData.AgolJob(i, item_id, i % 2 == 1, str(tmp_path / item_id)) for i, item_id in enumerate(sorted(items))]
+    results = {}
+    client.download_items(jobs, lambda job, path, error: results.update({job.key: (path, error)}))
+    assert sorted(results) == list(range(6))
+    for job in jobs:
+        path, error = results[job.key]
+        assert error is None
+        assert os.path.dirname(path) == job.dest_dir
+        with ZipFile(path) as archive:
+            assert archive.namelist() == ['item{0}.gdb/a00000001.gdbtable'.format(job.key)]
+    # Every export was deleted from the portal once it was downloaded
+    assert len(server.exports) == 3
+    assert sorted(server.deleted) == sorted(server.exports)
+
+
+def test_export_items_are_deleted_when_exports_or_downloads_fail(tmp_path, mock_portal):
+    items = make_items(4)
+    items['item01']['export_status'] = 'failed'
+    items['item02']['export_status'] = 'processing'
+    items['item03']['data'] = None
+    server, portal_url = mock_portal(items, export_delay=0.2)
+    client = downloadData.AgolClient(portal_url, 'mock_user', 'mock_password', poll_interval=0.1, export_timeout=1)
+    jobs = [downloadData.AgolJob(i, item_id, True, str(tmp_path / item_id)) for i, item_id in enumerate(sorted(items))]
+    results = {}
+    client.download_items(jobs, lambda job, path, error: results.update({job.key: (path, error)}))
+    assert results[0][1] is None
+    assert [results[key][0] for key in (1, 2, 3)] == [None] * 3
+    assert isinstance(results[2][1], TimeoutError)
+    # The export item of each job was deleted, whether it was downloaded, failed, timed out, or could not be downloaded
+    assert len(server.exports) == 4
+    assert sorted(server.deleted) == sorted(server.exports)
+
+
+def test_export_items_are_deleted_when_the_downloads_are_interrupted(tmp_path, mock_portal):
+    server, portal_url = mock_portal(make_items(2), export_delay=0.2)
+    client = downloadData.AgolClient(portal_url, 'mock_user', 'mock_password', poll_interval=0.1)
+    def interrupt(export_item_id, job_id):
+        raise KeyboardInterrupt
+    client.get_export_status = interrupt
+    jobs = [downloadData.AgolJob(i, item_id, True, str(tmp_path / item_id)) for i, item_id in enumerate(['item00', 'item01'])]
+    with pytest.raises(KeyboardInterrupt):
+        client.download_items(jobs, lambda job, path, error: None)
+    assert len(server.exports) == 2
+    assert sorted(server.deleted) == sorted(server.exports)
+
+
+def test_unknown_items_are_reported(tmp_path, mock_portal):
+    server, portal_url = mock_portal(make_items(1))
+    client = downloadData.AgolClient(portal_url, 'mock_user', 'mock_password', poll_interval=0.1)
+    results = {}
+    client.download_items([downloadData.AgolJob('missing', 'no_such_item', False, str(tmp_path))],
+                          lambda job, path, error: results.update({job.key: (path, error)}))
+    path, error = results['missing']
+    assert path is None and error is not None
+
+
+def test_connect_agol_signs_in_with_the_environment_credentials(monkeypatch, mock_portal):
+    server, portal_url = mock_portal(make_items(1))
+    monkeypatch.setenv('AGOL_USERNAME', 'mock_user')
+    monkeypatch.setenv('AGOL_PASSWORD', 'mock_password')
+    client = downloadData.connect_agol(portal_url)
+    assert client.username == 'mock_user'
+    assert client.token == 'mock-token'
+
+
+def test_token_clients_send_the_referer_of_their_token(mock_portal):
+    server, portal_url = mock_portal(make_items(1))
+    client = downloadData.AgolClient(portal_url, token='mock-token', referer='https://www.arcgis.com')
+    assert client.username == 'mock_user'
+    assert client.session.headers['Referer'] == 'https://www.arcgis.com'
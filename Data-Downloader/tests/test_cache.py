@@ -0,0 +1,114 @@
+import filecmp
+import glob
+import os
+import random
+import shutil
+
+import downloadData
+
+
+def make_sources(source_dir, file_size):
+    """Writes two distinct files and a copy of the first, and returns their names"""
+    os.makedirs(source_dir)
+    names = ['first.bin', 'second.bin']
+    for i, name in enumerate(names):
+        with open(os.path.join(source_dir, name), 'wb') as f:
+            f.write(random.Random(i).randbytes(file_size))
+    shutil.copy2(os.path.join(source_dir, names[0]), os.path.join(source_dir, 'copy_of_' + names[0]))
+    return names + ['copy_of_' + names[0]]
+
+
+def cached_objects(cache):
+    return glob.glob(os.path.join(cache.root, 'objects', '*', '*'))
+
+
+def test_second_round_is_served_from_the_cache(tmp_path, file_server):
+    file_size = 256 * 1024
+    source_dir = str(tmp_path / 'source')
+    names = make_sources(source_dir, file_size)
+    server, base_url = file_server(source_dir)
+    cache = downloadData.DownloadCache(str(tmp_path / 'cache'), 4 * file_size)
+    for round in ('first', 'second'):
+        out_dir = str(tmp_path / round)
+        for name in names:
+            stats = {}
+            downloadData.download_url(out_dir, base_url + '/' + name, cache=cache, stats=stats)
+            assert stats['cache_hit'] == (round == 'second')
+            assert stats['bytes'] == (0 if round == 'second' else file_size)
+        assert all(filecmp.cmp(os.path.join(source_dir, name), os.path.join(out_dir, name), shallow=False) for name in names)
+    # Identical files share one object
+    assert len(cached_objects(cache)) == 2
+    # The counters are written once, at the end of the run
+    assert not os.path.exists(cache.stats_path)
+    cache.save_stats()
+    stats = cache.read_stats(cache.stats_path)
+    assert (stats['hits'], stats['misses']) == (3, 3)
+    assert stats['bytes_stored'] == 2 * file_size
+    assert stats['bytes_served'] == 3 * file_size
+
+
+def test_eviction_keeps_the_cache_under_its_size(tmp_path, file_server):
+    file_size = 256 * 1024
+    source_dir = str(tmp_path / 'source')
+    names = make_sources(source_dir, file_size)
+    server, base_url = file_server(source_dir)
+    cache = downloadData.DownloadCache(str(tmp_path / 'cache'), file_size)
+    for name in names[:2]:
+        downloadData.download_url(str(tmp_path / 'out'), base_url + '/' + name, cache=cache)
+    # Only the most recently used object fits
+    objects = cached_objects(cache)
+    assert len(objects) == 1
+    assert filecmp.cmp(objects[0], os.path.join(source_dir, names[1]), shallow=False)
+    stats = {}
+    downloadData.download_url(str(tmp_path / 'again'), base_url + '/' + names[0], cache=cache, stats=stats)
+    assert not stats['cache_hit']
+
+
+def test_stats_of_each_run_add_up(tmp_path):
+    cache = downloadData.DownloadCache(str(tmp_path / 'cache'), 1024)
+    for run in range(2):
+        cache.count('hits')
+        cache.count('misses', 2)
+        cache.save_stats()
+    assert cache.read_stats(cache.stats_path) == {'hits': 2, 'misses': 4}
+
+
+def test_eviction_only_scans_once_the_cache_is_full(tmp_path, monkeypatch):
+    file_size = 64 * 1024
+    cache = downloadData.DownloadCache(str(tmp_path / 'cache'), 3 * file_size)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: evictions.append(len(cached_objects(cache))) or evict())
+    for i in range(5):
+        path = str(tmp_path / 'file_{0}.bin'.format(i))
+        with open(path, 'wb') as f:
+            f.write(random.Random(i).randbytes(file_size))
+        cache.store('key {0}'.format(i), path)
+    # The 4th and 5th objects put the cache over its size
+    assert evictions == [4, 4]
+    assert len(cached_objects(cache)) == 3
+    assert cache.size == 3 * file_size
+
+
+def test_cache_hits_leave_linked_library_files_as_they_are(tmp_path):
+    file_size = 64 * 1024
+    cache = downloadData.DownloadCache(str(tmp_path / 'cache'), 2 * file_size)
+    library_files = []
+    for i in range(2):
+        path = str(tmp_path / 'library' / 'file_{0}.bin'.format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(random.Random(i).randbytes(file_size))
+        os.utime(path, (1000000000 + i, 1000000000 + i))
+        cache.store('key {0}'.format(i), path)
+        library_files.append(path)
+    # Fetch the first object again (and store it under another key), so the second one is the least recently used
+    cache.fetch('key 0', str(tmp_path / 'hits'))
+    cache.store('key 0 again', library_files[0])
+    assert [os.stat(path).st_mtime for path in library_files + [str(tmp_path / 'hits' / 'file_0.bin')]] == [1000000000, 1000000001, 1000000000]
+    path = str(tmp_path / 'file_2.bin')
+    with open(path, 'wb') as f:
+        f.write(random.Random(2).randbytes(file_size))
+    cache.store('key 2', path)
+    assert cache.get('key 0') is not None and cache.get('key 1') is None and cache.get('key 2') is not None
+    assert sorted(os.listdir(os.path.join(cache.root, 'used'))) == sorted(os.path.basename(path) for path in cached_objects(cache))
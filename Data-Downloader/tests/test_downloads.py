@@ -0,0 +1,93 @@
+import email.utils
+import filecmp
+import os
+import shutil
+import threading
+from urllib.parse import urlparse
+
+import pytest
+
+import downloadData
+from helpers import make_synthetic_files
+
+
+def test_scheduler_respects_worker_and_host_caps(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 8, 512 * 1024)
+    base_urls = [file_server(source_dir, rate=4 * 1024 * 1024)[1] for i in range(3)]
+    urls = [base_urls[i % 3] + '/' + name for i, name in enumerate(names)]
+    lock = threading.Lock()
+    running = {}
+    peaks = {}
+
+    def job(dest_dir, url, budget, progress):
+        host = urlparse(url).netloc
+        with lock:
+            running[host] = running.get(host, 0) + 1
+            running['all'] = running.get('all', 0) + 1
+            for key in (host, 'all'):
+                peaks[key] = max(peaks.get(key, 0), running[key])
+        try:
+            return downloadData.download_url(dest_dir, url, budget, progress)
+        finally:
+            with lock:
+                running[host] -= 1
+                running['all'] -= 1
+
+    out_dir = str(tmp_path / 'out')
+    scheduler = downloadData.DownloadScheduler(4, 2, progress_interval=60)
+    futures = [scheduler.submit(job, out_dir, url) for url in urls]
+    scheduler.wait()
+    assert [future.result() for future in futures] == [os.path.join(out_dir, name) for name in names]
+    assert all(filecmp.cmp(os.path.join(source_dir, name), os.path.join(out_dir, name), shallow=False) for name in names)
+    assert peaks.pop('all') == 4
+    assert max(peaks.values()) <= 2
+
+
+def test_downloads_resume_after_dropped_connections(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 2, 3 * 1024 * 1024)
+    server, base_url = file_server(source_dir, drop_after=1024 * 1024)
+    out_dir = str(tmp_path / 'out')
+    stats = {}
+    for name in names:
+        downloadData.download_url(out_dir, base_url + '/' + name, chunk_size=256 * 1024, backoff=0.01, stats=stats)
+    assert all(filecmp.cmp(os.path.join(source_dir, name), os.path.join(out_dir, name), shallow=False) for name in names)
+    assert stats['retries'] >= 2
+    assert [name for name in os.listdir(out_dir) if name.endswith(('.part', '.validator'))] == []
+
+
+def test_download_gives_up_after_its_retries(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 1, 3 * 1024 * 1024)
+    server, base_url = file_server(source_dir, drop_after=512 * 1024)
+    out_dir = str(tmp_path / 'out')
+    with pytest.raises(IOError):
+        downloadData.download_url(out_dir, base_url + '/' + names[0], chunk_size=128 * 1024, retries=1, backoff=0.01)
+    assert not os.path.exists(os.path.join(out_dir, names[0]))
+
+
+def test_download_completed_before_an_interruption_keeps_its_validators(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 1, 256 * 1024)
+    server, base_url = file_server(source_dir)
+    url = base_url + '/' + names[0]
+    out_dir = str(tmp_path / 'out')
+    os.makedirs(out_dir)
+    # Every byte arrived in an earlier run, which stopped before renaming the .part file
+    part_filename = os.path.join(out_dir, names[0] + '.part')
+    shutil.copyfile(os.path.join(source_dir, names[0]), part_filename)
+    last_modified = email.utils.formatdate(int(os.path.getmtime(os.path.join(source_dir, names[0]))), usegmt=True)
+    with open(part_filename + '.validator', 'w') as f:
+        f.write(last_modified)
+    manifest = downloadData.DownloadManifest(str(tmp_path / 'download_manifest.json'))
+    assert downloadData.download_url(out_dir, url, manifest=manifest) == os.path.join(out_dir, names[0])
+    # The 416 answering the Range request gives the size, so no HEAD request is needed
+    assert server.requests == [('GET', '/' + names[0])]
+    assert manifest.get(url)['last_modified'] == last_modified
+    assert manifest.get(url)['sha256'] == downloadData.hash_file(os.path.join(source_dir, names[0])).hexdigest()
+    assert sorted(os.listdir(out_dir)) == [names[0]]
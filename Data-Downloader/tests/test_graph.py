@@ -0,0 +1,155 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import downloadData
+
+
+def make_osm_sheet(columns=None):
+    """
+    Returns a Sources sheet like the Open Street Map rows: row 23 creates the OSM geodatabase and merges into it, rows 26,
+    29, and 32 merge into it after row 23, and row 40 merges locally. Post Processing and Depends On come from the
+    legacy steps of the row IDs unless `columns` maps a row ID to them.
+    """
+    rows = []
+    for row_id, local_dir in ((23, os.path.join('OSM', 'Roads')), (26, os.path.join('OSM', 'Water')), (29, os.path.join('OSM', 'Buildings')),
+                              (32, os.path.join('OSM', 'Landuse')), (40, 'Hydro')):
+        row = {'ID': float(row_id), 'Activated': 'Yes', 'Local Directory': local_dir, 'Avaliability': 'URL', 'Source Type': 'Dataset',
+               'File Type': 'Shapefile', 'Web File for Download': 'https://example.com/{0}.zip'.format(row_id), 'Items': None,
+               'Data Item ID': None, 'File Names': 'a.shp, b.shp', 'New File Names': 'merged_{0}'.format(row_id), 'Original GDB Name': None,
+               'New GDB Name': 'OSM.gdb' if row_id != 40 else 'Hydro.gdb', 'New GDB Directory': 'OSM' if row_id != 40 else None,
+               'Post Processing': None, 'Depends On': None}
+        row.update((columns or {}).get(row_id, {}))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def recorded_steps(monkeypatch):
+    """Replaces the post-processing steps and swaps of the graph with ones that record (task, folder) in the order they run"""
+    calls = []
+    lock = threading.Lock()
+
+    def post_process_source(source, folder_path, step_names, telemetry=None):
+        with lock:
+            calls.append(('{0}:{1}'.format(source.id, 'post' if os.sep + downloadData._WORK_DIR + os.sep in folder_path else 'parent'), folder_path))
+
+    def swap_source(source, staging_dir, local_dir, root_dir, manifest, telemetry=None):
+        with lock:
+            calls.append(('{0}:swap'.format(source.id), local_dir))
+
+    monkeypatch.setattr(downloadData, 'post_process_source', post_process_source)
+    monkeypatch.setattr(downloadData, 'swap_source', swap_source)
+    return calls
+
+
+def build_graph(registry, root_dir, source_ids=None):
+    staging_dirs = {source.id: downloadData.get_work_path(os.path.join(root_dir, source.local_directory), root_dir, 'staging') for source in registry.get('URL')
+                    if source_ids is None or source.id in source_ids}
+    return downloadData.build_post_processing_graph(registry, staging_dirs, root_dir, None, 4)
+
+
+def test_sources_parse_post_processing_and_depends_on_columns():
+    registry = downloadData.SourceRegistry.from_dataframe(pd.concat([make_osm_sheet(), pd.DataFrame([
+        {'ID': 101.0, 'Activated': 'Yes', 'Local Directory': 'Merged', 'Avaliability': 'URL', 'Source Type': 'Dataset',
+         'File Type': 'Shapefile', 'Web File for Download': 'https://example.com/101.zip', 'File Names': 'a.shp',
+         'New File Names': 'merged', 'New GDB Name': 'Merged.gdb', 'Post Processing': 'create_gdb, merge', 'Depends On': '40, 23.0'}])],
+        ignore_index=True))
+    assert registry.invalid == {}
+    source = registry.by_id[101]
+    assert source.post_processing == ('create_gdb', 'merge')
+    assert source.depends_on == (40, 23)
+    assert source.local_steps == ('create_gdb', 'merge') and source.parent_steps == ()
+    assert [source.id for source in registry.by_step['merge']] == [40, 101]
+
+
+def test_sources_fall_back_to_legacy_steps_by_row_id():
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet())
+    assert registry.by_id[23].post_processing == ('create_parent_gdb', 'merge_to_parent')
+    assert registry.by_id[23].parent_steps == ('create_parent_gdb', 'merge_to_parent')
+    assert [registry.by_id[row_id].depends_on for row_id in (23, 26, 29, 32)] == [(), (23,), (23,), (23,)]
+    assert registry.by_id[40].post_processing == ('create_gdb', 'merge') and registry.by_id[40].local_steps == ('create_gdb', 'merge')
+    assert [source.id for source in registry.get_with_steps('parent')] == [23, 26, 29, 32]
+    # Filled columns replace the legacy steps of the row
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet({26: {'Post Processing': 'create_gdb', 'Depends On': '40'}}))
+    assert registry.by_id[26].post_processing == ('create_gdb',)
+    assert registry.by_id[26].depends_on == (40,)
+
+
+def test_parent_tasks_wait_for_every_child_swap(tmp_path, recorded_steps):
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet())
+    graph = build_graph(registry, str(tmp_path))
+    swaps = ['{0}:swap'.format(row_id) for row_id in (23, 26, 29, 32)]
+    assert graph.tasks['23:parent'][1] == swaps
+    assert graph.tasks['26:parent'][1] == swaps + ['23:parent']
+    assert '40:parent' not in graph.tasks
+    graph.start()
+    for row_id in (23, 26, 29, 32, 40):
+        graph.finish('{0}:download'.format(row_id), True)
+    results = graph.wait()
+    assert all(results.values())
+    order = [name for name, folder in recorded_steps]
+    for row_id in (23, 26, 29, 32):
+        assert all(order.index('{0}:parent'.format(row_id)) > order.index(swap) for swap in swaps)
+        assert recorded_steps[order.index('{0}:parent'.format(row_id))][1] == os.path.join(str(tmp_path), 'OSM')
+    assert all(order.index('{0}:parent'.format(row_id)) > order.index('23:parent') for row_id in (26, 29, 32))
+
+
+def test_parent_tasks_run_for_a_single_staged_child(tmp_path):
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet())
+    graph = build_graph(registry, str(tmp_path), [29])
+    # Every parent task merges into OSM, so it runs again once the one staged source in OSM is swapped in
+    assert graph.tasks['23:parent'][1] == ['29:swap']
+    assert graph.tasks['32:parent'][1] == ['29:swap', '23:parent']
+
+
+def test_failed_inputs_skip_their_dependents(tmp_path, recorded_steps):
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet())
+    graph = build_graph(registry, str(tmp_path))
+    graph.start()
+    for row_id in (23, 26, 32, 40):
+        graph.finish('{0}:download'.format(row_id), True)
+    graph.finish('29:download', False)
+    results = graph.wait()
+    assert results['29:download'] is False
+    assert results['29:post'] is None and results['29:swap'] is None
+    assert [results['{0}:parent'.format(row_id)] for row_id in (23, 26, 29, 32)] == [None] * 4
+    assert all(results['{0}:swap'.format(row_id)] for row_id in (23, 26, 32, 40))
+    assert not [name for name, folder in recorded_steps if name.endswith(':parent')]
+
+
+def test_failed_tasks_skip_their_dependents():
+    graph = downloadData.TaskGraph(2)
+    ran = []
+    def fail():
+        raise RuntimeError("step failed")
+    graph.add('download')
+    graph.add('a', fail, ['download'])
+    graph.add('b', lambda: ran.append('b'), ['a'])
+    graph.add('c', lambda: ran.append('c'), ['b'])
+    graph.add('d', lambda: ran.append('d'), ['download'])
+    graph.start()
+    graph.finish('download', True)
+    results = graph.wait()
+    assert results == {'download': True, 'a': False, 'b': None, 'c': None, 'd': True}
+    assert ran == ['d']
+    assert str(graph.errors['a']) == "step failed"
+
+
+def test_cycles_and_unknown_tasks_are_rejected(tmp_path):
+    graph = downloadData.TaskGraph(1)
+    graph.add('a', None, ['c'])
+    graph.add('b', None, ['a'])
+    graph.add('c', None, ['b'])
+    graph.add('d')
+    with pytest.raises(ValueError, match="cycle: a, b, c"):
+        graph.start()
+    graph.add('e', None, ['missing'])
+    with pytest.raises(ValueError, match="Task e depends on unknown task missing"):
+        graph.order()
+    # Parent steps that depend on each other in the sheet form a cycle too
+    registry = downloadData.SourceRegistry.from_dataframe(make_osm_sheet({23: {'Depends On': '32'}}))
+    with pytest.raises(ValueError, match="cycle"):
+        build_graph(registry, str(tmp_path)).order()
@@ -0,0 +1,47 @@
+import os
+import time
+from zipfile import ZipFile
+
+import downloadData
+from helpers import make_synthetic_files
+
+
+def test_manifest_skips_unchanged_urls_and_catches_changes(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 3, 256 * 1024)
+    with ZipFile(os.path.join(source_dir, 'synthetic.zip'), 'w') as archive:
+        archive.write(os.path.join(source_dir, names[0]), names[0])
+    names.append('synthetic.zip')
+    server, base_url = file_server(source_dir)
+    out_dir = str(tmp_path / 'out')
+    manifest = downloadData.DownloadManifest(str(tmp_path / 'download_manifest.json'))
+    urls = [base_url + '/' + name for name in names]
+    for url in urls:
+        assert downloadData.download_and_unzip(out_dir, url, manifest=manifest)
+    for url, name in zip(urls, names):
+        assert manifest.get(url)['sha256'] == downloadData.hash_file(os.path.join(source_dir, name)).hexdigest()
+    assert manifest.get(urls[-1])['local_file'] == os.path.join(out_dir, 'synthetic.zip.txt')
+    assert os.path.exists(os.path.join(out_dir, names[0]))
+
+    # A new run reads the saved manifest
+    manifest = downloadData.DownloadManifest(manifest.path)
+    assert [url for url in urls if manifest.is_changed(url)] == []
+    # Modify one file on the server, one second later so its Last-Modified changes
+    modified = os.path.join(source_dir, names[1])
+    os.utime(modified, (time.time(), os.path.getmtime(modified) + 1))
+    assert [url for url in urls if manifest.is_changed(url)] == [urls[1]]
+
+
+def test_manifest_catches_deleted_local_files(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 1, 64 * 1024)
+    server, base_url = file_server(source_dir)
+    out_dir = str(tmp_path / 'out')
+    manifest = downloadData.DownloadManifest(str(tmp_path / 'download_manifest.json'))
+    url = base_url + '/' + names[0]
+    downloadData.download_and_unzip(out_dir, url, manifest=manifest)
+    assert not manifest.is_changed(url)
+    os.remove(os.path.join(out_dir, names[0]))
+    assert manifest.is_changed(url)
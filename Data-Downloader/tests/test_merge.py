@@ -0,0 +1,177 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import downloadData
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('pyogrio')
+from pyogrio.raw import read_arrow, write_arrow
+
+
+def point_wkb(x, y):
+    """Returns an Arrow array of WKB points"""
+    geometry = np.zeros((len(x), 21), dtype='uint8')
+    geometry[:, 0] = 1
+    geometry[:, 1] = 1
+    geometry[:, 5:] = np.column_stack((x, y)).view('uint8')
+    return pa.array([row.tobytes() for row in geometry], type=pa.binary())
+
+
+def test_merge_layers_conforms_fields_and_keeps_every_feature(tmp_path):
+    layer_count, feature_count = 4, 5000
+    paths = []
+    expected = []
+    for i in range(layer_count):
+        rng = np.random.default_rng(i)
+        x = rng.uniform(-78, -76, feature_count)
+        y = rng.uniform(38, 40, feature_count)
+        osm_id = np.arange(feature_count, dtype='int64') + i * feature_count
+        # One input stores osm_id as text, and every other input has an extra field with the fields in another order
+        columns = {'osm_id': pa.array(osm_id.astype(str)) if i == 2 else pa.array(osm_id.astype('int32')),
+                   'name': pa.array(['road_{0}_{1}'.format(i, j) for j in range(feature_count)])}
+        if i % 2:
+            columns['lanes'] = pa.array(rng.integers(1, 5, feature_count).astype('int32'))
+            columns = dict(reversed(list(columns.items())))
+        columns['wkb_geometry'] = point_wkb(x, y)
+        path = str(tmp_path / 'roads_{0}.shp'.format(i))
+        write_arrow(pa.table(columns), path, layer='roads_{0}'.format(i), driver='ESRI Shapefile', geometry_name='wkb_geometry',
+                    geometry_type='Point', crs='EPSG:4269')
+        paths.append(path)
+        expected.append((osm_id, np.column_stack((x, y))))
+    out_gdb = str(tmp_path / 'merged.gdb')
+    count = downloadData.merge_layers(paths, out_gdb, 'roads', batch_size=1024)
+    meta, table = read_arrow(out_gdb, layer='roads')
+    assert count == table.num_rows == layer_count * feature_count
+    assert [name for name in table.column_names if name != meta['geometry_name']][:3] == ['osm_id', 'name', 'lanes']
+    assert meta['geometry_type'] == 'Point'
+    assert np.array_equal(table.column('osm_id').to_numpy(), np.concatenate([osm_id for osm_id, xy in expected]))
+    geometries = np.frombuffer(b''.join(table.column(meta['geometry_name']).to_pylist()), dtype='uint8').reshape(count, -1)
+    # File geodatabases snap coordinates to their resolution, 1e-9 degrees by default
+    assert np.allclose(geometries[:, -16:].copy().view('float64'), np.concatenate([xy for osm_id, xy in expected]), rtol=0, atol=1e-9)
+    lanes = table.column('lanes').to_numpy(zero_copy_only=False).astype('float64').reshape(layer_count, -1)
+    assert np.isnan(lanes).all(axis=1).tolist() == [i % 2 == 0 for i in range(layer_count)]
+
+
+def test_merge_layers_rejects_paths_it_cannot_read(tmp_path):
+    with pytest.raises(ValueError):
+        downloadData.merge_layers([str(tmp_path / 'missing.shp')], str(tmp_path / 'merged.gdb'), 'roads')
+
+
+def multipoint_wkb(points):
+    """Returns the WKB of a multipoint of (x, y) tuples"""
+    return struct.pack('<BII', 1, 4, len(points)) + b''.join(struct.pack('<BIdd', 1, 1, x, y) for x, y in points)
+
+
+def write_layer(path, columns, geometry_type='Point', crs='EPSG:4269'):
+    """Writes a layer of the Arrow arrays in `columns` (with a wkb_geometry column) and returns its path"""
+    path = str(path)
+    write_arrow(pa.table(columns), path, layer=os.path.splitext(os.path.basename(path))[0], driver='GPKG',
+                geometry_name='wkb_geometry', geometry_type=geometry_type, crs=crs)
+    return path
+
+
+def test_values_that_do_not_fit_are_left_empty_without_wrapping(tmp_path):
+    first = write_layer(tmp_path / 'first.gpkg', {'code': pa.array([1, 2], type=pa.int32()), 'wkb_geometry': point_wkb([0, 1], [0, 1])})
+    # 2**32 + 5 would wrap to 5 in a 32-bit field, and 'x' is not a number
+    second = write_layer(tmp_path / 'second.gpkg', {'code': pa.array(['7', 'x', str(2 ** 32 + 5), '-3']),
+                                                     'wkb_geometry': point_wkb([2, 3, 4, 5], [2, 3, 4, 5])})
+    third = write_layer(tmp_path / 'third.gpkg', {'code': pa.array([8, 2 ** 40], type=pa.int64()), 'wkb_geometry': point_wkb([6, 7], [6, 7])})
+    out_path = str(tmp_path / 'merged.gpkg')
+    assert downloadData.merge_layers([first, second, third], out_path, 'merged') == 8
+    meta, table = read_arrow(out_path, layer='merged')
+    assert table.column('code').to_pylist() == [1, 2, 7, None, None, -3, 8, None]
+
+
+def test_missing_fields_are_left_empty(tmp_path):
+    first = write_layer(tmp_path / 'first.gpkg', {'name': pa.array(['a']), 'wkb_geometry': point_wkb([0], [0])})
+    second = write_layer(tmp_path / 'second.gpkg', {'lanes': pa.array([2], type=pa.int32()), 'NAME': pa.array(['b']),
+                                                     'wkb_geometry': point_wkb([1], [1])})
+    out_path = str(tmp_path / 'merged.gpkg')
+    downloadData.merge_layers([first, second], out_path, 'merged')
+    meta, table = read_arrow(out_path, layer='merged')
+    assert table.column('name').to_pylist() == ['a', 'b']
+    assert table.column('lanes').to_pylist() == [None, 2]
+
+
+def test_single_part_inputs_are_promoted_to_multi_part(tmp_path):
+    single = write_layer(tmp_path / 'single.gpkg', {'wkb_geometry': point_wkb([0], [0])})
+    multi = write_layer(tmp_path / 'multi.gpkg', {'wkb_geometry': pa.array([multipoint_wkb([(1, 1), (2, 2)])], type=pa.binary())},
+                        geometry_type='MultiPoint')
+    out_path = str(tmp_path / 'merged.gpkg')
+    downloadData.merge_layers([single, multi], out_path, 'merged')
+    meta, table = read_arrow(out_path, layer='merged')
+    assert meta['geometry_type'] == 'MultiPoint'
+    assert table.column(meta['geometry_name'] or 'wkb_geometry').to_pylist() == [multipoint_wkb([(0, 0)]), multipoint_wkb([(1, 1), (2, 2)])]
+
+
+def test_z_values_are_kept(tmp_path):
+    flat = write_layer(tmp_path / 'flat.gpkg', {'wkb_geometry': point_wkb([0], [0])})
+    raised = write_layer(tmp_path / 'raised.gpkg', {'wkb_geometry': pa.array([struct.pack('<BIddd', 1, 1001, 1, 2, 3)], type=pa.binary())},
+                         geometry_type='Point Z')
+    out_path = str(tmp_path / 'merged.gpkg')
+    downloadData.merge_layers([flat, raised], out_path, 'merged')
+    meta, table = read_arrow(out_path, layer='merged')
+    assert meta['geometry_type'] == 'Point Z'
+    geometry = table.column(meta['geometry_name'] or 'wkb_geometry').to_pylist()[1]
+    assert struct.unpack('<ddd', geometry[-24:]) == (1, 2, 3)
+
+
+def test_inputs_in_other_coordinate_systems_are_left_to_arcpy(tmp_path):
+    pytest.importorskip('pyproj')
+    first = write_layer(tmp_path / 'first.gpkg', {'wkb_geometry': point_wkb([0], [0])})
+    second = write_layer(tmp_path / 'second.gpkg', {'wkb_geometry': point_wkb([1], [1])}, crs='EPSG:26918')
+    out_path = str(tmp_path / 'merged.gpkg')
+    with pytest.raises(downloadData.MergeUnsupported):
+        downloadData.merge_layers([first, second], out_path, 'merged')
+    assert not os.path.exists(out_path)
+
+
+def test_coordinate_systems_are_compared_by_definition():
+    pyproj = pytest.importorskip('pyproj')
+    assert downloadData.crs_equal('EPSG:4269', pyproj.CRS('EPSG:4269').to_wkt())
+    assert not downloadData.crs_equal('EPSG:4269', 'EPSG:4326')
+    assert not downloadData.crs_equal('EPSG:4269', None)
+
+
+def test_merges_into_one_geodatabase_take_turns(tmp_path, monkeypatch):
+    # Sources merging into the same geodatabase (like the Open Street Map rows) run in parallel in the post-processing graph
+    feature_count = 2000
+    sources = []
+    for i in range(6):
+        names = []
+        for j in range(2):
+            name = 'layer_{0}_{1}.shp'.format(i, j)
+            rng = np.random.default_rng(i * 2 + j)
+            write_arrow(pa.table({'value': pa.array(np.arange(feature_count, dtype='int32')),
+                                  'wkb_geometry': point_wkb(rng.uniform(-78, -76, feature_count), rng.uniform(38, 40, feature_count))}),
+                        str(tmp_path / name), layer=name[:-4], driver='ESRI Shapefile', geometry_name='wkb_geometry', geometry_type='Point',
+                        crs='EPSG:4269')
+            names.append(name)
+        sources.append(downloadData.Source.from_row({'ID': i + 1, 'File Names': ', '.join(names), 'New File Names': 'merged_{0}'.format(i),
+                                                     'New GDB Name': 'OSM.gdb'}))
+    writing = []
+    overlaps = []
+    merge_layers = downloadData.merge_layers
+    def record_merge_layers(in_paths, out_dataset, out_layer, **kwargs):
+        writing.append(out_layer)
+        overlaps.append(len(writing))
+        try:
+            return merge_layers(in_paths, out_dataset, out_layer, **kwargs)
+        finally:
+            writing.remove(out_layer)
+    monkeypatch.setattr(downloadData, 'merge_layers', record_merge_layers)
+    with downloadData.ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        list(executor.map(lambda source: downloadData.merge_feature_classes(source, str(tmp_path)), sources))
+    assert max(overlaps) == 1
+    for i in range(len(sources)):
+        meta, table = read_arrow(str(tmp_path / 'OSM.gdb'), layer='merged_{0}'.format(i))
+        assert table.num_rows == 2 * feature_count
+
+
+def test_geodatabase_locks_are_keyed_on_the_full_path(tmp_path):
+    gdb = str(tmp_path / 'OSM.gdb')
+    assert downloadData.get_gdb_lock(gdb) is downloadData.get_gdb_lock(os.path.join(str(tmp_path), '.', 'OSM.gdb') + os.sep)
+    assert downloadData.get_gdb_lock(gdb) is not downloadData.get_gdb_lock(str(tmp_path / 'Hydro.gdb'))
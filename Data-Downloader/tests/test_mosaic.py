@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+import downloadData
+
+rasterio = pytest.importorskip('rasterio')
+from rasterio.transform import from_origin
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    """Writes overlapping DEM tiles (with NoData holes) and returns [(path, row offset, column offset, data)]"""
+    tile_count, tile_size, overlap = 4, 300, 40
+    cell = 1 / 10800
+    step = tile_size - overlap
+    tiles = []
+    for i in range(tile_count):
+        data = np.random.default_rng(i).uniform(0, 500, (tile_size, tile_size)).astype('float32') + 1000 * i
+        data[tile_size // 3:tile_size // 2, :overlap * 2] = -9999.0
+        row_offset = overlap * (i % 2)
+        path = str(tmp_path / 'tile_{0}.tif'.format(i))
+        with rasterio.open(path, 'w', driver='GTiff', width=tile_size, height=tile_size, count=1, dtype='float32', crs='EPSG:4269',
+                           transform=from_origin(-77.5 + i * step * cell, 39.5 - row_offset * cell, cell, cell), nodata=-9999.0) as dst:
+            dst.write(data, 1)
+        tiles.append((path, row_offset, i * step, data))
+    return tiles
+
+
+def expected_mosaic(tiles, method):
+    tile_size = tiles[0][3].shape[0]
+    height = tile_size + max(row_offset for path, row_offset, col_offset, data in tiles)
+    width = tiles[-1][2] + tile_size
+    expected = np.full((height, width), -9999.0, dtype='float32')
+    for path, row_offset, col_offset, data in (tiles if method == 'LAST' else tiles[::-1]):
+        target = expected[row_offset:row_offset + tile_size, col_offset:col_offset + tile_size]
+        target[data != -9999.0] = data[data != -9999.0]
+    return expected
+
+
+@pytest.mark.parametrize('method', ['LAST', 'FIRST'])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_mosaic_matches_the_in_memory_mosaic(tmp_path, tiles, method, workers):
+    out_path = str(tmp_path / 'mosaic.tif')
+    width, height = downloadData.mosaic_windowed([tile[0] for tile in tiles], out_path, method, block_size=128, workers=workers)
+    expected = expected_mosaic(tiles, method)
+    assert (height, width) == expected.shape
+    with rasterio.open(out_path) as src:
+        assert np.array_equal(src.read(1), expected)
+        assert src.nodata == -9999.0
+        assert src.crs.to_epsg() == 4269
+        assert src.tags(ns='IMAGE_STRUCTURE').get('LAYOUT') == 'COG'
+        assert src.overviews(1)
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(tile[0]) for tile in tiles] + ['mosaic.tif'])
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import downloadData
+
+pytest.importorskip('pyarrow')
+pyogrio = pytest.importorskip('pyogrio')
+from pyogrio.raw import read_arrow
+
+
+@pytest.fixture
+def npdes_csv(tmp_path):
+    """Writes an NPDES-like csv with some bad coordinates and returns its path"""
+    df = pd.DataFrame({'NPDES_ID': ['MD{0:07d}'.format(i) for i in range(10)],
+                       'FLOW': [str(i * 1.5) for i in range(10)],
+                       'LATITUDE83': ['38.9', '39.1', '', '39.0', '391.5', '38.5', '38.7', '0', '39.2', '38.8'],
+                       'LONGITUDE83': ['-77.0', '-77.2', '-77.1', 'N/A', '-77.3', '-76.9', '-77.4', '0', '-76.8', '-77.05']})
+    path = str(tmp_path / 'npdes.csv')
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_csv_to_geopackage_writes_valid_points(tmp_path, npdes_csv):
+    out_gpkg = str(tmp_path / 'points.gpkg')
+    written, dropped = downloadData.csv_to_geopackage(npdes_csv, out_gpkg, 'points', chunk_rows=3)
+    # Missing, not a number, out of range, and 0, 0 coordinates are dropped
+    assert (written, dropped) == (6, 4)
+    assert sorted(os.listdir(str(tmp_path))) == ['npdes.csv', 'points.gpkg']
+    meta, table = read_arrow(out_gpkg, layer='points')
+    assert table.column('NPDES_ID').to_pylist() == ['MD0000000', 'MD0000001', 'MD0000005', 'MD0000006', 'MD0000008', 'MD0000009']
+    points = np.frombuffer(b''.join(table.column(meta['geometry_name']).to_pylist()), dtype=downloadData.WKB_POINT)
+    assert (points['wkb_type'] == 1).all()
+    assert points['x'].tolist() == table.column('LONGITUDE83').to_pylist()
+    assert points['y'].tolist() == table.column('LATITUDE83').to_pylist()
+    connection = sqlite3.connect(out_gpkg)
+    bounds = connection.execute('SELECT min_x, min_y, max_x, max_y FROM gpkg_contents').fetchone()
+    connection.close()
+    assert bounds == (-77.4, 38.5, -76.8, 39.2)
+
+
+def test_attributes_are_written_as_text_from_every_chunk(tmp_path):
+    path = str(tmp_path / 'typed.csv')
+    df = pd.DataFrame({'PERMIT': ['1', '2', '3', 'MD04', '5', '6'],
+                       'ZIP': ['20001', '20002', '02134', '20004', '20005', '20006'],
+                       'FLOW': ['1', '2', '3', '4', '5.25', '-0.50'],
+                       'EMPTY': [''] * 6,
+                       'LATE': ['', '', '', '', '7', '8'],
+                       'FID': ['a', 'b', 'c', 'd', 'e', 'f'],
+                       'LATITUDE83': ['38.9'] * 6,
+                       'LONGITUDE83': ['-77.0'] * 6})
+    df.to_csv(path, index=False)
+    out_gpkg = str(tmp_path / 'points.gpkg')
+    # Chunks of two rows, each appended to the layer created with the declared schema
+    assert downloadData.csv_to_geopackage(path, out_gpkg, 'points', chunk_rows=2) == (6, 0)
+    connection = sqlite3.connect(out_gpkg)
+    types = {row[1]: row[2] for row in connection.execute('PRAGMA table_info(points)')}
+    rows = connection.execute('SELECT PERMIT, ZIP, FLOW, EMPTY, LATE, FID_ FROM points ORDER BY fid').fetchall()
+    connection.close()
+    assert types == {'fid': 'INTEGER', 'geom': 'POINT', 'PERMIT': 'TEXT', 'ZIP': 'TEXT', 'FLOW': 'TEXT', 'EMPTY': 'TEXT', 'LATE': 'TEXT',
+                     'FID_': 'TEXT', 'LATITUDE83': 'REAL', 'LONGITUDE83': 'REAL'}
+    assert list(zip(*rows)) == [('1', '2', '3', 'MD04', '5', '6'), ('20001', '20002', '02134', '20004', '20005', '20006'),
+                                ('1', '2', '3', '4', '5.25', '-0.50'), (None,) * 6, (None, None, None, None, '7', '8'),
+                                ('a', 'b', 'c', 'd', 'e', 'f')]
+
+
+def test_csv_without_valid_points_writes_an_empty_layer(tmp_path):
+    path = str(tmp_path / 'no_points.csv')
+    pd.DataFrame({'NPDES_ID': ['MD0000001'], 'LATITUDE83': [''], 'LONGITUDE83': ['']}).to_csv(path, index=False)
+    out_gpkg = str(tmp_path / 'points.gpkg')
+    assert downloadData.csv_to_geopackage(path, out_gpkg, 'points') == (0, 1)
+    assert pyogrio.read_info(out_gpkg, layer='points')['features'] == 0
+
+
+def test_csv_without_coordinates_is_rejected(tmp_path):
+    path = str(tmp_path / 'no_coordinates.csv')
+    pd.DataFrame({'NPDES_ID': ['MD0000001']}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        downloadData.csv_to_geopackage(path, str(tmp_path / 'points.gpkg'), 'points')
+
+
+def test_geopackage_reads_with_gdal(tmp_path, npdes_csv):
+    out_gpkg = str(tmp_path / 'points.gpkg')
+    downloadData.csv_to_geopackage(npdes_csv, out_gpkg, 'points')
+    info = pyogrio.read_info(out_gpkg, layer='points')
+    assert info['features'] == 6
+    assert info['geometry_type'] == 'Point'
+    assert info['crs'] == 'EPSG:4269'
+    assert dict(zip(info['fields'], info['dtypes'])) == {'NPDES_ID': 'object', 'FLOW': 'object', 'LATITUDE83': 'float64',
+                                                         'LONGITUDE83': 'float64'}
+
+
+def test_failed_conversion_leaves_no_geopackage(tmp_path, npdes_csv, monkeypatch):
+    out_gpkg = str(tmp_path / 'points.gpkg')
+    def fail(x, y):
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(downloadData, 'get_wkb_points', fail)
+    with pytest.raises(RuntimeError):
+        downloadData.csv_to_geopackage(npdes_csv, out_gpkg, 'points')
+    assert sorted(os.listdir(str(tmp_path))) == ['npdes.csv']
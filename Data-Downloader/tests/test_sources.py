@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+import downloadData
+
+
+def make_sources_sheet(row_count=70):
+    """Returns a synthetic Sources sheet whose rows 101, 102, and 104 are broken"""
+    rows = []
+    for i in range(1, row_count + 1):
+        # IDs start above the rows with legacy post-processing steps
+        row = {'ID': float(100 + i), 'Activated': 'Yes' if i % 5 else 'No', 'Local Directory': 'Source_{0}'.format(i),
+               'Avaliability': ('URL', 'AGOL', 'Internal')[i % 3], 'Source Type': 'Dataset', 'File Type': 'Shapefile',
+               'Web File for Download': 'https://example.com/source_{0}.zip'.format(i), 'Items': None,
+               'Data Item ID': 'item{0}'.format(i), 'File Names': None, 'New File Names': None, 'Original GDB Name': None,
+               'New GDB Name': None, 'New GDB Directory': None}
+        if row['Avaliability'] == 'AGOL':
+            row['File Type'] = 'FileGeodatabase'
+        if i % 7 == 0:
+            row.update({'Source Type': 'Datasets', 'Items': 'a.zip, b.zip, c.zip'})
+        rows.append(row)
+    # Broken rows: a Datasets URL without Items, an unsupported AGOL File Type, and a merge without File Names
+    rows[0].update({'Avaliability': 'URL', 'Source Type': 'Datasets', 'Items': None})
+    rows[1].update({'Avaliability': 'AGOL', 'File Type': 'Shapefile'})
+    rows[3].update({'Avaliability': 'URL', 'Post Processing': 'create_gdb, merge', 'New GDB Name': 'Merged.gdb'})
+    rows[6].update({'Post Processing': 'create_gdb, merge', 'New GDB Name': 'Merged.gdb', 'File Names': 'a.shp, b.shp, c.shp',
+                    'New File Names': 'merged'})
+    return pd.DataFrame(rows)
+
+
+def test_registry_catches_broken_rows():
+    registry = downloadData.SourceRegistry.from_dataframe(make_sources_sheet())
+    assert sorted(registry.invalid) == [101, 102, 104]
+    assert registry.invalid[101] == ["no Web File for Download or Items"]
+    assert registry.invalid[102] == ["unsupported AGOL File Type 'Shapefile'"]
+    assert registry.invalid[104] == ["merge needs File Names and New File Names"]
+
+
+def test_registry_indexes_activated_sources_in_sheet_order():
+    df = make_sources_sheet()
+    registry = downloadData.SourceRegistry.from_dataframe(df)
+    activated = [int(row['ID']) for index, row in df.iterrows() if row['Activated'] == 'Yes' and int(row['ID']) not in registry.invalid]
+    for availability in ('URL', 'AGOL', 'Internal'):
+        ids = [source.id for source in registry.get(availability)]
+        assert ids == [source_id for source_id in activated if registry.by_id[source_id].availability == availability]
+    assert [source.id for source in registry.by_step['merge']] == [107]
+    datasets = registry.by_id[114]
+    assert datasets.urls == tuple('https://example.com/source_14.zip/' + item for item in ('a.zip', 'b.zip', 'c.zip'))
+    assert sum(len(source.urls) for source in registry.get('URL')) == sum(
+        3 if source.source_type == 'Datasets' else 1 for source in registry.get('URL'))
+
+
+def test_registry_rejects_unreadable_rows():
+    df = make_sources_sheet(7).astype({'ID': object})
+    df.loc[1, 'ID'] = 'abc'
+    with pytest.raises(ValueError, match="row 3: ID 'abc' is not a number"):
+        downloadData.SourceRegistry.from_dataframe(df)
+    df.loc[1, 'ID'] = 101.0
+    with pytest.raises(ValueError, match="more than one row with ID 101"):
+        downloadData.SourceRegistry.from_dataframe(df)
+
+
+def test_registry_rejects_shared_and_nested_local_directories():
+    df = make_sources_sheet(7)
+    df.loc[2, 'Local Directory'] = 'Hydro'
+    df.loc[5, 'Local Directory'] = os.path.join('Hydro', 'NHD')
+    df.loc[3, 'Local Directory'] = 'Source_1'
+    # Row 105 is not activated, so row 107 can share its Local Directory
+    df.loc[6, 'Local Directory'] = 'Source_5'
+    registry = downloadData.SourceRegistry.from_dataframe(df)
+    assert registry.invalid == {101: ["Local Directory is also used by row 104", "no Web File for Download or Items"],
+                                102: ["unsupported AGOL File Type 'Shapefile'"],
+                                103: ["Local Directory contains the Local Directory of row 106"],
+                                104: ["Local Directory is also used by row 101", "merge needs File Names and New File Names"],
+                                106: ["Local Directory is inside the Local Directory of row 103"]}
@@ -0,0 +1,66 @@
+import os
+
+import downloadData
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_make_staging_dir_deletes_stale_staging_dirs(tmp_path):
+    root_dir = str(tmp_path)
+    local_dir = os.path.join(root_dir, 'Hydro', 'NHD')
+    write(os.path.join(root_dir, '.downloader', 'staging', 'Hydro', 'NHD', 'stale.txt'), 'stale')
+    staging_dir = downloadData.make_staging_dir(local_dir, root_dir)
+    assert staging_dir == os.path.join(root_dir, '.downloader', 'staging', 'Hydro', 'NHD')
+    assert os.listdir(staging_dir) == []
+    assert os.listdir(root_dir) == ['.downloader']
+
+
+def test_swap_and_rollback(tmp_path):
+    root_dir = str(tmp_path)
+    local_dir = os.path.join(root_dir, 'Hydro', 'NHD')
+    previous_dir = os.path.join(root_dir, '.downloader', 'previous', 'Hydro', 'NHD')
+    write(os.path.join(local_dir, 'data.txt'), 'old')
+    staging_dir = downloadData.make_staging_dir(local_dir, root_dir)
+    write(os.path.join(staging_dir, 'data.txt'), 'new')
+    downloadData.swap_staging_dir(staging_dir, local_dir, root_dir)
+    # The library holds only the swapped in copy, and the replaced copy is kept in the work folder
+    assert sorted(os.listdir(root_dir)) == ['.downloader', 'Hydro']
+    assert os.listdir(os.path.join(root_dir, 'Hydro')) == ['NHD']
+    assert read(os.path.join(local_dir, 'data.txt')) == 'new'
+    assert read(os.path.join(previous_dir, 'data.txt')) == 'old'
+    assert downloadData.rollback_local_dir(local_dir, root_dir)
+    assert read(os.path.join(local_dir, 'data.txt')) == 'old'
+    # Rolling back twice restores the swapped in copy
+    assert downloadData.rollback_local_dir(local_dir, root_dir)
+    assert read(os.path.join(local_dir, 'data.txt')) == 'new'
+    assert read(os.path.join(previous_dir, 'data.txt')) == 'old'
+    assert os.listdir(os.path.join(root_dir, 'Hydro')) == ['NHD']
+
+
+def test_swap_creates_a_new_local_dir(tmp_path):
+    root_dir = str(tmp_path)
+    local_dir = os.path.join(root_dir, 'Hydro', 'NHD')
+    staging_dir = downloadData.make_staging_dir(local_dir, root_dir)
+    write(os.path.join(staging_dir, 'data.txt'), 'new')
+    downloadData.swap_staging_dir(staging_dir, local_dir, root_dir)
+    assert read(os.path.join(local_dir, 'data.txt')) == 'new'
+    assert not downloadData.rollback_local_dir(local_dir, root_dir)
+
+
+def test_rollback_without_a_local_dir_restores_the_previous_copy(tmp_path):
+    root_dir = str(tmp_path)
+    local_dir = os.path.join(root_dir, 'Source')
+    write(os.path.join(root_dir, '.downloader', 'previous', 'Source', 'data.txt'), 'old')
+    assert downloadData.rollback_local_dir(local_dir, root_dir)
+    assert sorted(os.listdir(root_dir)) == ['.downloader', 'Source']
+    assert read(os.path.join(local_dir, 'data.txt')) == 'old'
+    assert not downloadData.rollback_local_dir(local_dir, root_dir)
@@ -0,0 +1,52 @@
+import functools
+import os
+
+import downloadData
+from helpers import make_synthetic_archive, make_synthetic_files
+
+
+def test_telemetry_logs_every_download_and_unzip(tmp_path, file_server, monkeypatch, capsys):
+    file_size = 2 * 1024 * 1024
+    # Retry the dropping host without waiting
+    monkeypatch.setattr(downloadData, 'download_url', functools.partial(downloadData.download_url, backoff=0.01))
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    names = make_synthetic_files(source_dir, 3, file_size)
+    make_synthetic_archive(os.path.join(source_dir, 'archive.zip'), 4, file_size // 4)
+    fast = file_server(source_dir)[1]
+    slow = file_server(source_dir, rate=8 * 1024 * 1024)[1]
+    dropping = file_server(source_dir, drop_after=1536 * 1024)[1]
+    urls = {'fast': [fast + '/' + names[0], fast + '/archive.zip'], 'slow': [slow + '/' + names[1]], 'dropping': [dropping + '/' + names[2]]}
+    log_path = str(tmp_path / 'telemetry.jsonl')
+    telemetry = downloadData.DownloadTelemetry(log_path, {'fast': 'Fast/Source', 'slow': 'Slow/Source', 'dropping': 'Dropping/Source'})
+    scheduler = downloadData.DownloadScheduler(4, 2, progress_interval=60)
+    for source, source_urls in urls.items():
+        job = functools.partial(downloadData.download_and_unzip, telemetry=telemetry, source=source)
+        for url in source_urls:
+            scheduler.submit(job, str(tmp_path / source), url)
+    scheduler.wait()
+
+    events = downloadData.DownloadTelemetry.read_last_run(log_path)
+    assert events == telemetry.events
+    downloads = [event for event in events if event['event'] == 'download']
+    assert sorted(event['url'] for event in downloads) == sorted(url for source_urls in urls.values() for url in source_urls)
+    assert all(event['ok'] and event['ttfb'] is not None for event in downloads)
+    assert sum(event['bytes'] for event in downloads) == 3 * file_size + os.path.getsize(os.path.join(source_dir, 'archive.zip'))
+    assert {event['source']: event['retries'] for event in downloads if event['source'] != 'fast'} == {'slow': 0, 'dropping': 1}
+    unzips = [event for event in events if event['event'] == 'unzip']
+    assert [(event['source'], event['streamed']) for event in unzips] == [('fast', True)]
+
+    telemetry.print_summary(['missing.zip'])
+    output = capsys.readouterr().out
+    assert 'Dropping/Source' in output and 'Slow/Source' in output
+    assert 'Downloads that raised issues: missing.zip' in output
+
+
+def test_failed_downloads_are_logged(tmp_path, file_server, issue_list):
+    server, base_url = file_server(str(tmp_path))
+    telemetry = downloadData.DownloadTelemetry(None, {1: 'Missing/Source'})
+    assert not downloadData.download_and_unzip(str(tmp_path / 'out'), base_url + '/missing.bin', telemetry=telemetry, source=1)
+    assert issue_list == [base_url + '/missing.bin']
+    [event] = telemetry.events
+    assert (event['event'], event['source'], event['name'], event['ok']) == ('download', 1, 'Missing/Source', False)
+    assert '404' in event['error']
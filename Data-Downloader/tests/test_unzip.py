@@ -0,0 +1,92 @@
+import os
+import random
+import shutil
+import time
+import zipfile
+from zipfile import ZipFile
+
+import pytest
+
+import downloadData
+from helpers import make_synthetic_archive, trees_match
+
+
+@pytest.mark.parametrize('descriptors', [False, True])
+def test_stream_unzip_matches_unpack_archive(tmp_path, file_server, descriptors):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    archive_path = os.path.join(source_dir, 'synthetic.zip')
+    make_synthetic_archive(archive_path, 6, 512 * 1024, descriptors=descriptors)
+    server, base_url = file_server(source_dir)
+    expected_dir = str(tmp_path / 'expected')
+    shutil.unpack_archive(archive_path, expected_dir)
+    out_dir = str(tmp_path / 'out')
+    extractor = downloadData.StreamingZipExtractor(out_dir, workers=3, spool_memory=64 * 1024)
+    paths = downloadData.stream_unzip_url(out_dir, base_url + '/synthetic.zip', extractor=extractor)
+    expected = [os.path.relpath(os.path.join(root, name), expected_dir) for root, dirs, files in os.walk(expected_dir) for name in files]
+    assert sorted(os.path.relpath(path, out_dir) for path in paths) == sorted(expected)
+    assert trees_match(expected_dir, out_dir)
+    assert not os.path.exists(os.path.join(out_dir, 'synthetic.zip'))
+
+
+def test_download_and_unzip_writes_the_date_stamp(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    make_synthetic_archive(os.path.join(source_dir, 'synthetic.zip'), 3, 64 * 1024)
+    server, base_url = file_server(source_dir)
+    out_dir = str(tmp_path / 'out')
+    assert downloadData.download_and_unzip(out_dir, base_url + '/synthetic.zip')
+    assert sorted(os.listdir(out_dir)) == ['synthetic', 'synthetic.zip.txt']
+
+
+def test_extract_zip_parallel_matches_unpack_archive(tmp_path):
+    archive_path = str(tmp_path / 'synthetic.zip')
+    with ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(200):
+            info = zipfile.ZipInfo('synthetic.gdb/a{0:08x}.gdbtable'.format(i + 1), date_time=(2020, 1, 2, 3, 4, 6))
+            archive.writestr(info, random.Random(i).randbytes(4 * 1024).hex(), compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('tiles/tile_00.tif', random.Random(-1).randbytes(1024 * 1024).hex())
+    serial_dir = str(tmp_path / 'serial')
+    shutil.unpack_archive(archive_path, serial_dir)
+    parallel_dir = str(tmp_path / 'parallel')
+    paths = downloadData.extract_zip_parallel(archive_path, parallel_dir, workers=4)
+    assert len(paths) == 201
+    assert trees_match(serial_dir, parallel_dir)
+    member = os.path.join(parallel_dir, 'synthetic.gdb', 'a00000001.gdbtable')
+    assert time.localtime(os.path.getmtime(member))[:6] == (2020, 1, 2, 3, 4, 6)
+    assert not [name for root, dirs, files in os.walk(parallel_dir) for name in files if name.endswith('.extracting')]
+
+
+def make_bzip2_archive(path):
+    """Writes a zip file whose last member is compressed with bzip2, which cannot be extracted while it downloads"""
+    with ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(4):
+            archive.writestr('unsupported/part_{0}.bin'.format(i), random.Random(i).randbytes(256 * 1024).hex())
+        archive.writestr('unsupported/last.bin', random.Random(-1).randbytes(64 * 1024), compress_type=zipfile.ZIP_BZIP2)
+
+
+def test_unsupported_members_remove_what_was_streamed(tmp_path, file_server):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    make_bzip2_archive(os.path.join(source_dir, 'unsupported.zip'))
+    server, base_url = file_server(source_dir)
+    out_dir = str(tmp_path / 'out')
+    extractor = downloadData.StreamingZipExtractor(out_dir, workers=2, spool_memory=64 * 1024)
+    with pytest.raises(downloadData.StreamingUnsupported, match='compression method 12'):
+        downloadData.stream_unzip_url(out_dir, base_url + '/unsupported.zip', extractor=extractor)
+    assert [name for root, dirs, files in os.walk(out_dir) for name in files] == []
+
+
+def test_download_and_unzip_falls_back_to_downloading_first(tmp_path, file_server, issue_list):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    archive_path = os.path.join(source_dir, 'unsupported.zip')
+    make_bzip2_archive(archive_path)
+    server, base_url = file_server(source_dir)
+    expected_dir = str(tmp_path / 'expected')
+    shutil.unpack_archive(archive_path, expected_dir)
+    out_dir = str(tmp_path / 'out')
+    assert downloadData.download_and_unzip(out_dir, base_url + '/unsupported.zip')
+    assert issue_list == []
+    assert sorted(os.listdir(out_dir)) == ['unsupported', 'unsupported.zip.txt']
+    assert trees_match(os.path.join(expected_dir, 'unsupported'), os.path.join(out_dir, 'unsupported'))
@@ -5,7 +5,7 @@
 Abstract: Initial working script for documenting a GIS Library.
 
 Description: 
-The purpose of this script is to document the contents of the NCRN GIS OneDrive Library and write the outputs to an Excel spreadsheet.
+The purpose of this script is to document the contents of the NCRN GIS OneDrive Library and write the outputs to an Excel spreadsheet (or CSV/Parquet files).
 The script documents (1) geodatabases and (2) feature classes, shapefiles, and rasters
 
 TODO: Additional refactoring
@@ -28,14 +28,23 @@ https://www.thepythoncode.com/article/get-directory-size-in-bytes-using-python
 
 # Import statements for utilized libraries / packages
 from ftplib import parse150
-import arcpy
+import contextlib
+import copy
+import csv
 import glob
+import hashlib
+import json
 import os
-import scandir
+import re
+import sqlite3
+import struct
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
-from openpyxl import load_workbook
-
-print("### GETTING STARTED ###".format())
+from openpyxl import Workbook, load_workbook
 
 """
 Set various global variables. Some of these could be parameterized to be used as an 
@@ -46,6 +55,7 @@ ArcGIS Toolbox script and/or command line use.
 _PREFIX = r'C:\Users\goettel' ## Set to the user portion of the root directory. Script will exclude from path that is documented
 _WORKSPACE = r'C:\Users\goettel\DOI\NCRN Data Management - Geospatial\GIS' ## Set the directory path to the root directory that will be documented. NEED TO UPDATE PREFIX TO YOUR ONEDRIVE ACCOUNT
 __XCEL_LIBRARY = r'C:\Users\goettel\DOI\NCRN Data Management - Geospatial\NCRN_GIS_Geospatial_Contents.xlsx' ## Create a variable to store the full path to the Excel file. NEED TO UPDATE PREFIX TO YOUR ONEDRIVE ACCOUNT
+_CATALOG_CACHE = os.path.splitext(__XCEL_LIBRARY)[0] + '_catalog.sqlite' ## Persistent catalog of documented entries, stored next to the Excel file. Delete it to force a full re-documentation
 
 # Create a variable to store the file extension for file geodatabases
 _FGDB_EXT = '.gdb'
@@ -56,14 +66,184 @@ _SHP_EXT = '.shp'
 # Create a list variable to store file extensions to be ignored
 _EXCLUDE_EXT = ['lock', 'gdbindexes', 'gdbtable', 'gdbtablx', 'horizon', 'spx', 'freelist', 'atx', 'png'] # Logical variable to parameterize for toolbox and/or command line (maybe)
 
+# Create a list variable to store the names of folders that are not documented (in lowercase)
+_EXCLUDE_DIRS = ['.downloader'] ## Staging directories and previous copies of the sources kept by the Data-Downloader (its _WORK_DIR)
+
+# Create a list variable to store the geodatabase system tables sampled when fingerprinting a geodatabase (system catalog and items)
+_FGDB_SYSTEM_TABLES = ['a00000001.gdbtable', 'a00000004.gdbtable']
+
 # Create a list variable to store the file extensions for rasters (outside geodatabases)
 _RAST_EXT = ['.tif', '.tiff', '.jpg', '.jpeg', '.sid', '.bmp'] # Logical variable to parameterize for toolbox and/or command line
 
-# Create dataframes to record information that is documented
-fgdbs_master_df = pd.DataFrame(
-    columns = ['FGDB Path', 'FGDB Name', 'File Size', 'Feature Class Count', 'Feature Dataset Count', 'Table Count'])
-main_master_df = pd.DataFrame(
-    columns = ['Full Name', 'Location', 'Container', 'FeatureDataset', 'Extension/Format', 'Name', 'DataType', 'File Type / Compression', 'Geometry Type', 'SRS', 'Band Count', 'Size (MB)'])
+# Create variables to configure the describe engine
+_CRAWL_WORKERS = 8 ## Number of threads listing and stat'ing directories during the crawl. Each call is a round trip on network drives and OneDrive folders, so they are overlapped. Set to 1 to crawl in this thread
+_DESCRIBE_BACKEND = 'arcpy' ## Backend used to describe datasets: 'arcpy', 'ogr' (GDAL, no ArcGIS needed), 'native' (reads geodatabase catalogs directly), or 'fake' (placeholder values for testing)
+_NATIVE_FALLBACK_BACKEND = 'arcpy' ## Backend the 'native' backend uses for shapefiles, rasters, and geodatabases whose catalog cannot be read
+_DESCRIBE_WORKERS = os.cpu_count() or 1 ## Number of worker processes describing datasets. Set to 1 to describe in this process
+_DESCRIBE_CHUNK_SIZE = 16 ## Number of datasets sent to a worker at a time
+
+# Create variables to configure the output stage
+_OUTPUT_FORMAT = 'xlsx' ## Format of the library inventory: 'xlsx' (FGDBs and Main sheets of the Excel file), 'csv', or 'parquet' (one file per sheet next to the Excel file)
+_WRITE_CHUNK_ROWS = 5000 ## Number of documented rows held in memory before they are streamed to the output
+
+# Create a variable to store the path of the run report
+_RUN_REPORT = os.path.splitext(__XCEL_LIBRARY)[0] + '_run_report.json' ## JSON report of stage timings and counters, written next to the Excel file after each run and compared with the previous one
+
+# Create a variable to select a profiler to run alongside the documenter
+_PROFILE = None ## Set to 'cprofile' or 'pyinstrument' to profile the run. The profile is saved next to the Excel file (_profile.prof or _profile.html)
+
+# Create variables to store the kinds of entries found while crawling the workspace
+_KIND_FGDB = 'FGDB'
+_KIND_SHP = 'Shapefile'
+_KIND_RAST = 'Raster'
+
+# Create a record type for the entries found while crawling the workspace
+# (size in bytes, latest mtime of its files in seconds, members as (relative path, size) pairs of the files within a
+# geodatabase or of the sidecar files of a shapefile, e.g. its .dbf, .shx, and .prj)
+LibraryEntry = namedtuple('LibraryEntry', ['kind', 'path', 'size', 'mtime', 'members'])
+
+# Create lists to store the columns of the information that is documented
+_FGDB_COLUMNS = ['FGDB Path', 'FGDB Name', 'File Size', 'Feature Class Count', 'Feature Dataset Count', 'Table Count']
+_MAIN_COLUMNS = ['Full Name', 'Location', 'Container', 'FeatureDataset', 'Extension/Format', 'Name', 'DataType', 'File Type / Compression', 'Geometry Type', 'SRS', 'Band Count', 'Size (MB)']
+
+# Create a buffer class to record information that is documented
+class RecordBuffer:
+    """
+    Append-only buffer of documented rows, stored as one list per column
+    Appending a row is O(1). When attached to an output writer, the rows are streamed to it every `chunk_rows` rows.
+    """
+
+    __slots__ = ('columns', 'data', 'writer', 'sheet', 'chunk_rows')
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.data = [[] for column in self.columns]
+        self.writer = None
+        self.sheet = None
+        self.chunk_rows = None
+
+    def attach(self, writer, sheet, chunk_rows):
+        """Streams the buffered rows to `sheet` of an output writer every `chunk_rows` rows"""
+        self.writer = writer
+        self.sheet = sheet
+        self.chunk_rows = chunk_rows
+
+    def __len__(self):
+        return len(self.data[0])
+
+    def append(self, row):
+        """Appends a row (a list of values in column order)"""
+        if len(row) != len(self.columns):
+            raise ValueError("Expected {0} values, got {1}: {2}".format(len(self.columns), len(row), row))
+        for values, value in zip(self.data, row):
+            values.append(value)
+        if self.writer is not None and len(self) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows to the attached output writer and empties the buffer"""
+        if self.writer is not None and len(self):
+            self.writer.write_rows(self.sheet, list(zip(*self.data)))
+            self.data = [[] for column in self.columns]
+
+    def extend(self, rows):
+        """Appends several rows"""
+        for row in rows:
+            self.append(row)
+
+# Create record buffers to record information that is documented
+fgdbs_buffer = RecordBuffer(_FGDB_COLUMNS)
+main_buffer = RecordBuffer(_MAIN_COLUMNS)
+
+class RunReport:
+    """
+    Stage timings and counters of a documenter run, written as a JSON report
+    Each stage records its seconds and its own counters. A stage that counts 'datasets' also reports datasets per second.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.settings = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times a stage of the run and yields a dict for its counters"""
+        counters = self.stages.setdefault(name, {'seconds': 0.0})
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            counters['seconds'] += time.perf_counter() - start
+            if counters.get('datasets') and counters['seconds']:
+                counters['datasets_per_second'] = counters['datasets'] / counters['seconds']
+
+    def count(self, name, value=1):
+        """Adds `value` to a counter of the whole run"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)), 'seconds': time.time() - self.started,
+                'settings': self.settings, 'stages': self.stages, 'counters': self.counters}
+
+    def write(self, path):
+        """Writes the report to `path`, printing the stage timings next to those of the previous report at that path"""
+        report = self.to_dict()
+        previous = None
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = None
+        print("Run report ({0}):".format(path))
+        for name, counters in list(report['stages'].items()) + [('total', {'seconds': report['seconds']})]:
+            line = "  {0:<16} {1:>9.2f}s".format(name, counters['seconds'])
+            if previous is not None:
+                previous_seconds = previous['seconds'] if name == 'total' else previous.get('stages', {}).get(name, {}).get('seconds')
+                if previous_seconds is not None:
+                    line += " (previous run {0:.2f}s)".format(previous_seconds)
+            print(line)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+class RunProfiler:
+    """Profiles the run with cProfile or pyinstrument (which must be installed) and saves the profile next to the Excel file"""
+
+    def __init__(self, kind, base_path):
+        self.kind = kind
+        self.base_path = base_path
+        if kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif kind == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        else:
+            raise ValueError("Unknown profiler: {0}".format(kind))
+
+    def stop(self):
+        """Stops profiling, saves the profile, and returns its path"""
+        if self.kind == 'cprofile':
+            self.profiler.disable()
+            import pstats
+            path = self.base_path + '_profile.prof'
+            self.profiler.dump_stats(path)
+            pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(20)
+        else:
+            self.profiler.stop()
+            path = self.base_path + '_profile.html'
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        print("Saved the {0} profile to {1}".format(self.kind, path))
+        return path
+
+# Create a run report to record the timings and counters of the run
+run_report = RunReport()
 
 # Create some functions to be used in various places
 def get_files_glob(base_dir, ext):
@@ -77,8 +257,70 @@ def get_files_glob(base_dir, ext):
     """    
     return glob.iglob(rf"{base_dir}\**\*{ext}", recursive=True)
 
-def get_directory_total_size(directory):
-    """Returns the `directory` size in bytes."""
+class SizeIndex:
+    """
+    Bottom-up index of the cumulative bytes and file count of every directory, built once per crawl
+    The crawl records each directory's own files, then finalize() adds every directory to its parent once,
+    so nested geodatabases are not re-walked for each ancestor. The sizes of documented files are kept for lookups.
+    """
+
+    def __init__(self):
+        self.dirs = {}
+        self.files = {}
+        self.finalized = False
+
+    def key(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def add_dir(self, directory):
+        """Records a directory (so empty directories are known) before its files are added"""
+        self.dirs.setdefault(self.key(directory), [0, 0])
+
+    def add_file(self, file, size, keep=False):
+        """Adds a file to its directory's totals, keeping its own size for lookups when `keep` is set"""
+        totals = self.dirs.setdefault(self.key(os.path.dirname(file)), [0, 0])
+        totals[0] += size
+        totals[1] += 1
+        if keep:
+            self.files[self.key(file)] = size
+
+    def merge(self, other):
+        """Adds the totals and kept file sizes of another (not finalized) index, e.g. one built by a crawl thread"""
+        for directory, (size, count) in other.dirs.items():
+            totals = self.dirs.setdefault(directory, [0, 0])
+            totals[0] += size
+            totals[1] += count
+        self.files.update(other.files)
+
+    def finalize(self):
+        """Rolls the totals of every directory up into its ancestors, deepest directories first"""
+        if self.finalized:
+            return
+        for directory in sorted(self.dirs, key=lambda d: d.count(os.sep), reverse=True):
+            parent = os.path.dirname(directory)
+            if parent != directory and parent in self.dirs:
+                self.dirs[parent][0] += self.dirs[directory][0]
+                self.dirs[parent][1] += self.dirs[directory][1]
+        self.finalized = True
+
+    def directory_size(self, directory):
+        """Returns the cumulative bytes of a directory, or None if it was not crawled"""
+        totals = self.dirs.get(self.key(directory))
+        return totals[0] if totals is not None else None
+
+    def directory_count(self, directory):
+        """Returns the cumulative number of files in a directory, or None if it was not crawled"""
+        totals = self.dirs.get(self.key(directory))
+        return totals[1] if totals is not None else None
+
+    def file_size(self, file):
+        """Returns the bytes of a documented file, or None if it was not kept"""
+        return self.files.get(self.key(file))
+
+def get_directory_total_size(directory, index=None):
+    """Returns the `directory` size in bytes, looked up in the size index when it was crawled."""
+    if index is not None and index.directory_size(directory) is not None:
+        return index.directory_size(directory)
     total_size = 0
     try:
         for entry in os.scandir(directory):
@@ -88,7 +330,7 @@ def get_directory_total_size(directory):
             elif entry.is_dir():
                 # If it's a directory, recursively call this function
                 try:
-                    total_size += get_directory_total_size(entry.path)
+                    total_size += get_directory_total_size(entry.path, index)
                 except FileNotFoundError:
                     pass
     except NotADirectoryError:
@@ -113,18 +355,13 @@ def get_size_format(bytes, factor=1024, suffix="B"):
         bytes /= factor
     return f"{bytes:.2f}Y{suffix}"
 
-def get_folder_size(path='.'):
-    """Returns the folder size in its proper byte format"""
-    total = 0
-    for entry in os.scandir(path):
-        if entry.is_file():
-            total += entry.stat().st_size
-        elif entry.is_dir():
-            total += get_folder_size(entry.path)
-    return total/1024/1024
+def get_folder_size(path='.', index=None):
+    """Returns the folder size in megabytes, looked up in the size index when it was crawled"""
+    return get_directory_total_size(path, index)/1024/1024
 
 def get_srs_name(file):
     """Returns the name of the spatial reference system (srs)"""
+    import arcpy
     try:
         spatial_ref = arcpy.Describe(file).SpatialReference
         srs_name = spatial_ref.Name
@@ -132,166 +369,1153 @@ def get_srs_name(file):
         srs_name = 'Unknown'
     return srs_name
 
-def get_file_size(file, unit='bytes'):
+def get_file_size(file, unit='bytes', index=None):
     """
     Returns the file size in selected byte format
     get_file_size(file, 'bytes')
     Accepts kb, mb, or gb
+    With a size index the size is looked up without touching the disk ('Unknown' if it was not indexed)
     """
     try:
-        file_size = os.path.getsize(file)
+        file_size = index.file_size(file) if index is not None else os.path.getsize(file)
         exponents_map = {'bytes': 0, 'kb': 1, 'mb': 2, 'gb': 3}
         size = file_size / 1024 ** exponents_map[unit]
         return round(size, 3)
     except:
         return 'Unknown'
 
-def desc_fgdb(fgdb_list):
-    """loop over a list of geodatabases to document parameters"""
+def stat_entry(entry):
+    """Returns the stat of a directory entry without following symlinks, or None if it cannot be read"""
+    try:
+        return entry.stat(follow_symlinks=False)
+    except OSError:
+        return None
+
+def scan_fgdb(fgdb, size_index=None, scandir=os.scandir, map_stats=map):
+    """
+    Returns the total size in bytes, the latest modified time, and the (relative path, size) members of a geodatabase
+    The geodatabase is scanned with os.scandir as part of the crawl, so it is never walked a second time
+    """
+    total_size = 0
+    latest_mtime = 0
+    members = []
+    pending = [fgdb]
+    while pending:
+        directory = pending.pop()
+        if size_index is not None:
+            size_index.add_dir(directory)
+        files = []
+        try:
+            with scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        files.append(entry)
+        except (FileNotFoundError, PermissionError):
+            pass
+        for entry, stat in zip(files, map_stats(stat_entry, files)):
+            if stat is None:
+                continue
+            if size_index is not None:
+                size_index.add_file(entry.path, stat.st_size)
+            total_size += stat.st_size
+            latest_mtime = max(latest_mtime, stat.st_mtime)
+            members.append((os.path.relpath(entry.path, fgdb), stat.st_size))
+    return total_size, latest_mtime, tuple(sorted(members))
+
+def split_file_name(name):
+    """
+    Returns the lowercase (stem, extension) of a file name, e.g. ('roads', '.dbf') for roads.dbf
+    The stem of a shapefile's metadata file is that of the shapefile, e.g. 'roads' for roads.shp.xml.
+    """
+    stem, dot, ext = name.lower().rpartition('.')
+    if not stem:
+        return name.lower(), ''
+    if ext == 'xml' and stem.endswith(_SHP_EXT):
+        stem = stem[:-len(_SHP_EXT)]
+    return stem, '.' + ext
+
+def list_directory(directory, size_index=None, scandir=os.scandir, map_stats=map):
+    """
+    Lists one directory of the crawl and returns (subfolders, entries), or None if it cannot be read
+    Entries are the geodatabases, shapefiles, and rasters of the directory in name order. Geodatabases are
+    scanned in full and files are stat'ed here, through `map_stats` (e.g. the map of a thread pool), so every
+    filesystem call for the directory is made by the caller. With a size index, every file is added to it.
+    The sidecar files of each shapefile are stat'ed too and recorded as its members, with their latest mtime.
+    """
+    try:
+        with scandir(directory) as items:
+            items = sorted(items, key=lambda item: item.name)
+    except (FileNotFoundError, PermissionError, NotADirectoryError):
+        return None
+    if size_index is not None:
+        size_index.add_dir(directory)
+    subdirs = []
+    entries = []
+    files = []
+    names = [split_file_name(item.name) for item in items]
+    shapefile_stems = set(stem for stem, ext in names if ext == _SHP_EXT)
+    for item, (stem, ext) in zip(items, names):
+        try:
+            is_dir = item.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            if item.name.lower().endswith(_FGDB_EXT):
+                size, mtime, members = scan_fgdb(item.path, size_index, scandir, map_stats)
+                entries.append(LibraryEntry(_KIND_FGDB, item.path, size, mtime, members))
+            elif item.name.lower() not in _EXCLUDE_DIRS:
+                subdirs.append(item.path)
+            continue
+        kind = _KIND_SHP if ext == _SHP_EXT else _KIND_RAST if ext in _RAST_EXT else None
+        # Other files are only stat'ed for the size index, or as the sidecar files of a shapefile
+        if kind is not None or size_index is not None or stem in shapefile_stems:
+            files.append((item, kind, stem))
+    shapefiles = []
+    sidecars = {}
+    for (item, kind, stem), stat in zip(files, map_stats(stat_entry, [item for item, kind, stem in files])):
+        if stat is None:
+            continue
+        if size_index is not None:
+            size_index.add_file(item.path, stat.st_size, keep=kind is not None)
+        if kind == _KIND_SHP:
+            shapefiles.append((item, stat, stem))
+        elif kind is not None:
+            entries.append(LibraryEntry(kind, item.path, stat.st_size, stat.st_mtime, ()))
+        elif stem in shapefile_stems:
+            sidecars.setdefault(stem, []).append((item.name, stat.st_size, stat.st_mtime))
+    for item, stat, stem in shapefiles:
+        members = sidecars.get(stem, [])
+        mtime = max([stat.st_mtime] + [member_mtime for name, size, member_mtime in members])
+        entries.append(LibraryEntry(_KIND_SHP, item.path, stat.st_size, mtime, tuple(sorted((name, size) for name, size, member_mtime in members))))
+    # Geodatabases and files were collected separately, so restore the name order of the listing
+    entries.sort(key=lambda entry: entry.path)
+    return subdirs, entries
+
+def list_directory_sized(directory, with_sizes, scandir=os.scandir, map_stats=map):
+    """Lists a directory in a crawl thread, adding its files to a new size index that the crawl merges into its own"""
+    size_index = SizeIndex() if with_sizes else None
+    return list_directory(directory, size_index, scandir, map_stats), size_index
+
+def crawl_workspace(base_dir, size_index=None, workers=1, scandir=os.scandir):
+    """
+    Walks `base_dir` once with os.scandir and yields a LibraryEntry for every geodatabase, shapefile, and raster
+    Entries are yielded as they are found, files before subfolders and in name order within each folder.
+    Geodatabases are not searched for shapefiles or rasters, and folders named in _EXCLUDE_DIRS are skipped.
+    With more than one worker, directories are listed by one pool of threads as soon as they are found and their
+    files are stat'ed by a second pool (so listings never wait on their own pool), overlapping the round trips of
+    network drives. Entries are still yielded in the same order.
+    With a size index, every file is added to it during the same pass and the index is finalized at the end.
+    """
+    list_executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    stat_executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    def submit(directory):
+        if list_executor is None:
+            return directory
+        return list_executor.submit(list_directory_sized, directory, size_index is not None, scandir, stat_executor.map)
+    pending = [submit(base_dir)]
+    try:
+        while pending:
+            job = pending.pop()
+            if list_executor is None:
+                listing = list_directory(job, size_index, scandir)
+            else:
+                listing, partial_index = job.result()
+                if partial_index is not None:
+                    size_index.merge(partial_index)
+            if listing is None:
+                continue
+            subdirs, entries = listing
+            for entry in entries:
+                yield entry
+            # Submit subfolders in sorted order (so the next one popped is listed first) and push them in reverse
+            pending.extend(reversed([submit(subdir) for subdir in subdirs]))
+    finally:
+        if list_executor is not None:
+            list_executor.shutdown(cancel_futures=True)
+            stat_executor.shutdown(cancel_futures=True)
+    if size_index is not None:
+        size_index.finalize()
+
+def get_file_fingerprint(file, sample_size=65536):
+    """Returns a cheap content fingerprint of a file by hashing its size and its first and last `sample_size` bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        digest.update(str(file_size).encode())
+        f.seek(0)
+        digest.update(f.read(sample_size))
+        if file_size > sample_size:
+            f.seek(max(sample_size, file_size - sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+def get_entry_total_size(entry):
+    """Returns the bytes of every file of a crawled entry: all of a geodatabase, or a shapefile with its sidecar files"""
+    if entry.kind == _KIND_SHP:
+        return entry.size + sum(size for name, size in entry.members)
+    return entry.size
+
+def get_entry_fingerprint(entry):
+    """
+    Returns a cheap content fingerprint of a crawled entry
+    Geodatabases hash the name and size of every internal file plus samples of the system catalog and items tables,
+    which change whenever a feature class, table, or raster is added, removed, or altered. Shapefiles hash samples of
+    the .shp and of each sidecar file (so an edited .dbf or .prj is noticed).
+    """
+    try:
+        if entry.kind == _KIND_SHP:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(get_file_fingerprint(entry.path).encode())
+            for name, size in entry.members:
+                digest.update('{0}|{1};'.format(name, size).encode())
+                digest.update(get_file_fingerprint(os.path.join(os.path.dirname(entry.path), name)).encode())
+            return digest.hexdigest()
+        if entry.kind != _KIND_FGDB:
+            return get_file_fingerprint(entry.path)
+        digest = hashlib.blake2b(digest_size=16)
+        for name, size in entry.members:
+            digest.update('{0}|{1};'.format(name, size).encode())
+        for system_table in _FGDB_SYSTEM_TABLES:
+            if os.path.exists(os.path.join(entry.path, system_table)):
+                digest.update(get_file_fingerprint(os.path.join(entry.path, system_table)).encode())
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+class FgdbTable:
+    """
+    Minimal reader for the rows of a file geodatabase table (aXXXXXXXX.gdbtable with its .gdbtablx row offsets)
+    Follows the OpenFileGDB format description published with GDAL. Only version 3 tables (ArcGIS 10.x and
+    ArcGIS Pro without 64-bit ObjectIDs) are read. Version 4 tables raise a ValueError, so the native backend
+    describes their geodatabase with its fallback backend. Geometry and raster values are skipped rather than decoded.
+    """
+
+    # Field types of the table format
+    INT16, INT32, FLOAT32, FLOAT64, STRING, DATETIME, OBJECTID, GEOMETRY, BINARY, RASTER, GUID, GLOBALID, XML, INT64, DATE, TIME, DATETIME_OFFSET = range(17)
+
+    # Size in bytes of the fixed-width values of each field type
+    _FIXED_WIDTHS = {INT16: 2, INT32: 4, FLOAT32: 4, FLOAT64: 8, DATETIME: 8, GUID: 16, GLOBALID: 16, INT64: 8, DATE: 8, TIME: 8, DATETIME_OFFSET: 10}
+
+    def __init__(self, table_path):
+        with open(table_path, 'rb') as f:
+            self.data = f.read()
+        with open(os.path.splitext(table_path)[0] + '.gdbtablx', 'rb') as f:
+            self.tablx = f.read()
+        version = struct.unpack_from('<i', self.data, 0)[0]
+        if version == 4:
+            raise ValueError("Geodatabase table version 4 (ArcGIS Pro 3.2+ with 64-bit ObjectIDs) is not read natively: {0}".format(table_path))
+        if version != 3:
+            raise ValueError("Unsupported geodatabase table version {0}: {1}".format(version, table_path))
+        self.row_count = struct.unpack_from('<i', self.data, 4)[0]
+        self.fields = []
+        self.read_fields(struct.unpack_from('<Q', self.data, 32)[0])
+
+    @staticmethod
+    def read_varuint(data, pos):
+        """Reads a variable-length unsigned integer (7 bits per byte, low bits first) and returns (value, new position)"""
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+
+    @staticmethod
+    def read_utf16(data, pos, char_count):
+        return data[pos:pos + 2 * char_count].decode('utf-16-le'), pos + 2 * char_count
+
+    def read_fields(self, pos):
+        """Reads the field descriptions, which start with the header size, version, layer flags, and field count"""
+        data = self.data
+        layer_flags, field_count = struct.unpack_from('<IH', data, pos + 8)
+        self.geometry_type = layer_flags & 0xFF
+        layer_has_m = bool(layer_flags & (1 << 30))
+        layer_has_z = bool(layer_flags & (1 << 31))
+        pos += 14
+        for i in range(field_count):
+            name, pos = self.read_utf16(data, pos + 1, data[pos])
+            alias, pos = self.read_utf16(data, pos + 1, data[pos])
+            field_type = data[pos]
+            pos += 1
+            field = {'name': name, 'type': field_type, 'nullable': False}
+            if field_type == self.GEOMETRY:
+                flags = data[pos + 1]
+                wkt_length = struct.unpack_from('<H', data, pos + 2)[0]
+                field['wkt'] = data[pos + 4:pos + 4 + wkt_length].decode('utf-16-le')
+                pos += 4 + wkt_length
+                geometry_flags = data[pos]
+                has_m = bool(geometry_flags & 2)
+                has_z = bool(geometry_flags & 4)
+                pos += 1
+                # Origins, scales, tolerances, and the extent, then the spatial index grid sizes
+                doubles = 4 + (3 if has_m else 0) + (3 if has_z else 0) + 4 + (2 if layer_has_z else 0) + (2 if layer_has_m else 0)
+                pos += 8 * doubles + 1
+                grid_count = struct.unpack_from('<I', data, pos)[0]
+                pos += 4 + 8 * grid_count
+            elif field_type == self.RASTER:
+                flags = data[pos + 1]
+                column, pos = self.read_utf16(data, pos + 3, data[pos + 2])
+                wkt_length = struct.unpack_from('<H', data, pos)[0]
+                pos += 2 + wkt_length
+                magic = data[pos]
+                pos += 1
+                if magic > 0:
+                    has_m = bool(magic & 2)
+                    has_z = bool(magic & 4)
+                    pos += 8 * (4 + (3 if has_m else 0) + (3 if has_z else 0))
+                field['raster_type'] = data[pos]
+                pos += 1
+            elif field_type == self.STRING:
+                flags = data[pos + 4]
+                default_length, pos = self.read_varuint(data, pos + 5)
+                if flags & 4:
+                    pos += default_length
+            elif field_type in (self.OBJECTID, self.BINARY, self.GUID, self.GLOBALID, self.XML):
+                flags = data[pos + 1]
+                pos += 2
+            else:
+                flags = data[pos + 1]
+                default_length = data[pos + 2]
+                pos += 3
+                if flags & 4:
+                    pos += default_length
+            field['nullable'] = field_type != self.OBJECTID and bool(flags & 1)
+            self.fields.append(field)
+
+    def row_offsets(self):
+        """Yields (ObjectID, offset in the .gdbtable) for every row that has not been deleted"""
+        tablx = self.tablx
+        block_count, record_count, offset_size = struct.unpack_from('<iii', tablx, 4)
+        block_map = None
+        if block_count:
+            trailer = 16 + offset_size * 1024 * block_count
+            bitmap_words, bits_for_block_map = struct.unpack_from('<II', tablx, trailer)
+            if bitmap_words:
+                # Sparse tables only store the 1024-row blocks flagged in the block map
+                block_map = tablx[trailer + 16:trailer + 16 + (bits_for_block_map + 7) // 8]
+        blocks_before = 0
+        for row in range(record_count):
+            corrected = row
+            if block_map is not None:
+                block = row // 1024
+                if not block_map[block >> 3] & (1 << (block & 7)):
+                    continue
+                if row % 1024 == 0 and row:
+                    blocks_before = sum(1 for b in range(block) if block_map[b >> 3] & (1 << (b & 7)))
+                corrected = blocks_before * 1024 + row % 1024
+            start = 16 + offset_size * corrected
+            offset = int.from_bytes(tablx[start:start + offset_size], 'little')
+            if offset:
+                yield row + 1, offset
+
+    def rows(self):
+        """Yields (ObjectID, dict of field values) for every row, with None for null, geometry, and raster values"""
+        data = self.data
+        nullable_count = sum(1 for field in self.fields if field['nullable'])
+        for object_id, offset in self.row_offsets():
+            pos = offset + 4
+            null_flags = data[pos:pos + (nullable_count + 7) // 8]
+            pos += len(null_flags)
+            values = {}
+            nullable_index = 0
+            for field in self.fields:
+                field_type = field['type']
+                if field_type == self.OBJECTID:
+                    values[field['name']] = object_id
+                    continue
+                if field['nullable']:
+                    is_null = null_flags[nullable_index >> 3] & (1 << (nullable_index & 7))
+                    nullable_index += 1
+                    if is_null:
+                        values[field['name']] = None
+                        continue
+                value = None
+                if field_type in (self.STRING, self.XML):
+                    length, pos = self.read_varuint(data, pos)
+                    value = data[pos:pos + length].decode('utf-8', errors='replace')
+                    pos += length
+                elif field_type in (self.GEOMETRY, self.BINARY) or (field_type == self.RASTER and field['raster_type'] != 1):
+                    length, pos = self.read_varuint(data, pos)
+                    pos += length
+                elif field_type == self.RASTER:
+                    pos += 4
+                elif field_type == self.INT16:
+                    value = struct.unpack_from('<h', data, pos)[0]
+                elif field_type == self.INT32:
+                    value = struct.unpack_from('<i', data, pos)[0]
+                elif field_type == self.INT64:
+                    value = struct.unpack_from('<q', data, pos)[0]
+                elif field_type == self.FLOAT32:
+                    value = struct.unpack_from('<f', data, pos)[0]
+                elif field_type in (self.FLOAT64, self.DATETIME, self.DATE, self.TIME, self.DATETIME_OFFSET):
+                    value = struct.unpack_from('<d', data, pos)[0]
+                elif field_type in (self.GUID, self.GLOBALID):
+                    value = '{' + str(uuid.UUID(bytes_le=data[pos:pos + 16])).upper() + '}'
+                pos += self._FIXED_WIDTHS.get(field_type, 0)
+                values[field['name']] = value
+            yield object_id, values
+
+# Create a variable to cache the per-dataset sizes of each geodatabase, so they are resolved once per run
+_fgdb_dataset_sizes = {}
+
+def get_fgdb_dataset_sizes(entry):
+    """
+    Returns a dict of lowercase dataset name to the bytes of its internal files within a geodatabase entry
+    Each table is stored as aXXXXXXXX.* files, where XXXXXXXX is its ObjectID (in hex) in the system catalog
+    (a00000001.gdbtable). The files of a raster dataset's fras_aux_, fras_bnd_, fras_blk_, and fras_ras_ tables
+    are added to the raster. Sizes come from the members recorded during the crawl, so nothing is re-walked.
+    """
+    key = (entry.path, entry.mtime)
+    if key in _fgdb_dataset_sizes:
+        return _fgdb_dataset_sizes[key]
+    table_sizes = {}
+    for name, size in entry.members:
+        prefix = os.path.basename(name).split('.')[0].lower()
+        if len(prefix) == 9 and prefix.startswith('a'):
+            try:
+                object_id = int(prefix[1:], 16)
+            except ValueError:
+                continue
+            table_sizes[object_id] = table_sizes.get(object_id, 0) + size
+    dataset_sizes = {}
+    try:
+        for name, object_id in read_fgdb_tables(entry.path).items():
+            if object_id not in table_sizes:
+                continue
+            if name[:9] in ('fras_aux_', 'fras_bnd_', 'fras_blk_', 'fras_ras_'):
+                name = name[9:]
+            dataset_sizes[name] = dataset_sizes.get(name, 0) + table_sizes[object_id]
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        print("Could not read the system catalog of {0}: {1}".format(entry.path, e))
+    _fgdb_dataset_sizes[key] = dataset_sizes
+    return dataset_sizes
+
+# Map the item types of the geodatabase catalog (GDB_Items) to the kinds of datasets that are documented
+_FGDB_ITEM_TYPES = {'{70737809-852C-4A03-9E22-2CECEA5B9BFA}': 'Feature Class',
+                    '{74737149-DCB5-4257-8904-B9724E32A530}': 'Feature Dataset',
+                    '{CD06BC3B-789D-4C51-AAFA-A467912B8965}': 'Table',
+                    '{5ED667A3-9CA9-44A2-8029-D95BF23704B9}': 'Raster Dataset'}
+
+# Map the shape types of item definitions to the shape types reported by arcpy
+_FGDB_SHAPE_TYPES = {'esriGeometryPoint': 'Point', 'esriGeometryMultipoint': 'Multipoint', 'esriGeometryPolyline': 'Polyline',
+                     'esriGeometryPolygon': 'Polygon', 'esriGeometryMultiPatch': 'MultiPatch'}
+
+def read_fgdb_tables(fgdb):
+    """Returns a dict of lowercase table name to ObjectID from the system catalog (a00000001.gdbtable) of a geodatabase"""
+    tables = {}
+    for object_id, values in FgdbTable(os.path.join(fgdb, 'a00000001.gdbtable')).rows():
+        if values.get('Name'):
+            tables[values['Name'].lower()] = object_id
+    return tables
+
+def fgdb_table_path(fgdb, object_id):
+    """Returns the path of the .gdbtable file that stores a table of a geodatabase"""
+    return os.path.join(fgdb, 'a{0:08x}.gdbtable'.format(object_id))
+
+def parse_fgdb_definition(definition):
+    """Returns (shape type, SRS WKT, compression type) from the XML definition of a geodatabase item"""
+    if not definition:
+        return None, None, None
+    try:
+        root = ET.fromstring(definition)
+    except ET.ParseError:
+        return None, None, None
+    values = {}
+    # Item definitions are namespaced inconsistently between releases, so tags are matched on their local name
+    for element in root.iter():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag in ('ShapeType', 'WKT', 'CompressionType') and tag not in values:
+            values[tag] = element.text
+    return values.get('ShapeType'), values.get('WKT'), values.get('CompressionType')
+
+def get_wkt_name(wkt):
+    """Returns the name of the spatial reference system of a WKT string (the first quoted name)"""
+    match = re.search(r'"([^"]*)"', wkt or '')
+    return match.group(1) if match else 'Unknown'
+
+def read_fgdb_items(fgdb):
+    """
+    Returns a dict describing each feature dataset, feature class, table, and raster dataset of a geodatabase
+    Items are read from the GDB_Items table of the system catalog, so no arcpy (or GDAL) call is made. The
+    feature dataset of an item is the parent of its catalog path (e.g. \\Hydro\\Streams). Raster band counts are
+    the row counts of the raster's fras_bnd_ table.
+    """
+    tables = read_fgdb_tables(fgdb)
+    if 'gdb_items' not in tables:
+        raise ValueError("No GDB_Items table in the system catalog of {0}".format(fgdb))
+    items = []
+    for object_id, values in FgdbTable(fgdb_table_path(fgdb, tables['gdb_items'])).rows():
+        item_type = _FGDB_ITEM_TYPES.get((values.get('Type') or '').upper())
+        if item_type is None:
+            continue
+        path = [part for part in (values.get('Path') or '').split('\\') if part]
+        name = path[-1] if path else values.get('Name')
+        shape_type, wkt, compression = parse_fgdb_definition(values.get('Definition'))
+        band_count = 'Unknown'
+        if item_type == 'Raster Dataset' and 'fras_bnd_' + name.lower() in tables:
+            band_count = FgdbTable(fgdb_table_path(fgdb, tables['fras_bnd_' + name.lower()])).row_count
+        items.append({'type': item_type, 'dataset': path[-2] if len(path) > 1 else '', 'name': name,
+                      'geometry_type': _FGDB_SHAPE_TYPES.get(shape_type, shape_type or 'Unknown'), 'wkt': wkt,
+                      'srs': get_wkt_name(wkt), 'compression': (compression or 'Unknown').replace('esriRasterCompression', ''),
+                      'band_count': band_count})
+    return items
+
+class LibraryCatalog:
+    """
+    Persistent SQLite catalog of documented rows keyed by path and sheet
+    An entry is only re-described when it is new or its mtime, size, or content fingerprint has changed (for
+    shapefiles, those of the .shp and its sidecar files). Entries that are not seen during a run are dropped when the
+    catalog is pruned. The rows of the 'fake' backend are placeholders, so they are kept in memory only.
+    """
+
+    _VERSION = '3'
+
+    def __init__(self, catalog_path, prefix, backend_name=_DESCRIBE_BACKEND):
+        if backend_name == 'fake':
+            print("The fake describe backend does not use the catalog at {0}".format(catalog_path))
+            catalog_path = ':memory:'
+        self.catalog_path = catalog_path
+        self.connection = sqlite3.connect(catalog_path)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS catalog (
+            path TEXT NOT NULL, sheet TEXT NOT NULL, mtime REAL, size INTEGER, fingerprint TEXT, rows TEXT,
+            PRIMARY KEY (path, sheet))""")
+        # Rows store paths with the prefix removed and the values of the backend that described them, so a different
+        # prefix, backend (including the fallback of the native backend), or catalog layout invalidates everything
+        backend = backend_name if backend_name != 'native' else 'native/{0}'.format(_NATIVE_FALLBACK_BACKEND)
+        settings = {'version': self._VERSION, 'prefix': prefix, 'backend': backend}
+        stored = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if stored != settings:
+            self.connection.execute("DELETE FROM catalog")
+            self.connection.execute("DELETE FROM meta")
+            self.connection.executemany("INSERT INTO meta VALUES (?, ?)", settings.items())
+        self.connection.commit()
+        self.seen = set()
+        self.reused = 0
+        self.described = 0
+        self.pending_writes = 0
+
+    def lookup(self, entry, sheet):
+        """Returns the cached rows for `entry` on `sheet`, or None if the entry is new or has changed"""
+        self.seen.add(entry.path)
+        record = self.connection.execute(
+            "SELECT mtime, size, fingerprint, rows FROM catalog WHERE path = ? AND sheet = ?", (entry.path, sheet)).fetchone()
+        if record is None:
+            return None
+        mtime, size, fingerprint, rows = record
+        if mtime == entry.mtime and size == get_entry_total_size(entry):
+            self.reused += 1
+            return json.loads(rows)
+        # The file was touched (e.g. re-synced by OneDrive), so compare the content before describing it again
+        if size == get_entry_total_size(entry) and fingerprint is not None and fingerprint == get_entry_fingerprint(entry):
+            self.connection.execute(
+                "UPDATE catalog SET mtime = ? WHERE path = ? AND sheet = ?", (entry.mtime, entry.path, sheet))
+            self.reused += 1
+            return json.loads(rows)
+        return None
+
+    def store(self, entry, sheet, rows):
+        """Stores the freshly described rows for `entry` on `sheet`"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO catalog VALUES (?, ?, ?, ?, ?, ?)",
+            (entry.path, sheet, entry.mtime, get_entry_total_size(entry), get_entry_fingerprint(entry), json.dumps(rows, default=str)))
+        self.described += 1
+        self.pending_writes += 1
+        if self.pending_writes >= 500:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def prune(self):
+        """Drops the rows of every entry that was not seen during this run (i.e. deleted from the library)"""
+        stale = [(path,) for (path,) in self.connection.execute("SELECT DISTINCT path FROM catalog") if path not in self.seen]
+        self.connection.executemany("DELETE FROM catalog WHERE path = ?", stale)
+        self.connection.commit()
+        return len(stale)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+class ArcpyDescribeBackend:
+    """
+    Describes datasets with arcpy
+    Geodatabases are listed inside an arcpy.EnvManager, so the workspace is scoped to each call and never left
+    on the shared arcpy.env.workspace. Each engine worker process creates its own backend (and imports arcpy), so the
+    script can be imported on machines without ArcGIS.
+    """
+
+    def __init__(self):
+        import arcpy
+        self.arcpy = arcpy
+
+    def srs_name(self, desc):
+        """Returns the name of the spatial reference system (srs) of a Describe object"""
+        try:
+            return desc.spatialReference.name
+        except:
+            return 'Unknown'
+
+    def describe_fgdb(self, entry):
+        """Returns the feature class, feature dataset, and table counts of a geodatabase"""
+        with self.arcpy.EnvManager(workspace=entry.path):
+            fc_count = len(self.arcpy.ListFeatureClasses())
+            fd_count = len(self.arcpy.ListDatasets("",""))
+            table_count = len(self.arcpy.ListTables())
+        return fc_count, fd_count, table_count
+
+    def list_fgdb_items(self, entry):
+        """Returns a dict describing each feature class and raster within a geodatabase"""
+        items = []
+        with self.arcpy.EnvManager(workspace=entry.path):
+            datasets = self.arcpy.ListDatasets(feature_type='feature')
+            datasets = [''] + datasets if datasets is not None else []
+            for ds in datasets:
+                for fc in self.arcpy.ListFeatureClasses(feature_dataset=ds):
+                    desc = self.arcpy.Describe(os.path.join(entry.path, ds, fc))
+                    items.append({'dataset': ds, 'item': fc, 'name': desc.baseName, 'data_type': 'Vector', 'file_type': desc.dataType,
+                                  'geometry_type': desc.shapeType, 'srs': self.srs_name(desc), 'band_count': 'NA'})
+                for r in self.arcpy.ListRasters('*', 'GRID'):
+                    desc = self.arcpy.Describe(os.path.join(entry.path, ds, r))
+                    items.append({'dataset': ds, 'item': r, 'name': desc.baseName, 'data_type': 'FGDB Raster', 'file_type': desc.compressionType,
+                                  'geometry_type': 'Raster', 'srs': self.srs_name(desc), 'band_count': desc.bandCount})
+        return items
+
+    def describe_shapefile(self, entry):
+        """Returns a dict describing a shapefile"""
+        desc = self.arcpy.Describe(entry.path)
+        return {'name': desc.baseName, 'file_type': desc.dataType, 'geometry_type': desc.shapeType, 'srs': self.srs_name(desc)}
+
+    def describe_raster(self, entry):
+        """Returns a dict describing a raster"""
+        desc = self.arcpy.Describe(entry.path)
+        return {'file_type': desc.compressionType, 'srs': self.srs_name(desc), 'band_count': desc.bandCount}
+
+class OgrDescribeBackend:
+    """
+    Describes datasets with GDAL/OGR, so the documenter can run without ArcGIS
+    Feature datasets are read through the OpenFileGDB root group (GDAL 3.6+). Rasters within geodatabases are not listed.
+    """
+
+    def __init__(self):
+        from osgeo import gdal, ogr
+        gdal.UseExceptions()
+        self.gdal = gdal
+        self.ogr = ogr
+        # Map OGR geometry types to the shape types reported by arcpy
+        self.shape_types = {ogr.wkbPoint: 'Point', ogr.wkbMultiPoint: 'Multipoint', ogr.wkbLineString: 'Polyline',
+                            ogr.wkbMultiLineString: 'Polyline', ogr.wkbPolygon: 'Polygon', ogr.wkbMultiPolygon: 'Polygon',
+                            ogr.wkbTIN: 'MultiPatch', ogr.wkbPolyhedralSurface: 'MultiPatch', ogr.wkbMultiSurface: 'Polygon',
+                            ogr.wkbMultiCurve: 'Polyline'}
+
+    def srs_name(self, srs):
+        return srs.GetName() if srs is not None else 'Unknown'
+
+    def shape_type(self, layer):
+        return self.shape_types.get(self.ogr.GT_Flatten(layer.GetGeomType()), 'Unknown')
+
+    def fgdb_groups(self, ds):
+        """Returns (feature dataset, layer names) pairs for a geodatabase, starting with the root ('')"""
+        root = ds.GetRootGroup()
+        if root is None:
+            return [('', [ds.GetLayer(i).GetName() for i in range(ds.GetLayerCount())])]
+        groups = [('', root.GetVectorLayerNames() or [])]
+        for name in root.GetGroupNames() or []:
+            groups.append((name, root.OpenGroup(name).GetVectorLayerNames() or []))
+        return groups
+
+    def describe_fgdb(self, entry):
+        ds = self.gdal.OpenEx(entry.path, self.gdal.OF_VECTOR)
+        groups = self.fgdb_groups(ds)
+        root_layers = [ds.GetLayerByName(name) for name in groups[0][1]]
+        fc_count = sum(1 for layer in root_layers if layer.GetGeomType() != self.ogr.wkbNone)
+        return fc_count, len(groups) - 1, len(root_layers) - fc_count
+
+    def list_fgdb_items(self, entry):
+        items = []
+        ds = self.gdal.OpenEx(entry.path, self.gdal.OF_VECTOR)
+        for dataset, names in self.fgdb_groups(ds):
+            for name in names:
+                layer = ds.GetLayerByName(name)
+                if layer.GetGeomType() == self.ogr.wkbNone:
+                    continue
+                items.append({'dataset': dataset, 'item': name, 'name': name, 'data_type': 'Vector', 'file_type': 'FeatureClass',
+                              'geometry_type': self.shape_type(layer), 'srs': self.srs_name(layer.GetSpatialRef()), 'band_count': 'NA'})
+        return items
+
+    def describe_shapefile(self, entry):
+        ds = self.ogr.Open(entry.path)
+        layer = ds.GetLayer(0)
+        return {'name': os.path.splitext(os.path.basename(entry.path))[0], 'file_type': 'ShapeFile',
+                'geometry_type': self.shape_type(layer), 'srs': self.srs_name(layer.GetSpatialRef())}
+
+    def describe_raster(self, entry):
+        ds = self.gdal.Open(entry.path)
+        compression = ds.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') or 'None'
+        return {'file_type': compression, 'srs': self.srs_name(ds.GetSpatialRef()), 'band_count': ds.RasterCount}
+
+class FakeDescribeBackend:
+    """
+    Describes datasets with deterministic placeholder values and an optional per-call delay
+    Used to exercise the describe engine on machines without arcpy (e.g. against a synthetic tree)
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def describe_fgdb(self, entry):
+        time.sleep(self.delay)
+        tables = [name for name, size in entry.members if name.endswith('.gdbtable')]
+        return len(tables), 0, 0
+
+    def list_fgdb_items(self, entry):
+        time.sleep(self.delay)
+        return [{'dataset': '', 'item': os.path.splitext(name)[0], 'name': os.path.splitext(name)[0], 'data_type': 'Vector',
+                 'file_type': 'FeatureClass', 'geometry_type': 'Polygon', 'srs': 'Unknown', 'band_count': 'NA'}
+                for name, size in entry.members if name.endswith('.gdbtable')]
+
+    def describe_shapefile(self, entry):
+        time.sleep(self.delay)
+        return {'name': os.path.splitext(os.path.basename(entry.path))[0], 'file_type': 'ShapeFile', 'geometry_type': 'Polygon', 'srs': 'Unknown'}
+
+    def describe_raster(self, entry):
+        time.sleep(self.delay)
+        return {'file_type': 'None', 'srs': 'Unknown', 'band_count': 1}
+
+class NativeDescribeBackend:
+    """
+    Describes geodatabases by reading their system catalog directly (see read_fgdb_items), so listing makes no arcpy call
+    Shapefiles and rasters, and any geodatabase whose catalog cannot be read, are described by the fallback backend
+    (_NATIVE_FALLBACK_BACKEND), which is only created when first needed.
+    """
+
+    def __init__(self, fallback_name=None):
+        self.fallback_name = fallback_name or _NATIVE_FALLBACK_BACKEND
+        self._fallback = None
+
+    @property
+    def fallback(self):
+        if self._fallback is None:
+            self._fallback = _DESCRIBE_BACKENDS[self.fallback_name]()
+        return self._fallback
+
+    def read_items(self, entry):
+        """Returns the catalog items of a geodatabase, or None when the catalog cannot be read"""
+        try:
+            return read_fgdb_items(entry.path)
+        except (OSError, ValueError, struct.error, IndexError) as e:
+            print("Could not read the system catalog of {0}, describing it with the {1} backend instead: {2}".format(entry.path, self.fallback_name, e))
+            return None
+
+    def describe_fgdb(self, entry):
+        items = self.read_items(entry)
+        if items is None:
+            return self.fallback.describe_fgdb(entry)
+        # Match arcpy: feature classes and tables are counted at the root, and ListDatasets includes raster datasets
+        fc_count = sum(1 for item in items if item['type'] == 'Feature Class' and not item['dataset'])
+        fd_count = sum(1 for item in items if item['type'] in ('Feature Dataset', 'Raster Dataset'))
+        table_count = sum(1 for item in items if item['type'] == 'Table' and not item['dataset'])
+        return fc_count, fd_count, table_count
+
+    def list_fgdb_items(self, entry):
+        items = self.read_items(entry)
+        if items is None:
+            return self.fallback.list_fgdb_items(entry)
+        rows = []
+        # List the root first and then each feature dataset, with feature classes before rasters, as arcpy does
+        datasets = [''] + [item['name'] for item in items if item['type'] == 'Feature Dataset']
+        for ds in datasets:
+            for item in items:
+                if item['dataset'] == ds and item['type'] == 'Feature Class':
+                    rows.append({'dataset': ds, 'item': item['name'], 'name': item['name'], 'data_type': 'Vector', 'file_type': 'FeatureClass',
+                                 'geometry_type': item['geometry_type'], 'srs': item['srs'], 'band_count': 'NA'})
+            for item in items:
+                if item['dataset'] == ds and item['type'] == 'Raster Dataset':
+                    rows.append({'dataset': ds, 'item': item['name'], 'name': item['name'], 'data_type': 'FGDB Raster', 'file_type': item['compression'],
+                                 'geometry_type': 'Raster', 'srs': item['srs'], 'band_count': item['band_count']})
+        return rows
+
+    def describe_shapefile(self, entry):
+        return self.fallback.describe_shapefile(entry)
+
+    def describe_raster(self, entry):
+        return self.fallback.describe_raster(entry)
+
+# Create a lookup of the backends that can be selected with _DESCRIBE_BACKEND
+_DESCRIBE_BACKENDS = {'arcpy': ArcpyDescribeBackend, 'ogr': OgrDescribeBackend, 'fake': FakeDescribeBackend, 'native': NativeDescribeBackend}
+
+def fgdb_rows(entry, backend):
+    """Describes a geodatabase entry and returns its row for the FGDBs sheet"""
+    fgdb = entry.path
+    fgdb_path = fgdb.removeprefix(_PREFIX) ## Full path of the geodatabase
+    fgdb_name = os.path.basename(fgdb).split('/')[-1] ## Name of the geodatabase
+    file_size = get_size_format(entry.size) ## File size of the geodatabase, totalled during the crawl
+    fc_count, fd_count, table_count = backend.describe_fgdb(entry) ## Number of feature classes, feature datasets, and tables in the geodatabase
+    return [[fgdb_path, fgdb_name, file_size, fc_count, fd_count, table_count]]
+
+def fgdb_file_rows(entry, backend):
+    """Describes the feature classes and rasters within a geodatabase entry and returns their rows for the Main sheet"""
+    rows = []
+    fgdb = entry.path
+    container = os.path.split(fgdb)[1] ## Geodatabase that contains the file
+    location = os.path.dirname(fgdb).removeprefix(_PREFIX) ## Directory location of the files
+    ext = 'NA' ## Extension/format of the file
+    dataset_sizes = get_fgdb_dataset_sizes(entry) ## On-disk bytes of each dataset's internal files
+    for item in backend.list_fgdb_items(entry):
+        fullpath_filename = os.path.join(fgdb, item['dataset'], item['item'])
+        full_name = fullpath_filename.removeprefix(_PREFIX) ## Folder path and name of the feature class or raster
+        featuredataset = item['dataset'] if item['dataset'] else 'NA' ## Name of the feature dataset that contains the file
+        dataset_size = dataset_sizes.get(item['item'].lower())
+        size_mb = round(dataset_size / 1024 ** 2, 3) if dataset_size is not None else 'Unknown'
+        rows.append([full_name, location, container, featuredataset, ext, item['name'], item['data_type'], item['file_type'],
+                     item['geometry_type'], item['srs'], item['band_count'], size_mb])
+    return rows
+
+def shapefile_rows(entry, backend):
+    """Describes a shapefile entry and returns its row for the Main sheet"""
+    shp = entry.path
+    full_name = shp.removeprefix(_PREFIX)
+    folder_path = os.path.dirname(shp)
+    location = folder_path.removeprefix(_PREFIX)
+    container = 'NA'
+    featuredataset = 'NA'
+    ext = _SHP_EXT.strip('.')
+    desc = backend.describe_shapefile(entry)
+    data_type = 'Vector'
+    band_count = 'NA'
+    size_mb = round(entry.size / 1024 ** 2, 3) ## Size recorded during the crawl
+    return [[full_name, location, container, featuredataset, ext, desc['name'], data_type, desc['file_type'], desc['geometry_type'], desc['srs'], band_count, size_mb]]
+
+def raster_rows(entry, backend):
+    """Describes a raster entry and returns its row for the Main sheet"""
+    rast = entry.path
+    full_name = rast.removeprefix(_PREFIX)
+    folder_path = os.path.dirname(rast)
+    location = folder_path.removeprefix(_PREFIX)
+    container = 'NA'
+    featuredataset = 'NA'
+    ext = os.path.splitext(rast)[1].strip('.')
+    desc = backend.describe_raster(entry)
+    name = os.path.basename(rast)
+    data_type = 'Raster'
+    geometry_type = 'Raster'
+    size_mb = round(entry.size / 1024 ** 2, 3)
+    return [[full_name, location, container, featuredataset, ext, name, data_type, desc['file_type'], geometry_type, desc['srs'], desc['band_count'], size_mb]]
+
+# Create a variable to store the backend owned by each describe engine worker process
+_worker_backend = None
+
+def init_describe_worker(backend_name):
+    """Creates the describe backend owned by an engine worker process"""
+    global _worker_backend
+    _worker_backend = _DESCRIBE_BACKENDS[backend_name]()
+
+def describe_entry(describer, entry, backend):
+    """Describes one entry and returns (rows, error) so a single bad dataset does not stop the run"""
+    try:
+        return describer(entry, backend), None
+    except Exception as e:
+        return None, str(e)
+
+def describe_chunk(describer, entries):
+    """Describes a shard of entries in a worker and returns (rows, error) pairs in the same order"""
+    return [describe_entry(describer, entry, _worker_backend) for entry in entries]
+
+class DescribeEngine:
+    """
+    Shards entries across a process pool of describe workers and streams the results back in input order
+    Each worker owns its own backend (and therefore its own arcpy workspace state). With one worker, entries
+    are described in this process instead.
+    """
+
+    def __init__(self, backend_name, workers=1, chunk_size=16):
+        self.backend_name = backend_name
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.executor = None
+        self.backend = None
+
+    def map(self, describer, entries):
+        """Yields (rows, error) for each entry in order, describing shards in parallel"""
+        if self.workers == 1:
+            if self.backend is None:
+                self.backend = _DESCRIBE_BACKENDS[self.backend_name]()
+            for entry in entries:
+                yield describe_entry(describer, entry, self.backend)
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_describe_worker, initargs=(self.backend_name,))
+        chunks = [entries[i:i + self.chunk_size] for i in range(0, len(entries), self.chunk_size)]
+        # Executor.map returns results in submission order while later shards are still being described
+        for results in self.executor.map(describe_chunk, [describer] * len(chunks), chunks):
+            yield from results
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+def describe_entries(entries, sheet, describer, catalog, engine):
+    """
+    Yields the rows of each entry in order, reusing the catalog rows of unchanged entries
+    Only new or modified entries are sent to the describe engine.
+    """
+    # Work through the entries in windows so only a window's worth of cached rows is held in memory at a time
+    window = max(256, engine.chunk_size * engine.workers * 4)
+    for start in range(0, len(entries), window):
+        batch = entries[start:start + window]
+        cached = [catalog.lookup(entry, sheet) for entry in batch]
+        described = engine.map(describer, [entry for entry, rows in zip(batch, cached) if rows is None])
+        for entry, rows in zip(batch, cached):
+            if rows is None:
+                rows, error = next(described)
+                if error is not None:
+                    print("Could not describe {0}: {1}".format(entry.path, error))
+                    run_report.count('describe_errors')
+                    continue
+                catalog.store(entry, sheet, rows)
+            yield rows
+
+def desc_fgdb(fgdb_list, catalog, engine):
+    """loop over a list of geodatabase entries to document parameters, re-describing only new or modified entries"""
     print("Looping over geodatabases...")
-    for fgdb in fgdb_list:
-        arcpy.env.workspace = fgdb
-        fgdb_path = fgdb.removeprefix(_PREFIX) ## Full path of the geodatabase
-        fgdb_name = os.path.basename(fgdb).split('/')[-1] ## Name of the geodatabase
-        file_size = get_size_format(get_folder_size(fgdb)) ## File size of the geodatabase
-        fcs = arcpy.ListFeatureClasses()
-        fc_count = len(fcs) ## Number of feature classes in the geodatabase
-        fds = arcpy.ListDatasets("","")
-        fd_count = len(fds) ## Number of feature datasets in the geodatabase
-        tables = arcpy.ListTables()
-        table_count = len(tables) ## Number of tables in the geodatabase
-        row_list = [fgdb_path, fgdb_name, file_size, fc_count, fd_count, table_count]
-        fgdbs_master_df.loc[len(fgdbs_master_df)] = row_list
-
-def desc_fgdb_file(fgdb_list):
-    """loop over a list of geodatabases to document parameters of the feature classes and rasters it contains"""
+    with run_report.stage('desc_fgdb') as stage:
+        stage['datasets'] = len(fgdb_list)
+        stage['rows'] = 0
+        for rows in describe_entries(fgdb_list, 'FGDBs', fgdb_rows, catalog, engine):
+            fgdbs_buffer.extend(rows)
+            stage['rows'] += len(rows)
+
+def desc_fgdb_file(fgdb_list, catalog, engine):
+    """loop over a list of geodatabase entries to document parameters of the feature classes and rasters it contains"""
     print("Looping over feature classes and rasters within geodatabases...")
-    for fgdb in fgdb_list:
-        arcpy.env.workspace = fgdb
-        fgdb_name = os.path.split(fgdb) 
-        container = fgdb_name[1] ## Geodatabase that contains the file
-        ext = 'NA' ## Extension/format of the file
-        datasets = arcpy.ListDatasets(feature_type='feature')
-        datasets = [''] + datasets if datasets is not None else []
-        for ds in datasets:
-            # Loop over feature classes
-            for fc in arcpy.ListFeatureClasses(feature_dataset=ds):
-                fullpath_filename = os.path.join(arcpy.env.workspace, ds, fc)
-                full_name = fullpath_filename.removeprefix(_PREFIX) ## Folder path and name of the feature class
-                folder_path = os.path.dirname(fgdb)
-                location = folder_path.removeprefix(_PREFIX) ## Directory location of the fc
-                if ds == '': ## Name of the feature dataset that contains the fc
-                    featuredataset = 'NA'
-                else:
-                    featuredataset = ds
-                desc = arcpy.Describe(fc)
-                name = desc.baseName ## Name of the fc
-                data_type = 'Vector' ## Data type of the fc
-                file_type = desc.dataType ## File type/compression of the fc
-                geometry_type = desc.shapeType ## Geometry type of the fc
-                srs = get_srs_name(fc)
-                band_count = 'NA'
-                size_mb = get_file_size(fullpath_filename, 'mb')
-                row_list = [full_name, location, container, featuredataset, ext, name, data_type, file_type, geometry_type, srs, band_count, size_mb]
-                main_master_df.loc[len(main_master_df)] = row_list
-            # Loop over raster datasets
-            for r in arcpy.ListRasters('*', 'GRID'):
-                fullpath_filename = os.path.join(arcpy.env.workspace, ds, r)
-                full_name = fullpath_filename.removeprefix(_PREFIX)
-                folder_path = os.path.dirname(fgdb)
-                location = folder_path.removeprefix(_PREFIX)
-                if ds == '':
-                    featuredataset = 'NA'
-                else:
-                    featuredataset = ds
-                desc = arcpy.Describe(r)
-                name = desc.baseName
-                data_type = 'FGDB Raster'
-                file_type = desc.compressionType
-                geometry_type = 'Raster'
-                srs = get_srs_name(r)
-                band_count = desc.bandCount ## Band count of the raster
-                size_mb = get_file_size(fullpath_filename, 'mb')
-                row_list = [full_name, location, container, featuredataset, ext, name, data_type, file_type, geometry_type, srs, band_count, size_mb]
-                main_master_df.loc[len(main_master_df)] = row_list
+    with run_report.stage('desc_fgdb_file') as stage:
+        stage['datasets'] = len(fgdb_list)
+        stage['rows'] = 0
+        for rows in describe_entries(fgdb_list, 'Main', fgdb_file_rows, catalog, engine):
+            main_buffer.extend(rows)
+            stage['rows'] += len(rows)
         
-def desc_shapefile(shp_list):                
-    """loop over a list of shapefiles to document parameters"""
+def desc_shapefile(shp_list, catalog, engine):                
+    """loop over a list of shapefile entries to document parameters"""
     print("Looping over shapefiles...")
-    for shp in shp_list:
-        full_name = shp.removeprefix(_PREFIX)
-        folder_path = os.path.dirname(shp)
-        location = folder_path.removeprefix(_PREFIX)
-        container = 'NA'
-        featuredataset = 'NA'
-        ext = _SHP_EXT.strip('.')
-        desc = arcpy.Describe(shp)
-        name = desc.baseName
-        data_type = 'Vector'
-        file_type = desc.dataType
-        geometry_type = desc.shapeType
-        srs = get_srs_name(shp)
-        band_count = 'NA'
-        size_mb = get_file_size(shp, 'mb')
-        row_list = [full_name, location, container, featuredataset, ext, name, data_type, file_type, geometry_type, srs, band_count, size_mb]
-        main_master_df.loc[len(main_master_df)] = row_list
+    with run_report.stage('desc_shapefile') as stage:
+        stage['datasets'] = len(shp_list)
+        stage['rows'] = 0
+        for rows in describe_entries(shp_list, 'Main', shapefile_rows, catalog, engine):
+            main_buffer.extend(rows)
+            stage['rows'] += len(rows)
         
-def desc_raster(rast_list):
-    """loop over a list of rasters to document parameters"""
+def desc_raster(rast_list, catalog, engine):
+    """loop over a list of raster entries to document parameters"""
     print("Looping over rasters...")
-    for rast in rast_list:
-        full_name = rast.removeprefix(_PREFIX)
-        folder_path = os.path.dirname(rast)
-        location = folder_path.removeprefix(_PREFIX)
-        container = 'NA'
-        featuredataset = 'NA'
-        ext = os.path.splitext(rast)[1].strip('.')
-        desc = arcpy.Describe(rast)
-        name = os.path.basename(rast)
-        data_type = 'Raster'
-        file_type = desc.compressionType
-        geometry_type = 'Raster'
-        srs = get_srs_name(rast)
-        band_count = desc.bandCount
-        size_mb = get_file_size(rast, 'mb')
-        row_list = [full_name, location, container, featuredataset, ext, name, data_type, file_type, geometry_type, srs, band_count, size_mb]
-        main_master_df.loc[len(main_master_df)] = row_list
-
-# Populate list of geodatabases
-fgdb_list = []
-for root, dirs, files in scandir.walk(_WORKSPACE):
-    for folder in dirs:
-        if str(folder).endswith(_FGDB_EXT):
-            fgdb_list.append(os.path.join(root, folder))
-
-# Document list of geodatabases
-desc_fgdb(fgdb_list)
-
-# Populate list of shapefiles
-shp_list = [os.path.join(os.path.dirname(f), os.path.basename(f)) for f in get_files_glob(_WORKSPACE, _SHP_EXT)]
-
-# Populate list of rasters
-rast_list = []
-glob_list = [os.path.join(os.path.dirname(f), os.path.basename(f)) for f in get_files_glob(_WORKSPACE, _RAST_EXT)]
-for rast in glob_list:
-    if os.path.splitext(rast)[1] in _RAST_EXT:
-        rast_list.append(rast)
-
-# Document lists of files
-desc_fgdb_file(fgdb_list)
-desc_shapefile(shp_list)
-desc_raster(rast_list)
-
-# Set path to xlsx workbook and worksheet
-book = load_workbook(__XCEL_LIBRARY)
-writer = pd.ExcelWriter(__XCEL_LIBRARY, engine='openpyxl') 
-writer.book = book
-
-# Write output to xlsx and save changes
-print("Writing to excel...")
-writer.sheets = dict((ws.title, ws) for ws in book.worksheets)
-fgdbs_master_df.to_excel(writer, "FGDBs", index = False)
-main_master_df.to_excel(writer, "Main", index = False)
-writer.save()
-
-print("### !!! ALL DONE !!! ###".format())
\ No newline at end of file
+    with run_report.stage('desc_raster') as stage:
+        stage['datasets'] = len(rast_list)
+        stage['rows'] = 0
+        for rows in describe_entries(rast_list, 'Main', raster_rows, catalog, engine):
+            main_buffer.extend(rows)
+            stage['rows'] += len(rows)
+
+def copy_read_only_sheet(source, target):
+    """
+    Copies the values (and formulas), cell styles, and column widths of a read-only worksheet into a write-only worksheet
+    The column widths are read from the <cols> element of the sheet XML, which read-only worksheets do not expose.
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    for event, element in ET.iterparse(source._get_source()):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'col' and element.get('width'):
+            for column in range(int(element.get('min')), int(element.get('max')) + 1):
+                target.column_dimensions[get_column_letter(column)].width = float(element.get('width'))
+        elif tag in ('cols', 'sheetData'):
+            break
+    for row in source.iter_rows():
+        cells = []
+        for cell in row:
+            new_cell = WriteOnlyCell(target, cell.value)
+            if getattr(cell, 'has_style', False):
+                new_cell.font = copy.copy(cell.font)
+                new_cell.fill = copy.copy(cell.fill)
+                new_cell.border = copy.copy(cell.border)
+                new_cell.alignment = copy.copy(cell.alignment)
+                new_cell.protection = copy.copy(cell.protection)
+                new_cell.number_format = cell.number_format
+            cells.append(new_cell)
+        target.append(cells)
+
+class ExcelInventoryWriter:
+    """
+    Streams the inventory sheets into the Excel file with a write-only openpyxl workbook, so memory stays flat
+    The other sheets of an existing file are read in read-only mode and copied at their positions with their values,
+    formulas, cell styles, and column widths (see copy_read_only_sheet). Write-only workbooks cannot take merged cells,
+    conditional formatting, data validation, charts, or images from another workbook, so those are not kept on the
+    other sheets. The new workbook replaces the old file when the writer is closed.
+    """
+
+    def __init__(self, path, sheets):
+        self.path = path
+        self.temp_path = os.path.splitext(path)[0] + '.writing.xlsx'
+        self.workbook = Workbook(write_only=True)
+        self.worksheets = {}
+        source = load_workbook(path, read_only=True) if os.path.exists(path) else None
+        try:
+            names = source.sheetnames if source is not None else []
+            for name in names + [name for name in sheets if name not in names]:
+                if name in sheets:
+                    worksheet = self.workbook.create_sheet(name)
+                    worksheet.append(sheets[name])
+                    self.worksheets[name] = worksheet
+                elif hasattr(source[name], 'iter_rows'):
+                    copy_read_only_sheet(source[name], self.workbook.create_sheet(name))
+                else:
+                    print("Could not keep the {0} sheet of {1}, which is not a worksheet".format(name, path))
+        finally:
+            if source is not None:
+                source.close()
+
+    def write_rows(self, sheet, rows):
+        worksheet = self.worksheets[sheet]
+        for row in rows:
+            worksheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.temp_path)
+        os.replace(self.temp_path, self.path)
+
+class CsvInventoryWriter:
+    """Streams each inventory sheet to its own CSV file next to the Excel file (e.g. NCRN_GIS_Geospatial_Contents_Main.csv)"""
+
+    def __init__(self, path, sheets):
+        self.files = {}
+        self.writers = {}
+        self.paths = {}
+        for name, columns in sheets.items():
+            self.paths[name] = '{0}_{1}.csv'.format(os.path.splitext(path)[0], name)
+            self.files[name] = open(self.paths[name] + '.writing', 'w', newline='', encoding='utf-8')
+            self.writers[name] = csv.writer(self.files[name])
+            self.writers[name].writerow(columns)
+
+    def write_rows(self, sheet, rows):
+        self.writers[sheet].writerows(rows)
+
+    def close(self):
+        for name, f in self.files.items():
+            f.close()
+            os.replace(f.name, self.paths[name])
+
+class ParquetInventoryWriter:
+    """
+    Streams each inventory sheet to its own Parquet file next to the Excel file, one row group per chunk
+    The schema is fixed per column, so placeholder values like 'Unknown' and 'NA' in numeric columns are written as nulls.
+    """
+
+    _NUMERIC_COLUMNS = {'Feature Class Count': 'int64', 'Feature Dataset Count': 'int64', 'Table Count': 'int64',
+                        'Band Count': 'int64', 'Size (MB)': 'float64'}
+
+    def __init__(self, path, sheets):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.schemas = {}
+        self.writers = {}
+        self.paths = {}
+        for name, columns in sheets.items():
+            self.schemas[name] = pyarrow.schema([(column, self._NUMERIC_COLUMNS.get(column, 'string')) for column in columns])
+            self.paths[name] = '{0}_{1}.parquet'.format(os.path.splitext(path)[0], name)
+            self.writers[name] = pyarrow.parquet.ParquetWriter(self.paths[name] + '.writing', self.schemas[name])
+
+    def column_values(self, field, values):
+        """Coerces the values of a column to the type of its schema field"""
+        if self.pa.types.is_integer(field.type):
+            return [int(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None for value in values]
+        if self.pa.types.is_floating(field.type):
+            return [float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None for value in values]
+        return [None if value is None else str(value) for value in values]
+
+    def write_rows(self, sheet, rows):
+        schema = self.schemas[sheet]
+        columns = list(zip(*rows))
+        arrays = [self.pa.array(self.column_values(field, values), type=field.type) for field, values in zip(schema, columns)]
+        self.writers[sheet].write_table(self.pa.Table.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        for name, writer in self.writers.items():
+            writer.close()
+            os.replace(self.paths[name] + '.writing', self.paths[name])
+
+# Create a lookup of the output writers that can be selected with _OUTPUT_FORMAT
+_OUTPUT_WRITERS = {'xlsx': ExcelInventoryWriter, 'csv': CsvInventoryWriter, 'parquet': ParquetInventoryWriter}
+
+# Guard the run so describe engine worker processes can import this script without documenting the library again
+if __name__ == '__main__':
+    print("### GETTING STARTED ###".format())
+
+    profiler = RunProfiler(_PROFILE, os.path.splitext(__XCEL_LIBRARY)[0]) if _PROFILE else None
+    run_report.settings = {'workspace': _WORKSPACE, 'crawl_workers': _CRAWL_WORKERS, 'describe_backend': _DESCRIBE_BACKEND,
+                           'describe_workers': _DESCRIBE_WORKERS, 'output_format': _OUTPUT_FORMAT, 'profile': _PROFILE}
+
+    # Crawl the workspace once and sort the entries into geodatabases, shapefiles, and rasters
+    print("Crawling {0}...".format(_WORKSPACE))
+    size_index = SizeIndex()
+    fgdb_list = []
+    shp_list = []
+    rast_list = []
+    with run_report.stage('crawl') as stage:
+        for entry in crawl_workspace(_WORKSPACE, size_index, _CRAWL_WORKERS):
+            if entry.kind == _KIND_FGDB:
+                fgdb_list.append(entry)
+            elif entry.kind == _KIND_SHP:
+                shp_list.append(entry)
+            else:
+                rast_list.append(entry)
+        # Every directory is listed once and every file is stat'ed once during the crawl
+        stage['directories_listed'] = len(size_index.dirs)
+        stage['files_stated'] = size_index.directory_count(_WORKSPACE) or 0
+        stage['bytes_walked'] = size_index.directory_size(_WORKSPACE) or 0
+        stage['fgdbs'] = len(fgdb_list)
+        stage['shapefiles'] = len(shp_list)
+        stage['rasters'] = len(rast_list)
+    print("Crawled {0} in {1} files".format(get_size_format(get_directory_total_size(_WORKSPACE, size_index)), size_index.directory_count(_WORKSPACE)))
+
+    # Document lists of geodatabases and files, reusing the catalog rows of entries that have not changed
+    # Stream the documented rows to the output as they are produced
+    with run_report.stage('open_output'):
+        output = _OUTPUT_WRITERS[_OUTPUT_FORMAT](__XCEL_LIBRARY, {'FGDBs': _FGDB_COLUMNS, 'Main': _MAIN_COLUMNS})
+    fgdbs_buffer.attach(output, 'FGDBs', _WRITE_CHUNK_ROWS)
+    main_buffer.attach(output, 'Main', _WRITE_CHUNK_ROWS)
+
+    # New or modified entries are described in parallel by the describe engine
+    catalog = LibraryCatalog(_CATALOG_CACHE, _PREFIX, _DESCRIBE_BACKEND)
+    engine = DescribeEngine(_DESCRIBE_BACKEND, _DESCRIBE_WORKERS, _DESCRIBE_CHUNK_SIZE)
+    try:
+        desc_fgdb(fgdb_list, catalog, engine)
+        desc_fgdb_file(fgdb_list, catalog, engine)
+        desc_shapefile(shp_list, catalog, engine)
+        desc_raster(rast_list, catalog, engine)
+    finally:
+        engine.close()
+    dropped = catalog.prune()
+    catalog.close()
+    run_report.count('catalog_reused', catalog.reused)
+    run_report.count('catalog_described', catalog.described)
+    run_report.count('catalog_dropped', dropped)
+    print("Reused {0} unchanged entries, described {1} new or modified entries, dropped {2} deleted entries".format(catalog.reused, catalog.described, dropped))
+
+    # Write the remaining rows and save the output
+    print("Writing the {0} output...".format(_OUTPUT_FORMAT))
+    with run_report.stage('write_output'):
+        fgdbs_buffer.flush()
+        main_buffer.flush()
+        output.close()
+
+    if profiler is not None:
+        profiler.stop()
+    run_report.write(_RUN_REPORT)
+
+    print("### !!! ALL DONE !!! ###".format())
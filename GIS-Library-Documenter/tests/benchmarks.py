@@ -0,0 +1,93 @@
+"""
+Benchmarks of the crawl and record buffer of document_gis_directory.py on synthetic GIS libraries
+Run one with `python tests/benchmarks.py <name>` from the GIS-Library-Documenter folder, e.g. `python tests/benchmarks.py crawl`.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document_gis_directory as documenter
+from helpers import LatencyScandir, legacy_inventory, make_synthetic_tree
+
+
+def benchmark_crawl(file_count=500000):
+    """Times the legacy multi-walk inventory against the single-pass crawler on a synthetic tree"""
+    base_dir = tempfile.mkdtemp(prefix='gis_crawl_benchmark_')
+    try:
+        print("Creating a synthetic tree of {0} files in {1}...".format(file_count, base_dir))
+        make_synthetic_tree(base_dir, file_count)
+        start = time.perf_counter()
+        fgdb_list, fgdb_sizes, shp_list, rast_list = legacy_inventory(base_dir)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        entries = list(documenter.crawl_workspace(base_dir))
+        crawl_time = time.perf_counter() - start
+        print("Legacy walks: {0:.2f}s ({1} FGDBs, {2} shapefiles, {3} rasters)".format(legacy_time, len(fgdb_list), len(shp_list), len(rast_list)))
+        print("Single pass:  {0:.2f}s ({1} entries)".format(crawl_time, len(entries)))
+        print("Speedup: {0:.1f}x".format(legacy_time / crawl_time if crawl_time else float('inf')))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_crawl_latency(file_count=20000, latency=0.002, worker_counts=(1, 4, 16, 32)):
+    """
+    Times the crawl with different numbers of threads on a synthetic tree, with `latency` seconds added to every
+    directory listing and stat to simulate a network share, and checks that every crawl yields the same entries
+    """
+    base_dir = tempfile.mkdtemp(prefix='gis_crawl_latency_')
+    try:
+        print("Creating a synthetic tree of {0} files in {1}...".format(file_count, base_dir))
+        make_synthetic_tree(base_dir, file_count)
+        scandir = LatencyScandir(latency)
+        baseline = None
+        for workers in worker_counts:
+            size_index = documenter.SizeIndex()
+            start = time.perf_counter()
+            entries = list(documenter.crawl_workspace(base_dir, size_index, workers, scandir))
+            elapsed = time.perf_counter() - start
+            result = (entries, size_index.dirs)
+            if baseline is None:
+                baseline = (result, elapsed)
+            print("{0:>3} threads: {1:.2f}s ({2} entries, {3:.1f}x){4}".format(workers, elapsed, len(entries), baseline[1] / elapsed if elapsed else float('inf'),
+                                                                            '' if result == baseline[0] else ' MISMATCH'))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark_buffer(row_counts=(10000, 100000, 1000000), loc_limit=100000):
+    """
+    Times building the Main sheet by DataFrame.loc appends against the record buffer
+    DataFrame.loc is quadratic, so it is skipped above `loc_limit` rows (set to None to run every size)
+    """
+    row_list = ['Full Name', 'Location', 'Container', 'NA', 'NA', 'Name', 'Vector', 'FeatureClass', 'Polygon', 'Unknown', 'NA', 1.5]
+    for row_count in row_counts:
+        if loc_limit is None or row_count <= loc_limit:
+            start = time.perf_counter()
+            df = pd.DataFrame(columns=documenter._MAIN_COLUMNS)
+            for i in range(row_count):
+                df.loc[len(df)] = row_list
+            loc_time = "{0:.2f}s".format(time.perf_counter() - start)
+        else:
+            loc_time = "skipped"
+        start = time.perf_counter()
+        buffer = documenter.RecordBuffer(documenter._MAIN_COLUMNS)
+        for i in range(row_count):
+            buffer.append(row_list)
+        df = pd.DataFrame(dict(zip(buffer.columns, buffer.data)), columns=buffer.columns)
+        buffer_time = time.perf_counter() - start
+        print("{0:>9} rows: DataFrame.loc {1:>10}  RecordBuffer {2:.2f}s".format(row_count, loc_time, buffer_time))
+
+
+_BENCHMARKS = {'crawl': benchmark_crawl, 'latency': benchmark_crawl_latency, 'buffer': benchmark_buffer}
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in _BENCHMARKS:
+        sys.exit("Usage: python tests/benchmarks.py {{{0}}}".format('|'.join(_BENCHMARKS)))
+    _BENCHMARKS[sys.argv[1]]()
@@ -0,0 +1,48 @@
+"""
+Creates the small file geodatabases used by the tests (requires pyogrio)
+fixture_10x.gdb targets ArcGIS 10.x and fixture_pro32.gdb targets ArcGIS Pro 3.2 (Int64 fields). GDAL writes version 3
+tables for both. It cannot write the version 4 tables (64-bit ObjectIDs) that the native reader does not support, so the
+tests patch the version of a copied table instead. Run from this folder to regenerate them.
+"""
+
+import os
+import shutil
+import struct
+
+import numpy as np
+from pyogrio.raw import write
+
+WGS84 = ('GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],'
+         'PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]')
+UTM18 = ('PROJCS["NAD_1983_UTM_Zone_18N",GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",'
+         'SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],'
+         'PROJECTION["Transverse_Mercator"],PARAMETER["False_Easting",500000.0],PARAMETER["False_Northing",0.0],'
+         'PARAMETER["Central_Meridian",-75.0],PARAMETER["Scale_Factor",0.9996],PARAMETER["Latitude_Of_Origin",0.0],'
+         'UNIT["Meter",1.0]]')
+
+def point(x, y):
+    return struct.pack('<BIdd', 1, 1, x, y)
+
+def line(coords):
+    return struct.pack('<BII', 1, 2, len(coords)) + b''.join(struct.pack('<dd', x, y) for x, y in coords)
+
+def polygon(coords):
+    return struct.pack('<BIII', 1, 3, 1, len(coords)) + b''.join(struct.pack('<dd', x, y) for x, y in coords)
+
+def make_fixture(path, layer_options, int_type):
+    shutil.rmtree(path, ignore_errors=True)
+    names = np.array(['Rock Creek', 'Cabin John'], dtype=object)
+    write(path, np.array([point(-77.05, 38.95), point(-77.15, 38.98)], dtype=object), [names], ['SiteName'],
+          layer='Sites', driver='OpenFileGDB', geometry_type='Point', crs=WGS84, layer_options=layer_options)
+    write(path, np.array([line([(320000, 4310000), (321000, 4311000)])], dtype=object), [np.array([1], dtype=int_type)], ['StreamOrder'],
+          layer='Streams', driver='OpenFileGDB', geometry_type='MultiLineString', crs=UTM18, append=True,
+          layer_options=dict(layer_options, FEATURE_DATASET='Hydro'))
+    write(path, np.array([polygon([(320000, 4310000), (321000, 4310000), (321000, 4311000), (320000, 4310000)])], dtype=object),
+          [np.array([2.5])], ['AreaSqKm'], layer='Watersheds', driver='OpenFileGDB', geometry_type='MultiPolygon', crs=UTM18,
+          append=True, layer_options=dict(layer_options, FEATURE_DATASET='Hydro'))
+    write(path, None, [np.array([1, 2, 3], dtype=int_type)], ['VisitID'], layer='Visits', driver='OpenFileGDB', append=True,
+          layer_options=layer_options)
+
+if __name__ == '__main__':
+    make_fixture('fixture_10x.gdb', {}, 'int32')
+    make_fixture('fixture_pro32.gdb', {'TARGET_ARCGIS_VERSION': 'ARCGIS_PRO_3_2_OR_LATER'}, 'int64')
@@ -0,0 +1,73 @@
+"""
+Synthetic GIS libraries and a simulated network share for the tests and benchmarks of document_gis_directory.py
+"""
+
+import contextlib
+import glob
+import os
+import time
+
+import document_gis_directory as documenter
+
+
+def make_synthetic_tree(base_dir, file_count):
+    """Creates a synthetic GIS library of roughly `file_count` small files"""
+    files_per_folder = 1000
+    for i in range(max(1, file_count // files_per_folder)):
+        folder = os.path.join(base_dir, 'Region_{0:03d}'.format(i // 50), 'Folder_{0:04d}'.format(i))
+        if i % 10 == 0:
+            # Every tenth folder is a geodatabase full of internal files
+            folder = folder + documenter._FGDB_EXT
+            names = ['a{0:08x}.{1}'.format(j // 4 + 1, ('gdbtable', 'gdbtablx', 'spx', 'atx')[j % 4]) for j in range(files_per_folder)]
+        else:
+            names = ['layer_{0:04d}{1}'.format(j, ('.shp', '.dbf', '.shx', '.prj', '.tif', '.xml')[j % 6]) for j in range(files_per_folder)]
+        os.makedirs(folder)
+        for name in names:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(b'0' * 64)
+
+
+def legacy_inventory(base_dir):
+    """Lists geodatabases, shapefiles, and rasters the way the documenter did before the single-pass crawler"""
+    fgdb_list = []
+    for root, dirs, files in os.walk(base_dir):
+        for folder in dirs:
+            if str(folder).endswith(documenter._FGDB_EXT):
+                fgdb_list.append(os.path.join(root, folder))
+    fgdb_sizes = [documenter.get_folder_size(fgdb) for fgdb in fgdb_list]
+    shp_list = list(glob.iglob(os.path.join(base_dir, '**', '*' + documenter._SHP_EXT), recursive=True))
+    rast_list = [f for f in glob.iglob(os.path.join(base_dir, '**', '*'), recursive=True) if os.path.splitext(f)[1] in documenter._RAST_EXT]
+    return fgdb_list, fgdb_sizes, shp_list, rast_list
+
+
+class LatencyDirEntry:
+    """Wraps an os.DirEntry, sleeping before each stat to simulate a network round trip"""
+
+    __slots__ = ('entry', 'latency', 'name', 'path')
+
+    def __init__(self, entry, latency):
+        self.entry = entry
+        self.latency = latency
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def stat(self, follow_symlinks=True):
+        time.sleep(self.latency)
+        return self.entry.stat(follow_symlinks=follow_symlinks)
+
+
+class LatencyScandir:
+    """Replacement for os.scandir that sleeps `latency` seconds for each directory listing and stat"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    @contextlib.contextmanager
+    def __call__(self, directory):
+        time.sleep(self.latency)
+        with os.scandir(directory) as entries:
+            entries = [LatencyDirEntry(entry, self.latency) for entry in entries]
+        yield entries
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+
+import document_gis_directory as documenter
+
+
+def make_shapefile(folder, name='roads', sidecars=('.dbf', '.shx', '.prj')):
+    os.makedirs(folder, exist_ok=True)
+    for ext in ('.shp',) + tuple(sidecars):
+        with open(os.path.join(folder, name + ext), 'wb') as f:
+            f.write(b'0' * 100)
+    return os.path.join(folder, name + '.shp')
+
+
+def crawl_entry(base_dir):
+    entries = list(documenter.crawl_workspace(base_dir))
+    assert len(entries) == 1
+    return entries[0]
+
+
+def test_shapefile_entries_record_their_sidecar_files(tmp_path):
+    make_shapefile(str(tmp_path), sidecars=('.dbf', '.shx', '.prj', '.shp.xml'))
+    with open(str(tmp_path / 'other.dbf'), 'wb') as f:
+        f.write(b'0')
+    entry = crawl_entry(str(tmp_path))
+    assert entry.kind == documenter._KIND_SHP
+    assert entry.members == (('roads.dbf', 100), ('roads.prj', 100), ('roads.shp.xml', 100), ('roads.shx', 100))
+    assert documenter.get_entry_total_size(entry) == 500
+
+
+def test_editing_a_sidecar_file_re_describes_the_shapefile(tmp_path):
+    library = tmp_path / 'library'
+    make_shapefile(str(library))
+    catalog = documenter.LibraryCatalog(str(tmp_path / 'catalog.sqlite'), '', 'arcpy')
+    entry = crawl_entry(str(library))
+    catalog.store(entry, 'Main', [['roads']])
+    assert catalog.lookup(crawl_entry(str(library)), 'Main') == [['roads']]
+    # A new projection of the same size, written a second later
+    prj = str(library / 'roads.prj')
+    with open(prj, 'wb') as f:
+        f.write(b'1' * 100)
+    os.utime(prj, (entry.mtime + 1, entry.mtime + 1))
+    assert catalog.lookup(crawl_entry(str(library)), 'Main') is None
+    # A .dbf that grew, with its old mtime
+    dbf = str(library / 'roads.dbf')
+    with open(dbf, 'ab') as f:
+        f.write(b'0' * 10)
+    os.utime(dbf, (entry.mtime, entry.mtime))
+    assert catalog.lookup(crawl_entry(str(library)), 'Main') is None
+    catalog.close()
+
+
+def test_switching_backends_clears_the_catalog(tmp_path):
+    make_shapefile(str(tmp_path / 'library'))
+    entry = crawl_entry(str(tmp_path / 'library'))
+    path = str(tmp_path / 'catalog.sqlite')
+    catalog = documenter.LibraryCatalog(path, '', 'ogr')
+    catalog.store(entry, 'Main', [['described by ogr']])
+    catalog.close()
+    catalog = documenter.LibraryCatalog(path, '', 'arcpy')
+    assert catalog.lookup(entry, 'Main') is None
+    catalog.close()
+
+
+def test_fake_rows_never_reach_the_catalog_file(tmp_path):
+    make_shapefile(str(tmp_path / 'library'))
+    entry = crawl_entry(str(tmp_path / 'library'))
+    path = str(tmp_path / 'catalog.sqlite')
+    catalog = documenter.LibraryCatalog(path, '', 'arcpy')
+    catalog.store(entry, 'Main', [['described by arcpy']])
+    catalog.close()
+    catalog = documenter.LibraryCatalog(path, '', 'fake')
+    assert catalog.lookup(entry, 'Main') is None
+    catalog.store(entry, 'Main', [['placeholder']])
+    catalog.close()
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT rows FROM catalog").fetchall() == [('[["described by arcpy"]]',)]
+    catalog = documenter.LibraryCatalog(path, '', 'arcpy')
+    assert catalog.lookup(entry, 'Main') == [['described by arcpy']]
+    catalog.close()
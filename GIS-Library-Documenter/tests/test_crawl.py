@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+import document_gis_directory as documenter
+from helpers import LatencyScandir, legacy_inventory, make_synthetic_tree
+
+
+class SortedListing:
+    """A directory listing in name order, as NTFS and most network shares return it, that stands in for os.scandir"""
+
+    def __init__(self, directory, scandir):
+        with scandir(directory) as entries:
+            self.entries = iter(sorted(entries, key=lambda entry: entry.name))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def library(tmp_path):
+    """A synthetic library plus folders that mix shapefiles, rasters, geodatabases, and subfolders"""
+    base_dir = str(tmp_path / 'GIS')
+    make_synthetic_tree(base_dir, 6000)
+    for folder in ('', 'Mixed', os.path.join('Mixed', 'b_sub'), os.path.join('Mixed', 'z_sub'), os.path.join('Mixed', 'm.gdb')):
+        os.makedirs(os.path.join(base_dir, folder), exist_ok=True)
+    for name in ('a.shp', 'a.dbf', 'c.tif', 'n.shp', 'y.jpg', 'zz.img', os.path.join('b_sub', 'b.shp'), os.path.join('b_sub', 'b.png'),
+                 os.path.join('z_sub', 'z.tif'), os.path.join('m.gdb', 'a00000001.gdbtable'), 'notes.txt'):
+        with open(os.path.join(base_dir, 'Mixed', name), 'wb') as f:
+            f.write(b'0' * (100 + len(name)))
+    with open(os.path.join(base_dir, 'top.shp'), 'wb') as f:
+        f.write(b'0' * 10)
+    return base_dir
+
+
+@pytest.mark.parametrize('with_sizes', [False, True])
+def test_crawl_matches_the_legacy_walks(library, with_sizes, monkeypatch):
+    # The legacy walks list folders in the order of the filesystem, so give them the name order of a Windows share
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda directory='.': SortedListing(directory, scandir))
+    fgdb_list, fgdb_sizes, shp_list, rast_list = legacy_inventory(library)
+    size_index = documenter.SizeIndex() if with_sizes else None
+    entries = list(documenter.crawl_workspace(library, size_index))
+    assert [entry.path for entry in entries if entry.kind == documenter._KIND_FGDB] == fgdb_list
+    assert [entry.path for entry in entries if entry.kind == documenter._KIND_SHP] == shp_list
+    assert [entry.path for entry in entries if entry.kind == documenter._KIND_RAST] == rast_list
+    assert [entry.size / 1024 / 1024 for entry in entries if entry.kind == documenter._KIND_FGDB] == fgdb_sizes
+    assert len(entries) == len(fgdb_list) + len(shp_list) + len(rast_list)
+    assert all(entry.size == os.path.getsize(entry.path) for entry in entries if entry.kind != documenter._KIND_FGDB)
+
+
+@pytest.mark.parametrize('scandir', [None, LatencyScandir(0.0002)], ids=['local', 'latency'])
+def test_threaded_crawl_does_not_depend_on_the_worker_count(library, scandir):
+    scandir = scandir or os.scandir
+    crawls = {}
+    for workers in (1, 2, 4, 8):
+        size_index = documenter.SizeIndex()
+        entries = list(documenter.crawl_workspace(library, size_index, workers, scandir))
+        crawls[workers] = (entries, size_index.dirs, size_index.files)
+    entries, dirs, files = crawls[1]
+    assert entries
+    for workers, crawl in crawls.items():
+        assert crawl == (entries, dirs, files), "{0} workers".format(workers)
+
+
+def test_crawl_skips_the_downloader_work_folder(tmp_path):
+    base_dir = str(tmp_path / 'GIS')
+    for folder in ('Hydro', os.path.join('.downloader', 'staging', 'Hydro'), os.path.join('.downloader', 'previous', 'Hydro', 'NHD.gdb')):
+        os.makedirs(os.path.join(base_dir, folder))
+    for name in (os.path.join('Hydro', 'streams.shp'), os.path.join('.downloader', 'staging', 'Hydro', 'streams.shp'),
+                 os.path.join('.downloader', 'previous', 'Hydro', 'dem.tif'), os.path.join('.downloader', 'previous', 'Hydro', 'NHD.gdb', 'gdb')):
+        with open(os.path.join(base_dir, name), 'wb') as f:
+            f.write(b'0' * 100)
+    for workers in (1, 4):
+        size_index = documenter.SizeIndex()
+        entries = list(documenter.crawl_workspace(base_dir, size_index, workers))
+        assert [entry.path for entry in entries] == [os.path.join(base_dir, 'Hydro', 'streams.shp')]
+        assert (size_index.directory_size(base_dir), size_index.directory_count(base_dir)) == (100, 1)
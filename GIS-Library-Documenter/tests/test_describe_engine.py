@@ -0,0 +1,60 @@
+import os
+import time
+
+import pytest
+
+import document_gis_directory as documenter
+
+
+def make_entries(count):
+    return [documenter.LibraryEntry(documenter._KIND_SHP, os.path.join('library', 'layer_{0:03d}.shp'.format(i)), 1024 * i, 0.0, None)
+            for i in range(count)]
+
+
+def slow_first_rows(entry, backend):
+    """Describes an entry, taking longer for the first entries so later shards finish first"""
+    index = int(os.path.splitext(os.path.basename(entry.path))[0].split('_')[1])
+    time.sleep(0.02 if index < 8 else 0.0)
+    return documenter.shapefile_rows(entry, backend)
+
+
+def failing_rows(entry, backend):
+    if entry.path.endswith('_003.shp'):
+        raise RuntimeError('cannot describe')
+    return documenter.shapefile_rows(entry, backend)
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(1, 16), (2, 1), (4, 3), (8, 16)])
+def test_rows_come_back_in_input_order(workers, chunk_size):
+    entries = make_entries(40)
+    engine = documenter.DescribeEngine('fake', workers, chunk_size)
+    try:
+        results = list(engine.map(slow_first_rows, entries))
+    finally:
+        engine.close()
+    assert [error for rows, error in results] == [None] * len(entries)
+    assert [rows[0][0] for rows, error in results] == [entry.path.removeprefix(documenter._PREFIX) for entry in entries]
+    assert [rows[0][5] for rows, error in results] == ['layer_{0:03d}'.format(i) for i in range(len(entries))]
+
+
+def test_parallel_rows_match_serial_rows():
+    entries = make_entries(25)
+    serial = documenter.DescribeEngine('fake', 1)
+    parallel = documenter.DescribeEngine('fake', 4, 2)
+    try:
+        assert list(parallel.map(slow_first_rows, entries)) == list(serial.map(slow_first_rows, entries))
+    finally:
+        serial.close()
+        parallel.close()
+
+
+def test_errors_stay_with_their_entry():
+    entries = make_entries(6)
+    engine = documenter.DescribeEngine('fake', 3, 2)
+    try:
+        results = list(engine.map(failing_rows, entries))
+    finally:
+        engine.close()
+    assert [error for rows, error in results] == [None, None, None, 'cannot describe', None, None]
+    assert results[3][0] is None
+    assert results[4][0][0][5] == 'layer_004'
@@ -0,0 +1,110 @@
+import os
+import shutil
+import struct
+
+import pytest
+
+import document_gis_directory as documenter
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Fixture geodatabases created by data/make_fgdb_fixtures.py
+FIXTURES = ['fixture_10x.gdb', 'fixture_pro32.gdb']
+
+
+def fgdb_entry(path):
+    """Returns the crawl entry of a geodatabase"""
+    entries = [entry for entry in documenter.crawl_workspace(os.path.dirname(path)) if entry.path == path]
+    assert len(entries) == 1
+    return entries[0]
+
+
+@pytest.fixture(params=FIXTURES)
+def fgdb(request):
+    return fgdb_entry(os.path.join(DATA_DIR, request.param))
+
+
+def test_catalog_lists_every_item(fgdb):
+    items = {item['name']: item for item in documenter.read_fgdb_items(fgdb.path)}
+    assert sorted(items) == ['Hydro', 'Sites', 'Streams', 'Visits', 'Watersheds']
+    assert [items[name]['type'] for name in ['Hydro', 'Sites', 'Streams', 'Visits', 'Watersheds']] == \
+        ['Feature Dataset', 'Feature Class', 'Feature Class', 'Table', 'Feature Class']
+    assert [items[name]['dataset'] for name in ['Sites', 'Streams', 'Watersheds', 'Visits']] == ['', 'Hydro', 'Hydro', '']
+
+
+def test_catalog_reads_geometry_types_and_srs(fgdb):
+    items = {item['name']: item for item in documenter.read_fgdb_items(fgdb.path)}
+    assert items['Sites']['geometry_type'] == 'Point'
+    assert items['Streams']['geometry_type'] == 'Polyline'
+    assert items['Watersheds']['geometry_type'] == 'Polygon'
+    assert items['Sites']['wkt'].startswith('GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984"')
+    assert items['Streams']['wkt'].startswith('PROJCS["NAD_1983_UTM_Zone_18N",GEOGCS["GCS_North_American_1983"')
+    assert 'PARAMETER["Central_Meridian",-75.0]' in items['Watersheds']['wkt']
+    assert items['Sites']['srs'] == 'GCS_WGS_1984'
+    assert items['Streams']['srs'] == items['Watersheds']['srs'] == 'NAD_1983_UTM_Zone_18N'
+    assert items['Visits']['wkt'] is None
+
+
+def test_native_backend_counts_match_arcpy_conventions(fgdb):
+    backend = documenter.NativeDescribeBackend('fake')
+    # One feature class and one table at the root, and one feature dataset
+    assert backend.describe_fgdb(fgdb) == (1, 1, 1)
+    rows = backend.list_fgdb_items(fgdb)
+    assert [(row['dataset'], row['name'], row['geometry_type'], row['srs']) for row in rows] == [
+        ('', 'Sites', 'Point', 'GCS_WGS_1984'),
+        ('Hydro', 'Streams', 'Polyline', 'NAD_1983_UTM_Zone_18N'),
+        ('Hydro', 'Watersheds', 'Polygon', 'NAD_1983_UTM_Zone_18N')]
+    assert backend._fallback is None
+
+
+@pytest.mark.parametrize('name, field_type', [('fixture_10x.gdb', documenter.FgdbTable.INT32), ('fixture_pro32.gdb', documenter.FgdbTable.INT64)])
+def test_table_rows(name, field_type):
+    path = os.path.join(DATA_DIR, name)
+    tables = documenter.read_fgdb_tables(path)
+    visits = documenter.FgdbTable(documenter.fgdb_table_path(path, tables['visits']))
+    assert visits.row_count == 3
+    assert [(field['name'], field['type']) for field in visits.fields] == [('OBJECTID', documenter.FgdbTable.OBJECTID), ('VisitID', field_type)]
+    assert list(visits.rows()) == [(i, {'OBJECTID': i, 'VisitID': i}) for i in (1, 2, 3)]
+    sites = documenter.FgdbTable(documenter.fgdb_table_path(path, tables['sites']))
+    assert [values['SiteName'] for object_id, values in sites.rows()] == ['Rock Creek', 'Cabin John']
+
+
+def test_dataset_sizes_come_from_the_crawled_members(fgdb):
+    sizes = documenter.get_fgdb_dataset_sizes(fgdb)
+    members = dict(fgdb.members)
+    assert sizes['sites'] == sum(size for name, size in members.items() if name.startswith('a00000009.'))
+    assert set(sizes) >= {'sites', 'streams', 'watersheds', 'visits'}
+
+
+# ObjectIDs of the user tables that data/make_fgdb_fixtures.py creates, in the system catalog of both fixtures
+FIXTURE_TABLE_IDS = {'sites': 9, 'streams': 10, 'watersheds': 11, 'visits': 12}
+
+
+def test_dataset_sizes_match_the_files_on_disk(fgdb):
+    files = os.listdir(fgdb.path)
+    expected = {name: sum(os.path.getsize(os.path.join(fgdb.path, file)) for file in files if file.startswith('a{0:08x}.'.format(object_id)))
+                for name, object_id in FIXTURE_TABLE_IDS.items()}
+    assert all(expected.values())
+    sizes = documenter.get_fgdb_dataset_sizes(fgdb)
+    assert {name: sizes[name] for name in FIXTURE_TABLE_IDS} == expected
+    # The Size (MB) of each feature class row is its dataset size
+    rows = documenter.fgdb_file_rows(fgdb, documenter.NativeDescribeBackend('fake'))
+    assert [(row[documenter._MAIN_COLUMNS.index('Name')], row[documenter._MAIN_COLUMNS.index('Size (MB)')]) for row in rows] == \
+        [(name, round(expected[name.lower()] / 1024 ** 2, 3)) for name in ['Sites', 'Streams', 'Watersheds']]
+
+
+def test_version_4_tables_fall_back_with_a_message(tmp_path, capsys):
+    path = str(tmp_path / 'pro32.gdb')
+    shutil.copytree(os.path.join(DATA_DIR, 'fixture_pro32.gdb'), path)
+    # GDAL cannot write version 4 (64-bit ObjectID) tables, so patch the version of the system catalog
+    with open(os.path.join(path, 'a00000001.gdbtable'), 'r+b') as f:
+        f.write(struct.pack('<i', 4))
+    with pytest.raises(ValueError, match='version 4'):
+        documenter.read_fgdb_items(path)
+    entry = fgdb_entry(path)
+    backend = documenter.NativeDescribeBackend('fake')
+    # The fake backend counts the .gdbtable files
+    assert backend.describe_fgdb(entry) == (11, 0, 0)
+    output = capsys.readouterr().out
+    assert 'describing it with the fake backend instead' in output
+    assert 'version 4 (ArcGIS Pro 3.2+ with 64-bit ObjectIDs)' in output
@@ -0,0 +1,83 @@
+import os
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+import document_gis_directory as documenter
+
+
+def write_inventory(writer_class, path, fgdb_rows, main_rows, chunk_rows=2):
+    writer = writer_class(path, {'FGDBs': documenter._FGDB_COLUMNS, 'Main': documenter._MAIN_COLUMNS})
+    fgdbs = documenter.RecordBuffer(documenter._FGDB_COLUMNS)
+    main = documenter.RecordBuffer(documenter._MAIN_COLUMNS)
+    fgdbs.attach(writer, 'FGDBs', chunk_rows)
+    main.attach(writer, 'Main', chunk_rows)
+    fgdbs.extend(fgdb_rows)
+    main.extend(main_rows)
+    fgdbs.flush()
+    main.flush()
+    writer.close()
+
+
+FGDB_ROWS = [['\\GIS\\a.gdb', 'a.gdb', '1.00MB', 3, 1, 2], ['\\GIS\\b.gdb', 'b.gdb', '2.00MB', 0, 0, 0], ['\\GIS\\c.gdb', 'c.gdb', '3.00MB', 1, 0, 0]]
+MAIN_ROWS = [['\\GIS\\roads.shp', '\\GIS', 'NA', 'NA', 'shp', 'roads', 'Vector', 'ShapeFile', 'Polyline', 'Unknown', 'NA', 0.5]]
+
+
+def test_excel_writer_keeps_other_sheets_and_their_formatting(tmp_path):
+    path = str(tmp_path / 'contents.xlsx')
+    workbook = Workbook()
+    notes = workbook.active
+    notes.title = 'Notes'
+    notes['A1'] = 'Read me'
+    notes['A1'].font = Font(bold=True)
+    notes['B2'] = '=1+1'
+    notes.column_dimensions['A'].width = 42
+    workbook.create_sheet('Main').append(['stale'])
+    workbook.create_sheet('Lookup').append(['code', 'label'])
+    workbook.save(path)
+
+    write_inventory(documenter.ExcelInventoryWriter, path, FGDB_ROWS, MAIN_ROWS)
+
+    workbook = load_workbook(path)
+    assert workbook.sheetnames == ['Notes', 'Main', 'Lookup', 'FGDBs']
+    assert workbook['Notes']['A1'].value == 'Read me'
+    assert workbook['Notes']['A1'].font.bold
+    assert workbook['Notes']['B2'].value == '=1+1'
+    assert workbook['Notes'].column_dimensions['A'].width == 42
+    assert [list(row) for row in workbook['Lookup'].iter_rows(values_only=True)] == [['code', 'label']]
+    assert [list(row) for row in workbook['Main'].iter_rows(values_only=True)] == [documenter._MAIN_COLUMNS] + MAIN_ROWS
+    assert [list(row) for row in workbook['FGDBs'].iter_rows(values_only=True)] == [documenter._FGDB_COLUMNS] + FGDB_ROWS
+    assert not os.path.exists(str(tmp_path / 'contents.writing.xlsx'))
+
+
+def test_excel_writer_creates_a_new_workbook(tmp_path):
+    path = str(tmp_path / 'contents.xlsx')
+    write_inventory(documenter.ExcelInventoryWriter, path, FGDB_ROWS, MAIN_ROWS)
+    workbook = load_workbook(path)
+    assert workbook.sheetnames == ['FGDBs', 'Main']
+    assert workbook['FGDBs'].max_row == len(FGDB_ROWS) + 1
+
+
+def test_excel_writer_streams_rows_to_a_write_only_workbook(tmp_path):
+    path = str(tmp_path / 'contents.xlsx')
+    workbook = Workbook()
+    workbook.active.title = 'Main'
+    for i in range(1000):
+        workbook['Main'].append(['stale row {0}'.format(i)])
+    workbook.save(path)
+    writer = documenter.ExcelInventoryWriter(path, {'FGDBs': documenter._FGDB_COLUMNS, 'Main': documenter._MAIN_COLUMNS})
+    assert writer.workbook.write_only
+    writer.write_rows('Main', MAIN_ROWS * 3)
+    writer.close()
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Main', 'FGDBs']
+    assert [list(row) for row in workbook['Main'].iter_rows(values_only=True)] == [documenter._MAIN_COLUMNS] + MAIN_ROWS * 3
+
+
+def test_csv_writer_streams_every_chunk(tmp_path):
+    path = str(tmp_path / 'contents.xlsx')
+    write_inventory(documenter.CsvInventoryWriter, path, FGDB_ROWS, MAIN_ROWS)
+    with open(str(tmp_path / 'contents_FGDBs.csv'), encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0] == ','.join(documenter._FGDB_COLUMNS)
+    assert [line.split(',')[1] for line in lines[1:]] == ['a.gdb', 'b.gdb', 'c.gdb']
@@ -0,0 +1,76 @@
+import os
+import random
+
+import pytest
+
+import document_gis_directory as documenter
+from helpers import make_synthetic_tree
+
+
+def make_tree(base_dir, seed):
+    """Creates a small library with random file sizes, geodatabases nested in geodatabases and folders, and empty folders"""
+    rng = random.Random(seed)
+    make_synthetic_tree(base_dir, 3000)
+    folders = [os.path.join(base_dir, 'Vector', 'Roads'), os.path.join(base_dir, 'Vector', 'Hydro.gdb'),
+               os.path.join(base_dir, 'Vector', 'Hydro.gdb', 'Nested.gdb'), os.path.join(base_dir, 'Vector', 'Hydro.gdb', 'Folder', 'Deep.gdb'),
+               os.path.join(base_dir, 'Raster', 'DEM'), os.path.join(base_dir, 'Empty', 'Also Empty')]
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    for folder, names in ((folders[0], ['roads.shp', 'roads.dbf', 'roads.shx', 'trails.shp', 'notes.txt']),
+                          (folders[1], ['a00000001.gdbtable', 'a00000001.gdbtablx', 'a00000009.gdbtable', 'gdb']),
+                          (folders[2], ['a00000001.gdbtable', 'a00000004.gdbtable']),
+                          (folders[3], ['a00000001.gdbtable']),
+                          (folders[4], ['dem.tif', 'dem.tif.aux.xml', 'hillshade.jpg'])):
+        for name in names:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(os.urandom(rng.randrange(0, 3 * 1024 * 1024)))
+
+
+@pytest.fixture(params=range(3))
+def crawled_tree(request, tmp_path):
+    base_dir = str(tmp_path / 'GIS')
+    make_tree(base_dir, request.param)
+    size_index = documenter.SizeIndex()
+    entries = list(documenter.crawl_workspace(base_dir, size_index))
+    return base_dir, size_index, entries
+
+
+def test_directory_totals_match_the_recursive_functions(crawled_tree):
+    base_dir, size_index, entries = crawled_tree
+    for root, dirs, files in os.walk(base_dir):
+        assert size_index.directory_size(root) == documenter.get_directory_total_size(root)
+        assert size_index.directory_count(root) == sum(len(files) for subroot, subdirs, files in os.walk(root))
+        assert documenter.get_folder_size(root, size_index) == documenter.get_folder_size(root)
+        assert documenter.get_directory_total_size(root, size_index) == documenter.get_directory_total_size(root)
+
+
+def test_file_sizes_match_the_recursive_functions(crawled_tree):
+    base_dir, size_index, entries = crawled_tree
+    files = [entry for entry in entries if entry.kind != documenter._KIND_FGDB]
+    assert files
+    for entry in files:
+        for unit in ('bytes', 'kb', 'mb', 'gb'):
+            assert documenter.get_file_size(entry.path, unit, size_index) == documenter.get_file_size(entry.path, unit)
+
+
+def test_fgdb_file_sizes_match_the_recursive_functions(crawled_tree):
+    base_dir, size_index, entries = crawled_tree
+    backend = documenter.FakeDescribeBackend()
+    fgdbs = [entry for entry in entries if entry.kind == documenter._KIND_FGDB]
+    # Geodatabases are not searched for other geodatabases, so the nested ones are counted in Hydro.gdb
+    assert os.path.join(base_dir, 'Vector', 'Hydro.gdb') in [entry.path for entry in fgdbs]
+    assert not [entry for entry in fgdbs if 'Nested.gdb' in entry.path or 'Deep.gdb' in entry.path]
+    for entry in fgdbs:
+        [row] = documenter.fgdb_rows(entry, backend)
+        assert row[documenter._FGDB_COLUMNS.index('File Size')] == documenter.get_size_format(documenter.get_directory_total_size(entry.path))
+        assert row[documenter._FGDB_COLUMNS.index('File Size')] == documenter.get_size_format(size_index.directory_size(entry.path))
+
+
+def test_dataset_sizes_match_the_recursive_functions(crawled_tree):
+    base_dir, size_index, entries = crawled_tree
+    backend = documenter.FakeDescribeBackend()
+    describers = {documenter._KIND_SHP: documenter.shapefile_rows, documenter._KIND_RAST: documenter.raster_rows}
+    for entry in entries:
+        if entry.kind in describers:
+            [row] = describers[entry.kind](entry, backend)
+            assert row[documenter._MAIN_COLUMNS.index('Size (MB)')] == documenter.get_file_size(entry.path, 'mb')
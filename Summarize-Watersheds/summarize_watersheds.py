@@ -23,13 +23,17 @@ References:
 
 # Import statements for utilized libraries / packages
 import datetime
+import email.utils
 import geopandas as gpd
 import os
 import pandas as pd
 import rasterstats
 import requests
 import streamstats
+import threading
+import time
 import wget
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 """
 Set various global variables. Some of these could be parameterized to be used in an 
@@ -58,6 +62,25 @@ __RAST_EXT = ['.tif', '.tiff', '.jpg', '.jpeg', '.png', '.sid', '.bmp'] # Logica
 # Create a variable to store the full path to the GIS Library sources Excel file
 __XCEL_LIBRARY = r'C:\Users\dgjones\DOI\NCRN Data Management - GIS\NCRN-GIS-Data-Sources.xlsx'
 
+# Create a variable to store the URL of the StreamStats services that delineate the watersheds
+__STREAMSTATS_URL = 'https://streamstats.usgs.gov/streamstatsservices/'
+
+# Number of sites whose watersheds are delineated at the same time
+__DELINEATE_WORKERS = 4
+
+# Minimum number of seconds between the starts of two delineations, to stay polite to StreamStats (and to the Nominatim
+# geocoder that finds the state of each site, which allows one request per second)
+__DELINEATE_INTERVAL = 1.0
+
+# Number of times a failed delineation is retried, waiting __DELINEATE_BACKOFF seconds and doubling the wait each time
+# (or waiting as long as the Retry-After header of the failed response asks)
+__DELINEATE_RETRIES = 3
+__DELINEATE_BACKOFF = 5
+
+# Create a list variable to store the HTTP status codes of client errors that may succeed on a retry (request timeout
+# and too many requests); other client errors are not retried
+__RETRIED_CLIENT_ERRORS = [408, 429]
+
 def get_file_size_requests(url):
     """
     Utility function to get the size of a file at a URL using requests library.
@@ -134,6 +157,131 @@ def download_url_list_wget(out_dir, url_list):
     for url in url_list:
         download_url_wget(out_dir, url)
 
+class RequestPacer:
+    """Spaces the starts of requests made from several threads at least `interval` seconds apart"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    def wait(self):
+        """Sleeps until the next request can start, and returns the time.monotonic() time it was scheduled to start at"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+        return start
+
+def get_retry_wait(error, backoff):
+    """
+    Utility function to return the number of seconds to wait before retrying a failed request.
+
+    Keyword arguments:
+    error -- Exception of the failed request
+    backoff -- Number of seconds to wait when the response of the request has no Retry-After header
+
+    Return:
+    wait -- The Retry-After header of the response (in seconds or as an HTTP date), or `backoff` without one
+    """
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    return backoff
+
+def delineate_watershed(lat, lon, base_url=__STREAMSTATS_URL, rcode=None):
+    """
+    Utility function to delineate the watershed draining to a point with the StreamStats services (the same request
+    that streamstats.Watershed makes, without the basin characteristics).
+
+    Keyword arguments:
+    lat -- Latitude of the point in decimal degrees
+    lon -- Longitude of the point in decimal degrees
+    base_url -- URL of the StreamStats services (or of a stand-in service)
+    rcode -- StreamStats region code of the point (its state, e.g. 'MD'), or None to look it up with the Nominatim geocoder
+
+    Return:
+    boundary -- GeoJSON FeatureCollection of the watershed boundary as a dictionary
+    """
+    # Find the state of the point the same way streamstats.Watershed does
+    if rcode is None:
+        rcode = streamstats.utils.find_state(streamstats.utils.find_address(lat=lat, lon=lon))
+    payload = {'rcode': rcode, 'xlocation': lon, 'ylocation': lat, 'crs': 4326, 'includeparameters': False,
+               'includeflowtypes': False, 'includefeatures': True, 'simplify': False}
+    response = requests.get(base_url.rstrip('/') + '/watershed.geojson', params=payload, timeout=300)
+    response.raise_for_status()
+    for dictionary in response.json()['featurecollection']:
+        if dictionary.get('name', '') == 'globalwatershed':
+            return dictionary['feature']
+    raise LookupError("StreamStats returned no watershed for ({0}, {1})".format(lat, lon))
+
+def delineate_watersheds(sites, delineate=delineate_watershed, workers=__DELINEATE_WORKERS, interval=__DELINEATE_INTERVAL,
+                         retries=__DELINEATE_RETRIES, backoff=__DELINEATE_BACKOFF):
+    """
+    Utility function to delineate the watersheds of many sites, `workers` sites at a time.
+        The starts of the delineations are spaced at least `interval` seconds apart to stay polite to the services.
+        Failed delineations are retried up to `retries` times, waiting `backoff` seconds and doubling the wait each time,
+        or as long as the Retry-After header of the response asks. Client errors other than request timeouts (408) and
+        too many requests (429), e.g. a point outside StreamStats, are not retried since they will not succeed.
+
+    Keyword arguments:
+    sites -- Dictionary of site IDs to [latitude, longitude]
+        Example: {0: [39.449701, -77.730321], 1: [39.45493, -77.737773]}
+    delineate -- Function that returns the GeoJSON FeatureCollection of the watershed of delineate(lat, lon)
+
+    Return:
+    watersheds -- GeoDataFrame of the watershed boundaries of all sites (in EPSG:4326), with their site ID in 'site_id'
+    failures -- Dictionary of the site IDs that could not be delineated to their exception
+    """
+    pacer = RequestPacer(interval)
+
+    def delineate_site(site_id, lat, lon):
+        for attempt in range(retries + 1):
+            pacer.wait()
+            try:
+                boundary = delineate(lat, lon)
+                break
+            except Exception as e:
+                status = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) and e.response is not None else None
+                if status is not None and status < 500 and status not in __RETRIED_CLIENT_ERRORS or attempt == retries:
+                    raise
+                wait = get_retry_wait(e, backoff * 2 ** attempt)
+                print("Delineation of site {0} failed ({1}). Retrying in {2:.1f}s...".format(site_id, e, wait))
+                time.sleep(wait)
+        watershed = gpd.GeoDataFrame.from_features(boundary["features"], crs="EPSG:4326")
+        watershed.insert(0, 'site_id', site_id)
+        return watershed
+
+    watersheds = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(delineate_site, site_id, lat, lon): site_id for site_id, (lat, lon) in sites.items()}
+        for future in as_completed(futures):
+            site_id = futures[future]
+            try:
+                watersheds[site_id] = future.result()
+                print("Delineated the watershed of site {0} ({1} of {2})".format(site_id, len(watersheds), len(sites)))
+            except Exception as e:
+                print("Could not delineate the watershed of site {0}".format(site_id))
+                print(e)
+                failures[site_id] = e
+    if not watersheds:
+        return gpd.GeoDataFrame({'site_id': []}, geometry=[], crs="EPSG:4326"), failures
+    # Keep the watersheds in the order of the sites
+    frames = [watersheds[site_id] for site_id in sites if site_id in watersheds]
+    return gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326"), failures
+
 ########### TESTING ##########
 
 ## Full list of nhd plus urls for download
@@ -200,10 +348,11 @@ wq_sites_dict = {0:[39.449701,-77.730321],
                 53:[38.939716,-77.262698], 
                 54:[38.941112,-77.26802]}
 
-for k, v in wq_sites_dict.items():
-    ws = streamstats.Watershed(v[0], v[1])
-    ws.boundary
-    poly = gpd.GeoDataFrame.from_features(ws.boundary["features"], crs="EPSG:4326")
-    ax = poly.plot(figsize=(20, 10), edgecolor='k')
-    ax.set_title("Single Watershed", fontsize=30, fontweight = 'bold')
+# Delineate the watersheds of the sites, a few at a time, into one GeoDataFrame with their site IDs
+# (only when run as a script, so the tests can import the functions above)
+if __name__ == '__main__':
+    watersheds, failures = delineate_watersheds(wq_sites_dict)
+    print("Delineated {0} of {1} sites. Sites that could not be delineated: {2}".format(len(wq_sites_dict) - len(failures), len(wq_sites_dict), sorted(failures)))
+    ax = watersheds.plot(figsize=(20, 10), edgecolor='k', column='site_id')
+    ax.set_title("Watersheds", fontsize=30, fontweight = 'bold')
     ax.set_axis_off()
\ No newline at end of file
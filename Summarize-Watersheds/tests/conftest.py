@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Make the watershed script importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import start_stand_in_streamstats
+
+
+@pytest.fixture
+def stand_in_streamstats():
+    """Returns a function that starts a local stand-in StreamStats service and returns (server, base URL)"""
+    servers = []
+
+    def start(delay=0.05, errors=None):
+        server, base_url = start_stand_in_streamstats(delay, errors)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,76 @@
+"""
+Local stand-in for the StreamStats services that summarize_watersheds.py talks to
+Used by the tests through the fixture in conftest.py.
+"""
+
+import http.server
+import json
+import threading
+import time
+from urllib.parse import parse_qsl, urlparse
+
+
+class StandInStreamStatsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Local stand-in for the StreamStats watershed.geojson service, answering with a canned square watershed around each
+    point after `server.delay` seconds
+    Requests for a point in `server.errors` first get its list of (status, Retry-After header or None) responses, one
+    per request. The server records how many requests ran at the same time (`server.max_active`), and when each point
+    was requested (`server.requests`).
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        if url.path.rstrip('/').split('/')[-1] != 'watershed.geojson' or 'xlocation' not in params or 'ylocation' not in params:
+            self.send_error(400)
+            return
+        point = (float(params['ylocation']), float(params['xlocation']))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+            attempt = len(self.server.requests.setdefault(point, []))
+            self.server.requests[point].append(time.monotonic())
+        try:
+            time.sleep(self.server.delay)
+            errors = self.server.errors.get(point, [])
+            if attempt < len(errors):
+                status, retry_after = errors[attempt]
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header('Retry-After', retry_after)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            lat, lon = point
+            square = [[lon - 0.01, lat - 0.01], [lon + 0.01, lat - 0.01], [lon + 0.01, lat + 0.01], [lon - 0.01, lat + 0.01], [lon - 0.01, lat - 0.01]]
+            boundary = {'type': 'FeatureCollection',
+                        'features': [{'type': 'Feature', 'properties': {'Name': 'globalwatershed'},
+                                      'geometry': {'type': 'Polygon', 'coordinates': [square]}}]}
+            body = json.dumps({'workspaceID': 'STANDIN', 'featurecollection': [
+                {'name': 'globalpoint', 'feature': {'type': 'FeatureCollection', 'features': []}},
+                {'name': 'globalwatershed', 'feature': boundary}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in_streamstats(delay=0.05, errors=None):
+    """Starts a local stand-in StreamStats service in a background thread and returns (server, base URL)"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInStreamStatsHandler)
+    server.delay = delay
+    server.errors = {tuple(point): responses for point, responses in (errors or {}).items()}
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    server.requests = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{0}/streamstatsservices/'.format(server.server_address[1])
@@ -0,0 +1,90 @@
+import email.utils
+import time
+
+import pytest
+
+pytest.importorskip('geopandas')
+for name in ('rasterstats', 'streamstats', 'wget'):
+    pytest.importorskip(name)
+from shapely.geometry import Point
+
+import summarize_watersheds
+
+
+def delineate_with(base_url, starts=None):
+    """Returns a delineate function for delineate_watersheds that uses the service at `base_url`"""
+    def delineate(lat, lon):
+        if starts is not None:
+            starts.append(time.monotonic())
+        return summarize_watersheds.delineate_watershed(lat, lon, base_url, rcode='MD')
+    return delineate
+
+
+def test_sites_are_delineated_in_parallel_within_the_limits(stand_in_streamstats, monkeypatch):
+    scheduled = []
+
+    class RecordingPacer(summarize_watersheds.RequestPacer):
+        def wait(self):
+            start = super().wait()
+            scheduled.append(start)
+            return start
+
+    monkeypatch.setattr(summarize_watersheds, 'RequestPacer', RecordingPacer)
+    sites = summarize_watersheds.wq_sites_dict
+    flaky = [site_id for site_id in sites if site_id % 10 == 3]
+    server, base_url = stand_in_streamstats(errors={tuple(sites[site_id]): [(503, None)] for site_id in flaky})
+    starts = []
+    workers, interval = 4, 0.02
+    watersheds, failures = summarize_watersheds.delineate_watersheds(sites, delineate_with(base_url, starts), workers, interval, backoff=0.05)
+    assert failures == {}
+    assert list(watersheds['site_id']) == list(sites)
+    for site_id, geometry in zip(watersheds['site_id'], watersheds.geometry):
+        assert geometry.contains(Point(sites[site_id][1], sites[site_id][0]))
+    assert server.max_active <= workers
+    # The scheduled starts are at least `interval` apart, and no delineation started before its scheduled start
+    scheduled.sort()
+    assert len(scheduled) == len(starts) == len(sites) + len(flaky)
+    assert min(b - a for a, b in zip(scheduled, scheduled[1:])) >= interval - 1e-9
+    assert all(start >= scheduled_start for start, scheduled_start in zip(sorted(starts), scheduled))
+    retried = [site_id for site_id in sites if len(server.requests[tuple(sites[site_id])]) == 2]
+    assert retried == flaky
+    assert all(len(server.requests[tuple(point)]) in (1, 2) for point in sites.values())
+
+
+@pytest.mark.parametrize('status', [408, 429])
+def test_timeouts_and_rate_limits_are_retried(stand_in_streamstats, status):
+    sites = {0: [39.449701, -77.730321]}
+    server, base_url = stand_in_streamstats(delay=0, errors={tuple(sites[0]): [(status, None)]})
+    watersheds, failures = summarize_watersheds.delineate_watersheds(sites, delineate_with(base_url), 1, 0, backoff=0.01)
+    assert failures == {}
+    assert list(watersheds['site_id']) == [0]
+    assert len(server.requests[tuple(sites[0])]) == 2
+
+
+def test_retry_after_is_honored(stand_in_streamstats):
+    sites = {0: [39.449701, -77.730321]}
+    server, base_url = stand_in_streamstats(delay=0, errors={tuple(sites[0]): [(429, '0.5')]})
+    watersheds, failures = summarize_watersheds.delineate_watersheds(sites, delineate_with(base_url), 1, 0, backoff=0.01)
+    assert failures == {}
+    first, second = server.requests[tuple(sites[0])]
+    assert second - first >= 0.5
+
+
+def test_other_client_errors_are_not_retried(stand_in_streamstats):
+    sites = {0: [39.449701, -77.730321], 1: [39.45493, -77.737773]}
+    server, base_url = stand_in_streamstats(delay=0, errors={tuple(sites[0]): [(404, None)]})
+    watersheds, failures = summarize_watersheds.delineate_watersheds(sites, delineate_with(base_url), 2, 0, backoff=0.01)
+    assert list(failures) == [0]
+    assert list(watersheds['site_id']) == [1]
+    assert len(server.requests[tuple(sites[0])]) == 1
+
+
+def test_retry_after_dates_are_converted_to_seconds():
+    class Response:
+        headers = {'Retry-After': email.utils.formatdate(time.time() + 30, usegmt=True)}
+
+    class Error(Exception):
+        response = Response()
+
+    assert 25 <= summarize_watersheds.get_retry_wait(Error(), 1) <= 30
+    assert summarize_watersheds.get_retry_wait(ValueError(), 1) == 1